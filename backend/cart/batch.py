@@ -0,0 +1,181 @@
+# cart/batch.py
+"""
+Batched cart changes.
+
+apply_cart_operations applies a list of add/update/remove operations to a
+cart in one transaction: the cart row is locked, the cart's items and every
+referenced product and variant are loaded with one query each, operations
+run in order against the running quantities, and the net result is written
+with one bulk_create, one bulk_update and one DELETE, plus one UPDATE of
+the cart totals (see cart.summary).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product, ProductVariant
+from .models import Cart, CartItem, CartVariantItem
+from .summary import apply_item_change
+
+OPERATIONS = ('add', 'update', 'remove')
+
+
+def _parse_operation(raw):
+    """Normalize one operation, returning (operation, error)"""
+    if not isinstance(raw, dict):
+        return None, "Each operation must be an object"
+
+    op = raw.get('op')
+    if op not in OPERATIONS:
+        return None, "Invalid op. Must be 'add', 'update' or 'remove'"
+
+    targets = [key for key in ('product_id', 'variant_id', 'item_id') if raw.get(key) is not None]
+    if len(targets) != 1:
+        return None, "Provide exactly one of product_id, variant_id or item_id"
+    if op == 'add' and targets[0] == 'item_id':
+        return None, "Items are added by product_id or variant_id"
+
+    try:
+        target_id = int(raw[targets[0]])
+        quantity = int(raw.get('quantity', 1)) if op != 'remove' else 0
+    except (TypeError, ValueError):
+        return None, "Invalid id or quantity value"
+    if op != 'remove' and quantity < 1:
+        return None, "Quantity must be at least 1"
+
+    if targets[0] == 'item_id':
+        kind = 'item:variant' if raw.get('is_variant') else 'item:product'
+    else:
+        kind = 'variant' if targets[0] == 'variant_id' else 'product'
+    return {'op': op, 'kind': kind, 'id': target_id, 'quantity': quantity}, None
+
+
+def apply_cart_operations(cart, operations, all_or_nothing=False):
+    """
+    Validate and apply a batch of cart operations in one transaction.
+
+    Each operation is a dict with op ('add', 'update' or 'remove'), one of
+    product_id, variant_id or item_id (with is_variant for variant items),
+    and quantity for add/update. add increases the quantity, update sets
+    it. Returns a summary with a per-operation result list.
+    """
+    results = [None] * len(operations)
+    parsed = []
+    for index, raw in enumerate(operations):
+        operation, error = _parse_operation(raw)
+        if error:
+            results[index] = {'operation': index, 'success': False, 'error': error}
+        else:
+            operation['index'] = index
+            parsed.append(operation)
+
+    with transaction.atomic():
+        # Serialize concurrent changes to the same cart
+        list(Cart.objects.select_for_update().filter(pk=cart.pk).values_list('pk', flat=True))
+
+        items = {('product', item.product_id): item for item in CartItem.objects.filter(cart=cart)}
+        items.update({('variant', item.variant_id): item for item in CartVariantItem.objects.filter(cart=cart)})
+        item_keys = {
+            ('item:variant' if key[0] == 'variant' else 'item:product', item.id): key for key, item in items.items()
+        }
+
+        product_ids = {op['id'] for op in parsed if op['kind'] == 'product'}
+        product_ids.update(pid for kind, pid in items if kind == 'product')
+        variant_ids = {op['id'] for op in parsed if op['kind'] == 'variant'}
+        variant_ids.update(vid for kind, vid in items if kind == 'variant')
+        products = Product.objects.in_bulk(product_ids)
+        variants = ProductVariant.objects.select_related('product').in_bulk(variant_ids)
+
+        quantities = {key: item.quantity for key, item in items.items()}
+        applied = 0
+        for op in parsed:
+            index = op['index']
+            key = item_keys.get((op['kind'], op['id'])) if op['kind'].startswith('item:') else (op['kind'], op['id'])
+            error = None
+            if key is None or (op['op'] != 'add' and not quantities.get(key)):
+                error = "Item not found in cart"
+            elif op['op'] == 'remove':
+                quantities[key] = 0
+            else:
+                if key[0] == 'variant':
+                    variant = variants.get(key[1])
+                    available = variant is not None and variant.is_active and variant.product.is_active
+                    stock = variant.stock if variant else 0
+                else:
+                    product = products.get(key[1])
+                    available = product is not None and product.is_active
+                    stock = product.stock if product else 0
+                quantity = quantities.get(key, 0) + op['quantity'] if op['op'] == 'add' else op['quantity']
+                if op['op'] == 'add' and not available:
+                    error = "Product not found or not available"
+                elif quantity > stock:
+                    error = f"Not enough stock available. Only {stock} items left."
+                else:
+                    quantities[key] = quantity
+
+            if error:
+                results[index] = {'operation': index, 'success': False, 'error': error}
+            else:
+                applied += 1
+                results[index] = {'operation': index, 'success': True, 'quantity': quantities[key]}
+
+        rejected = len(results) - applied
+        if all_or_nothing and rejected:
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['error'] = "Not applied because other operations in the batch failed"
+                    result.pop('quantity', None)
+            applied = 0
+        else:
+            _write(cart, items, quantities, products, variants)
+
+    return {
+        'applied': applied,
+        'rejected': len(results) - applied,
+        'results': results,
+    }
+
+
+def _unit_price(key, products, variants):
+    if key[0] == 'variant':
+        variant = variants.get(key[1])
+        return variant.product.price + variant.price_adjustment if variant else None
+    product = products.get(key[1])
+    return product.price if product else None
+
+
+def _write(cart, items, quantities, products, variants):
+    """Store the net quantity changes and apply them to the cart totals"""
+    now = timezone.now()
+    created = {CartItem: [], CartVariantItem: []}
+    updated = {CartItem: [], CartVariantItem: []}
+    deleted = {CartItem: [], CartVariantItem: []}
+    count_delta, amount_delta = 0, 0
+
+    for key, quantity in quantities.items():
+        item = items.get(key)
+        previous = item.quantity if item else 0
+        if quantity == previous:
+            continue
+        model = CartVariantItem if key[0] == 'variant' else CartItem
+        if item is None:
+            field = 'variant_id' if key[0] == 'variant' else 'product_id'
+            created[model].append(model(cart=cart, quantity=quantity, **{field: key[1]}))
+        elif quantity:
+            item.quantity, item.updated_at = quantity, now
+            updated[model].append(item)
+        else:
+            deleted[model].append(item.id)
+
+        count_delta += quantity - previous
+        price = _unit_price(key, products, variants)
+        amount_delta = None if price is None or amount_delta is None else amount_delta + price * (quantity - previous)
+
+    for model in (CartItem, CartVariantItem):
+        model.objects.bulk_create(created[model])
+        model.objects.bulk_update(updated[model], ['quantity', 'updated_at'])
+        if deleted[model]:
+            model.objects.filter(id__in=deleted[model]).delete()
+
+    if count_delta or amount_delta != 0:
+        apply_item_change(cart.pk, count_delta, amount_delta)
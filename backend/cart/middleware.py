@@ -17,7 +17,7 @@ class CartMiddleware(MiddlewareMixin):
         # Skip for API requests that don't need session cart
         if '/api/' in request.path and request.path not in ['/api/cart/', '/api/cart/add_item/', 
                                                            '/api/cart/remove_item/', '/api/cart/update_item/', 
-                                                           '/api/cart/clear/']:
+                                                           '/api/cart/clear/', '/api/cart/batch/']:
             return None
         
         # For anonymous users, create or get session cart
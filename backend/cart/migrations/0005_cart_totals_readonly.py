@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0004_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='total_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+    ]
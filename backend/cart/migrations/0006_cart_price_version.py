@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:08
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    # Existing totals carry cache-based stamps, so every cart is recomputed once
+    apps.get_model('cart', 'CartPriceVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_cart_totals_readonly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartPriceVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
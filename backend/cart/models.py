@@ -2,7 +2,6 @@
 from django.db import models
 from django.conf import settings
 from products.models import Product, ProductVariant
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
 
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='carts', null=True, blank=True)
@@ -11,6 +10,14 @@ class Cart(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     merged = models.BooleanField(default=False)  # Flag to indicate if cart has been merged 
     
+    # Denormalized totals, maintained by cart.summary; total_amount is valid for
+    # the price version in total_version
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total_version = models.CharField(max_length=32, blank=True, default='', editable=False)
+    
+    TOTAL_FIELDS = ('item_count', 'total_amount', 'total_version')
+    
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -30,38 +37,32 @@ class Cart(models.Model):
             return f"Cart {self.id} - {self.user.username}"
         return f"Cart {self.id} - Anonymous ({self.session_key})"
     
+    def save(self, *args, **kwargs):
+        # The totals move with F() updates; saving a stale instance must not write them back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def total(self):
         """Calculate total cart value"""
-        # Get product items total
-        product_total = self.items.annotate(
-            item_total=ExpressionWrapper(
-                F('product__price') * F('quantity'),
-                output_field=DecimalField()
-            )
-        ).aggregate(total=Sum('item_total'))['total'] or 0
-        
-        # Get variant items total
-        variant_total = self.variant_items.annotate(
-            item_total=ExpressionWrapper(
-                (F('variant__product__price') + F('variant__price_adjustment')) * F('quantity'),
-                output_field=DecimalField()
-            )
-        ).aggregate(total=Sum('item_total'))['total'] or 0
-        
-        return product_total + variant_total
+        from .summary import refresh_totals
+        return refresh_totals(self)[1]
     
-    @property
-    def item_count(self):
-        """Count total number of items in cart"""
-        product_count = self.items.aggregate(total=Sum('quantity'))['total'] or 0
-        variant_count = self.variant_items.aggregate(total=Sum('quantity'))['total'] or 0
-        return product_count + variant_count
+    def summary(self):
+        """(item_count, total), current as of the latest price change"""
+        from .summary import refresh_totals
+        return refresh_totals(self)
     
     def clear(self):
         """Remove all items from cart"""
+        from .summary import reset_totals
         self.items.all().delete()
         self.variant_items.all().delete()
+        reset_totals(self)
 
     def merge_with(self, session_cart):
         """Merge a session-based cart into this user cart"""
@@ -69,7 +70,7 @@ class Cart(models.Model):
             return
         
         # Merge regular product items
-        for session_item in session_cart.items.all():
+        for session_item in session_cart.items.select_related('product'):
             existing_item = self.items.filter(product=session_item.product).first()
             if existing_item:
                 existing_item.quantity += session_item.quantity
@@ -81,7 +82,7 @@ class Cart(models.Model):
                 session_item.save()
         
         # Merge variant items
-        for session_variant_item in session_cart.variant_items.all():
+        for session_variant_item in session_cart.variant_items.select_related('variant__product'):
             existing_variant_item = self.variant_items.filter(variant=session_variant_item.variant).first()
             if existing_variant_item:
                 existing_variant_item.quantity += session_variant_item.quantity
@@ -106,6 +107,13 @@ class CartItem(models.Model):
     class Meta:
         unique_together = ['cart', 'product']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so saves can apply the difference to the cart totals
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+    
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
@@ -123,9 +131,27 @@ class CartVariantItem(models.Model):
     class Meta:
         unique_together = ['cart', 'variant']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so saves can apply the difference to the cart totals
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+    
     def __str__(self):
         return f"{self.quantity} x {self.variant.product.name} - {self.variant.name}"
     
     @property
     def subtotal(self):
-        return (self.variant.product.price + self.variant.price_adjustment) * self.quantity
\ No newline at end of file
+        return (self.variant.product.price + self.variant.price_adjustment) * self.quantity
+
+
+class CartPriceVersion(models.Model):
+    """
+    Single-row counter of product and variant price changes; cart totals are
+    stamped with the value they were computed at (cart.summary)
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Price version {self.version}"
@@ -91,11 +91,12 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'items', 'variant_items', 'total', 'item_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
     
+    # Both read the cart's maintained totals, recomputed only after price changes
     def get_total(self, obj):
-        return obj.total
+        return obj.summary()[1]
     
     def get_item_count(self, obj):
-        return obj.item_count
+        return obj.summary()[0]
 
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField(required=False)
@@ -0,0 +1,55 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.models import Product, ProductVariant, DEFERRED
+from .models import Cart, CartItem, CartVariantItem
+from .summary import apply_item_change, invalidate_cart_totals, unit_price
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_save, sender=CartVariantItem)
+def update_cart_totals_on_item_save(sender, instance, created, raw=False, **kwargs):
+    """Apply the item's quantity change to its cart's totals"""
+    if raw:
+        return
+    loaded = 0 if created else getattr(instance, '_loaded_quantity', None)
+    if loaded is None:
+        apply_item_change(instance.cart_id, 0, None)
+    elif loaded != instance.quantity:
+        delta = instance.quantity - loaded
+        price = unit_price(instance)
+        apply_item_change(instance.cart_id, delta, None if price is None else price * delta)
+    instance._loaded_quantity = instance.quantity
+
+
+@receiver(post_delete, sender=CartItem)
+@receiver(post_delete, sender=CartVariantItem)
+def update_cart_totals_on_item_delete(sender, instance, origin=None, **kwargs):
+    """Take the deleted item off its cart's totals"""
+    # Deleting the cart removes the totals too, and bulk deletes of items
+    # (Cart.clear) reset them themselves
+    if isinstance(origin, Cart) or (isinstance(origin, QuerySet) and origin.model is sender):
+        return
+    quantity = getattr(instance, '_loaded_quantity', None) or instance.quantity
+    price = unit_price(instance)
+    apply_item_change(instance.cart_id, -quantity, None if price is None else -price * quantity)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_cart_totals_on_price_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """A product price change makes every cart amount stale"""
+    if raw or created or (update_fields is not None and 'price' not in update_fields):
+        return
+    if getattr(instance, '_loaded_price', DEFERRED) != instance.price:
+        invalidate_cart_totals()
+    instance._loaded_price = instance.price
+
+
+@receiver(post_save, sender=ProductVariant)
+def invalidate_cart_totals_on_adjustment_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """So does a variant price adjustment change"""
+    if raw or created or (update_fields is not None and 'price_adjustment' not in update_fields):
+        return
+    if getattr(instance, '_loaded_price_adjustment', DEFERRED) != instance.price_adjustment:
+        invalidate_cart_totals()
+    instance._loaded_price_adjustment = instance.price_adjustment
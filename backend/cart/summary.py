@@ -0,0 +1,138 @@
+# cart/summary.py
+"""
+Denormalized cart totals.
+
+Cart.item_count and Cart.total_amount are kept in step with item changes in
+the same transaction: item signals apply the quantity and amount difference
+with one F() UPDATE, and bulk operations (clear, batch changes) set them
+directly.
+
+The amount depends on product and variant prices, so it is stamped with the
+price version it was computed at (Cart.total_version). The version is a
+database counter (CartPriceVersion) that every price change bumps in its own
+transaction (see cart.signals), so all workers see the same value. A cart
+whose stamp doesn't match is recomputed once, under its row lock, on its
+next read. Item changes only add to an amount that is current; otherwise
+they leave it for that recomputation. Reading a current cart's totals costs
+one primary-key lookup of the version.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import (
+    Case, CharField, DecimalField, F, OuterRef, Subquery, Sum, Value, When, PositiveIntegerField
+)
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Cart, CartItem, CartVariantItem, CartPriceVersion
+
+PRICE_VERSION_ID = 1
+STALE = ''
+
+
+def _version_row():
+    return CartPriceVersion.objects.filter(pk=PRICE_VERSION_ID)
+
+
+def price_version():
+    """The current price version, in the form stored in Cart.total_version"""
+    version = _version_row().values_list('version', flat=True).first()
+    if version is None:
+        version = CartPriceVersion.objects.get_or_create(pk=PRICE_VERSION_ID)[0].version
+    return str(version)
+
+
+def _current_version():
+    """price_version() as an SQL expression, read by the statement that uses it"""
+    return Cast(Subquery(_version_row().values('version')), CharField(max_length=32))
+
+
+def invalidate_cart_totals():
+    """Start a new price version as part of the current transaction"""
+    if not _version_row().update(version=F('version') + 1):
+        CartPriceVersion.objects.get_or_create(pk=PRICE_VERSION_ID, defaults={'version': 1})
+
+
+def unit_price(item):
+    """Current unit price of a cart item, or None if it would take a query to know"""
+    if isinstance(item, CartVariantItem):
+        if not CartVariantItem.variant.is_cached(item) or not type(item.variant).product.is_cached(item.variant):
+            return None
+        return item.variant.product.price + item.variant.price_adjustment
+    if not CartItem.product.is_cached(item):
+        return None
+    return item.product.price
+
+
+def apply_item_change(cart_id, quantity_delta, amount_delta):
+    """
+    Add an item change to the cart's totals in one UPDATE. amount_delta=None
+    means the amount change is unknown, which leaves the amount to be recomputed.
+    """
+    if amount_delta is None:
+        total_amount, total_version = F('total_amount'), Value(STALE)
+    else:
+        current = When(total_version=_current_version(), then=F('total_amount') + amount_delta)
+        total_amount = Case(current, default=F('total_amount'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        total_version = F('total_version')
+    Cart.objects.filter(pk=cart_id).update(
+        updated_at=timezone.now(),
+        item_count=Case(
+            When(item_count__gte=-quantity_delta, then=F('item_count') + quantity_delta),
+            default=Value(0),
+            output_field=PositiveIntegerField()
+        ),
+        total_amount=total_amount,
+        total_version=total_version
+    )
+
+
+def reset_totals(cart):
+    """Totals of a cart that was just emptied"""
+    cart.item_count, cart.total_amount, cart.total_version = 0, Decimal('0.00'), price_version()
+    cart.updated_at = timezone.now()
+    Cart.objects.filter(pk=cart.pk).update(
+        item_count=cart.item_count, total_amount=cart.total_amount, total_version=cart.total_version,
+        updated_at=cart.updated_at
+    )
+
+
+def _sum(queryset, expression):
+    return Coalesce(
+        Subquery(queryset.order_by().values('cart_id').annotate(value=Sum(expression)).values('value')),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def compute_totals(cart_id):
+    """(item_count, total_amount) recomputed from the items, in one query"""
+    items = CartItem.objects.filter(cart_id=OuterRef('pk'))
+    variant_items = CartVariantItem.objects.filter(cart_id=OuterRef('pk'))
+    row = Cart.objects.filter(pk=cart_id).annotate(
+        product_count=_sum(items, 'quantity'),
+        variant_count=_sum(variant_items, 'quantity'),
+        product_total=_sum(items, F('product__price') * F('quantity')),
+        variant_total=_sum(
+            variant_items, (F('variant__product__price') + F('variant__price_adjustment')) * F('quantity')
+        )
+    ).values('product_count', 'variant_count', 'product_total', 'variant_total').first()
+    if row is None:
+        return 0, Decimal('0.00')
+    return int(row['product_count'] + row['variant_count']), row['product_total'] + row['variant_total']
+
+
+def refresh_totals(cart):
+    """Make cart.item_count and cart.total_amount current; one version lookup when they already are"""
+    version = price_version()
+    if cart.total_version != version:
+        with transaction.atomic():
+            # Item changes committing meanwhile wait for the lock and then add
+            # to the recomputed amount, instead of being overwritten by it
+            list(Cart.objects.select_for_update().filter(pk=cart.pk).values_list('pk', flat=True))
+            cart.item_count, cart.total_amount = compute_totals(cart.pk)
+            cart.total_version = version
+            Cart.objects.filter(pk=cart.pk).update(
+                item_count=cart.item_count, total_amount=cart.total_amount, total_version=version
+            )
+    return cart.item_count, cart.total_amount
@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from jobs.registry import task
+from .models import Cart, CartItem, CartVariantItem
+
+
+def abandoned_carts(days_old):
+    """Unmerged carts with no cart or item activity in the last days_old days"""
+    cutoff_date = timezone.now() - timedelta(days=days_old)
+    # Item changes don't always save the cart row, so recent items count as activity too
+    return Cart.objects.filter(merged=False, updated_at__lt=cutoff_date).exclude(
+        Exists(CartItem.objects.filter(cart_id=OuterRef('pk'), updated_at__gte=cutoff_date))
+    ).exclude(
+        Exists(CartVariantItem.objects.filter(cart_id=OuterRef('pk'), updated_at__gte=cutoff_date))
+    )
+
+
+@task('cart.clean_abandoned_carts')
+def clean_abandoned_carts(days_old=7):
+    """Delete carts that haven't been touched for days_old days; returns the count"""
+    _, deleted = abandoned_carts(days_old).delete()
+    return deleted.get('cart.Cart', 0)
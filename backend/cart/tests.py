@@ -6,6 +6,7 @@ from cart.models import Cart, CartItem
 from products.models import Product, Category, Brand
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
+from decimal import Decimal
 
 User = get_user_model()
 
@@ -322,3 +323,221 @@ class CartAPITestCase(APITestCase):
             
         cart_quantity = items[0]['quantity']
         self.assertLessEqual(cart_quantity, product.stock)
+
+
+class CartTotalsTestCase(TestCase):
+    """Test cases for the maintained cart totals"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from products.models import ProductVariant
+        cache.clear()
+        self.user = User.objects.create_user('+10000000049', 'password123', first_name='Cart', last_name='Totals')
+        self.category = Category.objects.create(name='Totals Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Totals Product {i}',
+                description='Cart totals test product',
+                price=Decimal('10.00') * (i + 1),
+                category=self.category,
+                sku=f'TOTALS{i:03d}',
+                stock=50
+            )
+            for i in range(3)
+        ]
+        self.variant = ProductVariant.objects.create(
+            product=self.products[0], name='Large', sku='TOTALS-L', price_adjustment=Decimal('2.50'), stock=20
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _add(self, **data):
+        response = self.client.post(reverse('cart-add-item'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_mutations_keep_totals_without_aggregates(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        self._add(product_id=self.products[0].id, quantity=2)
+        self._add(product_id=self.products[1].id, quantity=1)
+        self._add(product_id=self.products[0].id, quantity=1)
+        data = self._add(variant_id=self.variant.id, quantity=2)
+        self.assertEqual(data['item_count'], 6)
+        self.assertEqual(Decimal(str(data['total'])), Decimal('75.00'))
+
+        item = CartItem.objects.get(product=self.products[1])
+        data = self.client.post(reverse('cart-update-item'), {'item_id': item.id, 'quantity': 3}, format='json').data
+        self.assertEqual(data['item_count'], 8)
+        self.assertEqual(Decimal(str(data['total'])), Decimal('115.00'))
+
+        data = self.client.post(reverse('cart-remove-item'), {'item_id': item.id}, format='json').data
+        self.assertEqual(data['item_count'], 5)
+        self.assertEqual(Decimal(str(data['total'])), Decimal('55.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('cart-list')).data
+        self.assertEqual(Decimal(str(data['total'])), Decimal('55.00'))
+        self.assertFalse(any('SUM(' in q['sql'].upper() for q in queries.captured_queries))
+
+    def test_price_changes_are_picked_up(self):
+        from django.core.cache import cache
+        self._add(product_id=self.products[0].id, quantity=2)
+        self._add(variant_id=self.variant.id, quantity=1)
+        cart = Cart.objects.get(user=self.user)
+        with self.assertNumQueries(1):
+            # Only the price version is read
+            self.assertEqual(cart.summary(), (3, Decimal('32.50')))
+
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.price = Decimal('12.00')
+        product.save()
+        # The version lives in the database, not in a per-process cache
+        cache.clear()
+        cart = Cart.objects.get(user=self.user)
+        with self.assertNumQueries(6):
+            # Version, savepoint, row lock, recompute, store, release
+            self.assertEqual(cart.summary(), (3, Decimal('38.50')))
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total, Decimal('38.50'))
+
+    def test_clear_and_cascades_reset_totals(self):
+        self._add(product_id=self.products[0].id, quantity=2)
+        self._add(product_id=self.products[2].id, quantity=1)
+        self.products[2].delete()
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.summary(), (2, Decimal('20.00')))
+
+        data = self.client.post(reverse('cart-clear')).data
+        self.assertEqual((data['item_count'], data['total']), (0, Decimal('0.00')))
+        self.assertEqual(Cart.objects.get(user=self.user).summary(), (0, Decimal('0.00')))
+
+    def test_saving_a_stale_cart_keeps_totals(self):
+        from django.forms import modelform_factory
+        stale = Cart.objects.create(user=self.user)
+        self._add(product_id=self.products[1].id, quantity=2)
+        stale.merged = False
+        stale.save()
+        self.assertEqual(Cart.objects.get(pk=stale.pk).summary(), (2, Decimal('40.00')))
+        self.assertFalse({'item_count', 'total_amount', 'total_version'} & set(modelform_factory(Cart, fields='__all__').base_fields))
+
+
+class CartBatchTestCase(TestCase):
+    """Test cases for the batched cart endpoint"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from products.models import ProductVariant
+        cache.clear()
+        self.user = User.objects.create_user('+10000000050', 'password123', first_name='Cart', last_name='Batch')
+        self.category = Category.objects.create(name='Batch Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Batch Product {i}',
+                description='Cart batch test product',
+                price=Decimal('10.00') * (i + 1),
+                category=self.category,
+                sku=f'BATCH{i:03d}',
+                stock=5
+            )
+            for i in range(6)
+        ]
+        self.variant = ProductVariant.objects.create(
+            product=self.products[0], name='Large', sku='BATCH-L', price_adjustment=Decimal('2.50'), stock=3
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _batch(self, operations, **extra):
+        return self.client.post(reverse('cart-batch'), {'operations': operations, **extra}, format='json')
+
+    def test_batch_applies_operations_in_order(self):
+        response = self._batch([
+            {'op': 'add', 'product_id': self.products[0].id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.products[1].id},
+            {'op': 'add', 'variant_id': self.variant.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.products[0].id, 'quantity': 1},
+            {'op': 'update', 'product_id': self.products[1].id, 'quantity': 3},
+            {'op': 'remove', 'variant_id': self.variant.id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 6)
+        self.assertEqual([r['quantity'] for r in response.data['results'][:2]], [2, 1])
+        cart = response.data['cart']
+        self.assertEqual(cart['item_count'], 6)
+        self.assertEqual(Decimal(str(cart['total'])), Decimal('90.00'))
+        self.assertEqual(len(cart['items']), 2)
+        self.assertEqual(len(cart['variant_items']), 0)
+
+        item = CartItem.objects.get(product=self.products[1])
+        response = self._batch([
+            {'op': 'update', 'item_id': item.id, 'quantity': 1},
+            {'op': 'add', 'variant_id': self.variant.id},
+        ])
+        self.assertEqual(response.data['cart']['item_count'], 5)
+        self.assertEqual(Decimal(str(response.data['cart']['total'])), Decimal('62.50'))
+        # The maintained totals match a recomputation
+        from cart.summary import compute_totals
+        self.assertEqual(compute_totals(Cart.objects.get(user=self.user).pk), (5, Decimal('62.50')))
+
+    def test_invalid_operations_are_reported(self):
+        self.products[2].is_active = False
+        self.products[2].save()
+        operations = [
+            {'op': 'add', 'product_id': self.products[0].id, 'quantity': 1},
+            {'op': 'add', 'product_id': self.products[0].id, 'quantity': 5},
+            {'op': 'add', 'product_id': self.products[2].id},
+            {'op': 'remove', 'product_id': self.products[3].id},
+            {'op': 'update', 'product_id': self.products[0].id, 'quantity': 0},
+            {'op': 'move', 'product_id': self.products[0].id},
+        ]
+        response = self._batch(operations, all_or_nothing=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 0)
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self._batch(operations, all_or_nothing='false')
+        self.assertEqual(response.data['applied'], 1)
+        self.assertEqual([r['success'] for r in response.data['results']], [True] + [False] * 5)
+        self.assertIn('Only 5 items left', response.data['results'][1]['error'])
+        self.assertEqual(response.data['cart']['item_count'], 1)
+
+        self.assertEqual(self._batch([]).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from cart.batch import apply_cart_operations
+
+        def run(operations):
+            cart = Cart.objects.create(session_key=f'batch-{len(operations)}')
+            CartItem.objects.create(cart=cart, product=self.products[5], quantity=1)
+            with CaptureQueriesContext(connection) as queries:
+                apply_cart_operations(cart, operations + [{'op': 'remove', 'product_id': self.products[5].id}])
+            return len(queries.captured_queries)
+
+        small = run([{'op': 'add', 'product_id': self.products[0].id}])
+        large = run([{'op': 'add', 'product_id': product.id} for product in self.products[:5]] + [
+            {'op': 'add', 'variant_id': self.variant.id},
+            {'op': 'update', 'product_id': self.products[1].id, 'quantity': 2},
+        ])
+        # The large batch also loads its variants and inserts variant items, one query each
+        self.assertEqual(large, small + 2)
+
+    def test_item_activity_keeps_a_cart_from_cleanup(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from cart.tasks import clean_abandoned_carts
+        old = timezone.now() - timedelta(days=40)
+        cart = Cart.objects.create(user=self.user)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=old)
+        self._batch([{'op': 'add', 'product_id': self.products[0].id}])
+        self.assertEqual(clean_abandoned_carts(30), 0)
+
+        # Items that changed before the touch fix still count as activity
+        Cart.objects.filter(pk=cart.pk).update(updated_at=old)
+        self.assertEqual(clean_abandoned_carts(30), 0)
+
+        CartItem.objects.filter(cart=cart).update(updated_at=old)
+        self.assertEqual(clean_abandoned_carts(30), 1)
+        self.assertFalse(CartItem.objects.exists())
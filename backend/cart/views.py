@@ -1,11 +1,14 @@
 from django.shortcuts import render
+from django.conf import settings
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from products.models import Product, ProductVariant
 from .models import Cart, CartItem, CartVariantItem
+from .batch import apply_cart_operations
 from .serializers import (
     CartSerializer, CartItemSerializer, AddToCartSerializer, 
     UpdateCartItemSerializer, RemoveFromCartSerializer, CartVariantItemSerializer
@@ -48,6 +51,24 @@ class CartViewSet(viewsets.GenericViewSet):
                 except Cart.DoesNotExist:
                     return None
     
+    def cart_data(self, cart, refresh_totals=False):
+        """
+        Serialize the cart with its items' products preloaded. refresh_totals
+        re-reads the maintained totals after item changes made through signals.
+        """
+        if refresh_totals:
+            cart.refresh_from_db(fields=['item_count', 'total_amount', 'total_version'])
+        prefetch_related_objects(
+            [cart],
+            Prefetch('items', queryset=CartItem.objects.select_related(
+                'product__category', 'product__brand', 'product__rating_stats'
+            )),
+            Prefetch('variant_items', queryset=CartVariantItem.objects.select_related(
+                'variant__product'
+            ).prefetch_related('variant__attributes__attribute'))
+        )
+        return self.get_serializer(cart).data
+    
     def list(self, request):
         """Get the current user's cart"""
         cart = self.get_cart(create=False)
@@ -60,8 +81,7 @@ class CartViewSet(viewsets.GenericViewSet):
                 "item_count": 0
             })
         
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        return Response(self.cart_data(cart))
     
     @action(detail=False, methods=['post'])
     def add_item(self, request):
@@ -84,7 +104,7 @@ class CartViewSet(viewsets.GenericViewSet):
                 quantity = serializer.validated_data['quantity']
                 
                 # Get the variant
-                variant = get_object_or_404(ProductVariant, pk=variant_id, is_active=True)
+                variant = get_object_or_404(ProductVariant.objects.select_related('product'), pk=variant_id, is_active=True)
                 
                 # Check if variant has enough stock
                 if variant.stock < quantity:
@@ -102,6 +122,7 @@ class CartViewSet(viewsets.GenericViewSet):
                 
                 # If variant already exists, update quantity
                 if not created:
+                    cart_item.variant = variant  # Priced from the loaded variant
                     cart_item.quantity += quantity
                     # Check if updated quantity exceeds stock
                     if cart_item.quantity > variant.stock:
@@ -112,8 +133,7 @@ class CartViewSet(viewsets.GenericViewSet):
                     cart_item.save()
                 
                 # Serialize the updated cart
-                cart_serializer = self.get_serializer(cart)
-                return Response(cart_serializer.data, status=status.HTTP_200_OK)
+                return Response(self.cart_data(cart, refresh_totals=True), status=status.HTTP_200_OK)
             
             else:  # Regular product
                 product_id = serializer.validated_data['product_id']
@@ -138,6 +158,7 @@ class CartViewSet(viewsets.GenericViewSet):
                 
                 # If item already exists, update quantity
                 if not created:
+                    cart_item.product = product  # Priced from the loaded product
                     cart_item.quantity += quantity
                     # Check if updated quantity exceeds stock
                     if cart_item.quantity > product.stock:
@@ -148,8 +169,7 @@ class CartViewSet(viewsets.GenericViewSet):
                     cart_item.save()
             
             # Return updated cart
-            cart_serializer = self.get_serializer(cart)
-            return Response(cart_serializer.data, status=status.HTTP_200_OK)
+            return Response(self.cart_data(cart, refresh_totals=True), status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
@@ -167,14 +187,13 @@ class CartViewSet(viewsets.GenericViewSet):
         
         try:
             if is_variant:
-                cart_item = CartVariantItem.objects.get(cart=cart, id=item_id)
+                cart_item = CartVariantItem.objects.select_related('variant__product').get(cart=cart, id=item_id)
             else:
-                cart_item = CartItem.objects.get(cart=cart, id=item_id)
+                cart_item = CartItem.objects.select_related('product').get(cart=cart, id=item_id)
                 
             cart_item.delete()
             
-            cart_serializer = self.get_serializer(cart)
-            return Response(cart_serializer.data)
+            return Response(self.cart_data(cart, refresh_totals=True))
         except (CartItem.DoesNotExist, CartVariantItem.DoesNotExist):
             return Response({"detail": "Item not found in cart"}, status=status.HTTP_404_NOT_FOUND)
     
@@ -195,7 +214,7 @@ class CartViewSet(viewsets.GenericViewSet):
         
         try:
             if is_variant:
-                cart_item = CartVariantItem.objects.get(cart=cart, id=item_id)
+                cart_item = CartVariantItem.objects.select_related('variant__product').get(cart=cart, id=item_id)
                 
                 # Check if new quantity exceeds stock
                 if quantity > cart_item.variant.stock:
@@ -204,7 +223,7 @@ class CartViewSet(viewsets.GenericViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
             else:
-                cart_item = CartItem.objects.get(cart=cart, id=item_id)
+                cart_item = CartItem.objects.select_related('product').get(cart=cart, id=item_id)
                 
                 # Check if new quantity exceeds stock
                 if quantity > cart_item.product.stock:
@@ -216,8 +235,7 @@ class CartViewSet(viewsets.GenericViewSet):
             cart_item.quantity = quantity
             cart_item.save()
             
-            cart_serializer = self.get_serializer(cart)
-            return Response(cart_serializer.data)
+            return Response(self.cart_data(cart, refresh_totals=True))
         except (CartItem.DoesNotExist, CartVariantItem.DoesNotExist):
             return Response({"detail": "Item not found in cart"}, status=status.HTTP_404_NOT_FOUND)
     
@@ -231,5 +249,38 @@ class CartViewSet(viewsets.GenericViewSet):
         # Delete all items
         cart.clear()
         
-        cart_serializer = self.get_serializer(cart)
-        return Response(cart_serializer.data)
+        return Response(self.cart_data(cart))
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Apply several cart changes in one request.
+        Expects {"operations": [{"op": "add", "product_id": 1, "quantity": 2},
+        {"op": "update", "item_id": 5, "is_variant": false, "quantity": 1},
+        {"op": "remove", "variant_id": 3}, ...], "all_or_nothing": false}
+        and returns the per-operation results with the updated cart.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {"detail": "Expected a non-empty 'operations' list."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_operations = getattr(settings, 'CART_BATCH_MAX_OPERATIONS', 100)
+        if len(operations) > max_operations:
+            return Response(
+                {"detail": f"At most {max_operations} operations are allowed per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        cart = self.get_cart()
+        if not cart:
+            return Response(
+                {"detail": "Unable to create cart. Please try again or log in."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        all_or_nothing = str(request.data.get('all_or_nothing', 'false')).lower() == 'true'
+        summary = apply_cart_operations(cart, operations, all_or_nothing=all_or_nothing)
+        summary['cart'] = self.cart_data(cart, refresh_totals=True)
+        return Response(summary)
@@ -0,0 +1,87 @@
+# celebrities/category_map.py
+"""
+Celebrity-category associations (CelebrityCategory) with promotion counts.
+
+"Celebrities promoting products in a category" is an indexed lookup on
+CelebrityCategory instead of a celebrity-promotion-product join with
+DISTINCT. The rows of a celebrity are recomputed from their promotions in
+one GROUP BY. Signals schedule the celebrities touched by promotion changes
+and by product category moves, and each transaction refreshes them once,
+on commit (the same scheme as celebrities.featured).
+"""
+import threading
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Celebrity, CelebrityCategory, CelebrityProductPromotion
+
+_pending = threading.local()
+
+
+def refresh_celebrity_categories(celebrity_ids=None):
+    """Recompute the category links of the given celebrities, or of all of them"""
+    celebrities = Celebrity.objects.order_by('pk')
+    promotions = CelebrityProductPromotion.objects.order_by()
+    links = CelebrityCategory.objects.all()
+    if celebrity_ids is not None:
+        celebrities = celebrities.filter(pk__in=celebrity_ids)
+        promotions = promotions.filter(celebrity_id__in=celebrity_ids)
+        links = links.filter(celebrity_id__in=celebrity_ids)
+
+    with transaction.atomic():
+        # Concurrent refreshes of the same celebrity would both delete and then
+        # both insert; the row locks make them take turns
+        list(celebrities.select_for_update().values_list('pk', flat=True))
+        rows = [
+            CelebrityCategory(celebrity_id=row['celebrity_id'], category_id=row['product__category_id'], promotions=row['total'])
+            for row in promotions.values('celebrity_id', 'product__category_id').annotate(total=Count('id'))
+        ]
+        links.delete()
+        CelebrityCategory.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _pending_sets():
+    if not hasattr(_pending, 'celebrity_ids'):
+        _pending.celebrity_ids, _pending.product_ids = set(), set()
+    return _pending.celebrity_ids, _pending.product_ids
+
+
+def _flush():
+    celebrity_ids, product_ids = _pending_sets()
+    _pending.celebrity_ids, _pending.product_ids = set(), set()
+    if product_ids:
+        celebrity_ids |= set(CelebrityProductPromotion.objects.filter(
+            product_id__in=product_ids
+        ).values_list('celebrity_id', flat=True))
+    if celebrity_ids:
+        refresh_celebrity_categories(celebrity_ids)
+
+
+def schedule_category_refresh(celebrity_ids=(), product_ids=()):
+    """
+    Refresh the given celebrities, and those promoting the given products,
+    once the current transaction commits
+    """
+    pending_celebrities, pending_products = _pending_sets()
+    pending_celebrities.update(celebrity_ids)
+    pending_products.update(product_ids)
+    # As in celebrities.featured, the first callback to run refreshes everything pending
+    transaction.on_commit(_flush)
+
+
+def category_celebrity_ids(category_id, include_subcategories=False):
+    """
+    Ids of active celebrities promoting products in the category (or anywhere
+    below it), most promotions first
+    """
+    from products.category_tree import in_category_subtree
+
+    links = CelebrityCategory.objects.filter(celebrity__is_active=True)
+    if include_subcategories:
+        links = links.filter(in_category_subtree(category_id))
+    else:
+        links = links.filter(category_id=category_id)
+    return list(links.values('celebrity_id').annotate(
+        total=Sum('promotions')
+    ).order_by('-total', 'celebrity_id').values_list('celebrity_id', flat=True))
@@ -0,0 +1,63 @@
+# celebrities/featured.py
+"""
+Product.is_featured mirrors "has at least one featured celebrity promotion".
+
+sync_featured_products fixes the flag of a set of products, or of the whole
+catalog, in a single UPDATE that compares each row with an EXISTS subquery
+and only touches rows that disagree. Promotion signals don't sync row by
+row: schedule_featured_sync collects the affected product ids and syncs
+them all when the transaction commits, so a bulk promotion import costs one
+UPDATE instead of a query and a save per promotion.
+"""
+import threading
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import CelebrityProductPromotion
+
+_pending = threading.local()
+
+
+def _has_featured_promotion():
+    return Exists(CelebrityProductPromotion.objects.filter(product_id=OuterRef('pk'), is_featured=True))
+
+
+def out_of_sync_products(product_ids=None):
+    """Products whose is_featured disagrees with their promotions"""
+    from products.models import Product
+
+    products = Product.objects.all() if product_ids is None else Product.objects.filter(id__in=product_ids)
+    featured = _has_featured_promotion()
+    return products.filter(Q(featured, is_featured=False) | Q(~featured, is_featured=True))
+
+
+def sync_featured_products(product_ids=None):
+    """Bring is_featured in line with promotions; returns the number of products changed"""
+    from products.catalog_stats import invalidate_catalog_stats
+
+    updated = out_of_sync_products(product_ids).update(is_featured=_has_featured_promotion())
+    if updated:
+        # update() skips Product signals, which would drop the stats snapshot
+        invalidate_catalog_stats()
+    return updated
+
+
+def _flush():
+    product_ids = getattr(_pending, 'product_ids', None)
+    _pending.product_ids = set()
+    if product_ids:
+        sync_featured_products(product_ids)
+
+
+def schedule_featured_sync(product_id):
+    """
+    Sync the product once the current transaction commits, together with
+    every other product scheduled in it
+    """
+    if not hasattr(_pending, 'product_ids'):
+        _pending.product_ids = set()
+    _pending.product_ids.add(product_id)
+    # The first callback to run syncs everything pending; the rest find nothing left.
+    # Ids left behind by a rolled back transaction are synced with the next one,
+    # which is harmless since the sync recomputes the flag from promotions.
+    transaction.on_commit(_flush)
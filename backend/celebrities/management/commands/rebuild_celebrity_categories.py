@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from celebrities.category_map import refresh_celebrity_categories
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the celebrity-category links from celebrity promotions'
+
+    def handle(self, *args, **options):
+        rows = refresh_celebrity_categories()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} celebrity-category links'))
@@ -0,0 +1,100 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Folding rules as of this migration, copied from celebrities.search so later
+# changes there don't alter what this migration stores
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+ARABIC_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    'ک': 'ك', 'ی': 'ي', 'ـ': None,
+})
+
+ARABIC_TO_LATIN = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': 'h', 'خ': 'kh', 'د': 'd',
+    'ذ': 'dh', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd', 'ط': 't',
+    'ظ': 'z', 'ع': '', 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ك': 'k', 'ل': 'l', 'م': 'm',
+    'ن': 'n', 'ه': 'h', 'و': 'w', 'ي': 'y', 'ء': '',
+})
+
+# Latin spellings of one Arabic sound, folded to a single placeholder (order matters)
+SKELETON_RULES = [
+    (re.compile(r'kh'), 'X'), (re.compile(r'(sh|ch)'), 'C'), (re.compile(r'th'), 'T'),
+    (re.compile(r'dh'), 'D'), (re.compile(r'gh'), 'G'), (re.compile(r'ph'), 'f'),
+    (re.compile(r'c(?=[eiy])'), 's'), (re.compile(r'[cq]'), 'k'), (re.compile(r'x'), 'ks'),
+    (re.compile(r'g'), 'j'), (re.compile(r'[aeiouwy]'), ''), (re.compile(r'(.)\1+'), r'\1'),
+    # A final h is usually a written-out vowel (Sarah, ساره)
+    (re.compile(r'(?<=.)h$'), ''),
+]
+
+
+def fold(text):
+    """Lowercase, accent- and diacritic-free form of text with single spaces between words"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(NON_WORD_RE.sub(' ', stripped.casefold().translate(ARABIC_VARIANTS)).split())
+
+
+def skeleton(folded):
+    """Script-insensitive consonant skeleton of folded text, word by word"""
+    words = []
+    for word in folded.translate(ARABIC_TO_LATIN).split():
+        for pattern, replacement in SKELETON_RULES:
+            word = pattern.sub(replacement, word)
+        if word:
+            words.append(word)
+    return ' '.join(words)
+
+
+def search_fields(first_name, last_name):
+    """(search_name, search_skeleton) stored on a celebrity"""
+    folded = fold(f'{first_name} {last_name}')
+    return folded, skeleton(folded)
+
+
+def backfill_search_fields(apps, schema_editor):
+    Celebrity = apps.get_model('celebrities', 'Celebrity')
+    celebrities = list(Celebrity.objects.only('id', 'first_name', 'last_name'))
+    for celebrity in celebrities:
+        celebrity.search_name, celebrity.search_skeleton = search_fields(celebrity.first_name, celebrity.last_name)
+    Celebrity.objects.bulk_update(celebrities, ['search_name', 'search_skeleton'], batch_size=1000)
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS celebrities_search_name_trgm '
+        'ON celebrities_celebrity USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS celebrities_search_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('celebrities', '0002_remove_slug_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='celebrity',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='celebrity',
+            name='search_skeleton',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
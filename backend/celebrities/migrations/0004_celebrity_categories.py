@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_category_links(apps, schema_editor):
+    from django.db.models import Count
+
+    CelebrityProductPromotion = apps.get_model('celebrities', 'CelebrityProductPromotion')
+    CelebrityCategory = apps.get_model('celebrities', 'CelebrityCategory')
+    CelebrityCategory.objects.bulk_create([
+        CelebrityCategory(celebrity_id=row['celebrity_id'], category_id=row['product__category_id'], promotions=row['total'])
+        for row in CelebrityProductPromotion.objects.order_by().values(
+            'celebrity_id', 'product__category_id'
+        ).annotate(total=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_counters'),
+        ('celebrities', '0003_celebrity_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CelebrityCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('promotions', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='celebrity_links', to='products.category')),
+                ('celebrity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_links', to='celebrities.celebrity')),
+            ],
+            options={
+                'verbose_name_plural': 'Celebrity categories',
+                'indexes': [models.Index(fields=['category', 'promotions'], name='celebrities_categor_b85768_idx')],
+                'unique_together': {('celebrity', 'category')},
+            },
+        ),
+        migrations.RunPython(build_category_links, migrations.RunPython.noop),
+    ]
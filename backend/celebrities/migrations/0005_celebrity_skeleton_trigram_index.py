@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_skeleton_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS celebrities_search_skeleton_trgm '
+        'ON celebrities_celebrity USING gin (search_skeleton gin_trgm_ops)'
+    )
+
+
+def drop_skeleton_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS celebrities_search_skeleton_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('celebrities', '0004_celebrity_categories'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_skeleton_index, drop_skeleton_index),
+    ]
@@ -34,6 +34,10 @@ class Celebrity(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Folded full name and its consonant skeleton, kept in step by save() (see celebrities.search)
+    search_name = models.CharField(max_length=255, blank=True, default='', editable=False)
+    search_skeleton = models.CharField(max_length=255, blank=True, default='', editable=False)
+    
     # Product relationships will be defined through separate models below
     
     class Meta:
@@ -47,6 +51,15 @@ class Celebrity(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def save(self, *args, **kwargs):
+        from .search import search_fields
+        
+        self.search_name, self.search_skeleton = search_fields(self.first_name, self.last_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_name', 'search_skeleton'}
+        super().save(*args, **kwargs)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -113,6 +126,16 @@ class CelebrityProductPromotion(models.Model):
     
     def __str__(self):
         return f"{self.celebrity.full_name} promotes {self.product.name} ({self.promotion_type})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored celebrity and product so saves can tell which
+        # celebrities' category links changed
+        values = instance.__dict__
+        if 'celebrity_id' in values and 'product_id' in values:
+            instance._loaded_link = (values['celebrity_id'], values['product_id'])
+        return instance
 
 
 class CelebrityMorningRoutine(models.Model):
@@ -188,4 +211,28 @@ class CelebrityEveningRoutine(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.celebrity.full_name} - Evening Routine Step {self.order}: {self.product.name}" 
\ No newline at end of file
+        return f"{self.celebrity.full_name} - Evening Routine Step {self.order}: {self.product.name}" 
+
+class CelebrityCategory(models.Model):
+    """
+    Which categories a celebrity promotes products in, with the number of
+    promotions per pair. Maintained by celebrities.category_map from
+    promotion and product category changes.
+    """
+    celebrity = models.ForeignKey(Celebrity, on_delete=models.CASCADE, related_name='category_links')
+    category = models.ForeignKey(
+        'products.Category',
+        on_delete=models.CASCADE,
+        related_name='celebrity_links'
+    )
+    promotions = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Celebrity categories'
+        unique_together = ('celebrity', 'category')
+        indexes = [
+            models.Index(fields=['category', 'promotions']),
+        ]
+    
+    def __str__(self):
+        return f"{self.celebrity_id} in category {self.category_id} ({self.promotions} promotions)"
@@ -0,0 +1,172 @@
+# celebrities/picks.py
+"""
+Payload of the celebrity_picks_products endpoint.
+
+build_picks needs the same handful of queries whatever the limit: the
+promotions to show (plus one fallback query when there aren't enough
+featured ones), one query each for the morning routines, evening routines
+and other promotions of every celebrity involved, trimmed per celebrity in
+SQL and grouped by celebrity_id in Python, and one query for every distinct
+product, which is serialized once and reused across sections.
+
+The assembled payload is cached under a celebrity namespace version. Any
+celebrity, promotion or routine change replaces the version (see
+celebrities.signals), which drops every cached variant at once. Product
+changes (price, stock) show up when the entry expires.
+"""
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import CelebrityProductPromotion, CelebrityMorningRoutine, CelebrityEveningRoutine
+
+NAMESPACE_CACHE_KEY = 'celebrities:namespace'
+
+# Products shown per section of a pick
+SECTION_SIZE = 3
+
+
+def picks_cache_ttl():
+    return getattr(settings, 'CELEBRITY_PICKS_CACHE_TTL', 15 * 60)
+
+
+def namespace_version():
+    """Current celebrity cache namespace; part of every celebrity cache key"""
+    version = cache.get(NAMESPACE_CACHE_KEY)
+    if version is None:
+        cache.add(NAMESPACE_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(NAMESPACE_CACHE_KEY)
+    return version
+
+
+def invalidate_celebrity_cache():
+    """Start a new namespace once the current transaction commits"""
+    # A fresh random version can't collide with one whose entries are still cached
+    transaction.on_commit(lambda: cache.set(NAMESPACE_CACHE_KEY, uuid.uuid4().hex, None))
+
+
+def _pick_promotions(limit):
+    """Featured promotions first, topped up with the newest others for products not picked yet"""
+    promotions = CelebrityProductPromotion.objects.filter(
+        celebrity__is_active=True,
+        product__is_active=True
+    ).select_related('celebrity').order_by('-created_at')
+
+    picks = list(promotions.filter(is_featured=True)[:limit])
+    if len(picks) < limit:
+        picks += list(promotions.exclude(
+            product_id__in=[promotion.product_id for promotion in picks]
+        )[:limit - len(picks)])
+    return picks
+
+
+def _by_celebrity(queryset, celebrity_ids, order_by, per_celebrity):
+    """{celebrity_id: [(row id, product_id), ...]} with the first per_celebrity rows of each celebrity"""
+    rows = queryset.filter(celebrity_id__in=celebrity_ids).annotate(
+        position=Window(RowNumber(), partition_by=[F('celebrity_id')], order_by=order_by)
+    ).filter(position__lte=per_celebrity).order_by('celebrity_id', 'position').values_list(
+        'celebrity_id', 'id', 'product_id'
+    )
+    grouped = defaultdict(list)
+    for celebrity_id, row_id, product_id in rows:
+        grouped[celebrity_id].append((row_id, product_id))
+    return grouped
+
+
+def _serialized_products(product_ids, request):
+    """{product_id: ProductListSerializer data}, one query for all of them"""
+    from products.models import Product
+    from products.serializers import ProductListSerializer
+
+    products = Product.objects.filter(id__in=product_ids).select_related('category', 'brand', 'rating_stats')
+    return {
+        data['id']: data for data in ProductListSerializer(products, many=True, context={'request': request}).data
+    }
+
+
+def _celebrity_image_url(celebrity, request):
+    if not celebrity.image:
+        return None
+    url = celebrity.image.url
+    return url if url.startswith('http') else request.build_absolute_uri(url)
+
+
+def build_picks(request, limit):
+    """The celebrity picks list in the format the storefront UI expects"""
+    promotions = _pick_promotions(limit)
+    if not promotions:
+        return []
+
+    celebrity_ids = {promotion.celebrity_id for promotion in promotions}
+    morning = _by_celebrity(
+        CelebrityMorningRoutine.objects.all(), celebrity_ids, [F('order').asc(), F('id').asc()], SECTION_SIZE
+    )
+    evening = _by_celebrity(
+        CelebrityEveningRoutine.objects.all(), celebrity_ids, [F('order').asc(), F('id').asc()], SECTION_SIZE
+    )
+    # One extra so a pick still has SECTION_SIZE others once its own promotion is left out
+    promoted = _by_celebrity(
+        CelebrityProductPromotion.objects.all(), celebrity_ids,
+        [F('created_at').desc(), F('id').desc()], SECTION_SIZE + 1
+    )
+
+    recommended = {}
+    for promotion in promotions:
+        recommended[promotion.id] = [
+            product_id for row_id, product_id in promoted[promotion.celebrity_id] if row_id != promotion.id
+        ][:SECTION_SIZE]
+
+    product_ids = {promotion.product_id for promotion in promotions}
+    for grouped in (morning, evening):
+        for rows in grouped.values():
+            product_ids.update(product_id for _, product_id in rows)
+    for ids in recommended.values():
+        product_ids.update(ids)
+    products = _serialized_products(product_ids, request)
+
+    def section(ids):
+        return [products[product_id] for product_id in ids if product_id in products]
+
+    picks = []
+    for promotion in promotions:
+        celebrity = promotion.celebrity
+        product = products.get(promotion.product_id)
+        if product is None:
+            continue
+        name = celebrity.full_name.strip()
+        image = _celebrity_image_url(celebrity, request)
+        picks.append({
+            'product': product,
+            'name': name,
+            'image': image,
+            'testimonial': promotion.testimonial or (
+                f"I absolutely love this {product['name']}! It's become an essential part of my beauty routine."
+            ),
+            'socialMediaLinks': celebrity.social_media_links,
+            'recommendedProducts': section(recommended[promotion.id]),
+            'morningRoutineProducts': section(product_id for _, product_id in morning[celebrity.id]),
+            'eveningRoutineProducts': section(product_id for _, product_id in evening[celebrity.id]),
+            'celebrity': {
+                'id': celebrity.id,
+                'name': name,
+                'image': image,
+                'bio': celebrity.bio or f"Beauty expert and influencer {celebrity.full_name}"
+            }
+        })
+    return picks
+
+
+def get_picks(request, limit):
+    """build_picks, cached per limit and host (product images are absolute URLs)"""
+    cache_key = (
+        f'celebrities:{namespace_version()}:picks_products:{limit}:{request.scheme}://{request.get_host()}'
+    )
+    picks = cache.get(cache_key)
+    if picks is None:
+        picks = build_picks(request, limit)
+        cache.set(cache_key, picks, picks_cache_ttl())
+    return picks
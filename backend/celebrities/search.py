@@ -0,0 +1,197 @@
+# celebrities/search.py
+"""
+Celebrity name search.
+
+Names are matched in folded form: case, Latin accents and Arabic diacritics
+are dropped, Arabic letter variants are unified (أ/إ/آ to ا, ة to ه, ى to ي)
+and punctuation becomes spaces. For script-insensitive matching every name
+also gets a consonant skeleton: Arabic letters are transliterated, common
+Latin spellings of the same sound are merged and vowels are dropped, so
+"Haifa Wehbe" and "هيفاء وهبي" both become "hf hb". Celebrity.save stores
+both forms in search_name and search_skeleton.
+
+On PostgreSQL, search_celebrity_ids matches with the pg_trgm % operator on
+search_name plus word-prefix LIKEs on search_name and search_skeleton, all
+served by GIN trigram indexes (migrations 0003 and 0005), and ranks by
+similarity.
+Elsewhere it uses an in-process prefix index over the active roster, rebuilt
+when the celebrity cache namespace changes (see celebrities.picks).
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When, IntegerField
+
+from .models import Celebrity
+from .picks import namespace_version
+
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+ARABIC_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    'ک': 'ك', 'ی': 'ي', 'ـ': None,
+})
+
+ARABIC_TO_LATIN = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': 'h', 'خ': 'kh', 'د': 'd',
+    'ذ': 'dh', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd', 'ط': 't',
+    'ظ': 'z', 'ع': '', 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ك': 'k', 'ل': 'l', 'م': 'm',
+    'ن': 'n', 'ه': 'h', 'و': 'w', 'ي': 'y', 'ء': '',
+})
+
+# Latin spellings of one Arabic sound, folded to a single placeholder (order matters)
+SKELETON_RULES = [
+    (re.compile(r'kh'), 'X'), (re.compile(r'(sh|ch)'), 'C'), (re.compile(r'th'), 'T'),
+    (re.compile(r'dh'), 'D'), (re.compile(r'gh'), 'G'), (re.compile(r'ph'), 'f'),
+    (re.compile(r'c(?=[eiy])'), 's'), (re.compile(r'[cq]'), 'k'), (re.compile(r'x'), 'ks'),
+    (re.compile(r'g'), 'j'), (re.compile(r'[aeiouwy]'), ''), (re.compile(r'(.)\1+'), r'\1'),
+    # A final h is usually a written-out vowel (Sarah, ساره)
+    (re.compile(r'(?<=.)h$'), ''),
+]
+
+
+def search_limit():
+    return getattr(settings, 'CELEBRITY_SEARCH_LIMIT', 20)
+
+
+def trigram_threshold():
+    return getattr(settings, 'CELEBRITY_SEARCH_TRIGRAM_THRESHOLD', 0.3)
+
+
+def fold(text):
+    """Lowercase, accent- and diacritic-free form of text with single spaces between words"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(NON_WORD_RE.sub(' ', stripped.casefold().translate(ARABIC_VARIANTS)).split())
+
+
+def skeleton(folded):
+    """Script-insensitive consonant skeleton of folded text, word by word"""
+    words = []
+    for word in folded.translate(ARABIC_TO_LATIN).split():
+        for pattern, replacement in SKELETON_RULES:
+            word = pattern.sub(replacement, word)
+        if word:
+            words.append(word)
+    return ' '.join(words)
+
+
+def search_fields(first_name, last_name):
+    """(search_name, search_skeleton) stored on a celebrity"""
+    folded = fold(f'{first_name} {last_name}')
+    return folded, skeleton(folded)
+
+
+class NamePrefixIndex:
+    """Sorted name tokens of the active roster, for token-prefix lookups"""
+
+    def __init__(self, rows):
+        # rows: (id, search_name, search_skeleton, first_name, last_name)
+        self.names = {}
+        folded_tokens, skeleton_tokens = [], []
+        for celebrity_id, search_name, search_skeleton, first_name, last_name in rows:
+            self.names[celebrity_id] = (search_name, (first_name.casefold(), last_name.casefold()))
+            folded_tokens.extend((token, celebrity_id) for token in search_name.split())
+            skeleton_tokens.extend((token, celebrity_id) for token in search_skeleton.split())
+        self.folded_tokens = sorted(folded_tokens)
+        self.skeleton_tokens = sorted(skeleton_tokens)
+
+    @staticmethod
+    def _with_prefix(tokens, prefix):
+        matched = set()
+        for token, celebrity_id in tokens[bisect_left(tokens, (prefix,)):]:
+            if not token.startswith(prefix):
+                break
+            matched.add(celebrity_id)
+        return matched
+
+    def _matching(self, tokens, query_tokens):
+        matched = None
+        for query_token in query_tokens:
+            ids = self._with_prefix(tokens, query_token)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched
+
+    def search(self, query, limit):
+        """Ids whose name tokens start with every query token, best matches first"""
+        folded = fold(query)
+        if not folded:
+            return []
+        by_name = self._matching(self.folded_tokens, folded.split())
+        query_skeleton = skeleton(folded)
+        by_sound = self._matching(self.skeleton_tokens, query_skeleton.split()) if query_skeleton else set()
+
+        def rank(celebrity_id):
+            search_name, sort_name = self.names[celebrity_id]
+            if search_name == folded:
+                tier = 0
+            elif search_name.startswith(folded):
+                tier = 1
+            elif celebrity_id in by_name:
+                tier = 2
+            else:
+                tier = 3
+            return tier, sort_name, celebrity_id
+
+        return sorted(by_name | by_sound, key=rank)[:limit]
+
+
+_index_lock = threading.Lock()
+_index = (None, None)
+
+
+def prefix_index():
+    """The process-local index, rebuilt after any celebrity change"""
+    global _index
+    version = namespace_version()
+    with _index_lock:
+        if _index[0] != version:
+            rows = Celebrity.objects.filter(is_active=True).values_list(
+                'id', 'search_name', 'search_skeleton', 'first_name', 'last_name'
+            )
+            _index = (version, NamePrefixIndex(rows))
+        return _index[1]
+
+
+def _word_prefixes(field, tokens):
+    """Every token starts some word of field"""
+    condition = Q()
+    for token in tokens:
+        condition &= Q(**{f'{field}__startswith': token}) | Q(**{f'{field}__contains': f' {token}'})
+    return condition
+
+
+def _trigram_search(query, limit):
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    folded = fold(query)
+    query_skeleton = skeleton(folded)
+    if not folded:
+        return []
+    with connection.cursor() as cursor:
+        # The % operator reads its threshold from the session; unlike
+        # similarity() >= x it can use the GIN index
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, false)", [str(trigram_threshold())])
+    matches = Q(TrigramSimilar(F('search_name'), Value(folded))) | _word_prefixes('search_name', folded.split())
+    if query_skeleton:
+        matches |= _word_prefixes('search_skeleton', query_skeleton.split())
+    return list(Celebrity.objects.filter(is_active=True).filter(matches).annotate(
+        similarity=TrigramSimilarity('search_name', folded),
+        prefix=Case(When(search_name__startswith=folded, then=0), default=1, output_field=IntegerField())
+    ).order_by(
+        'prefix', '-similarity', 'first_name', 'last_name', 'id'
+    ).values_list('id', flat=True)[:limit])
+
+
+def search_celebrity_ids(query, limit=None):
+    """Ids of active celebrities matching query, best first"""
+    limit = search_limit() if limit is None else limit
+    if connection.vendor == 'postgresql':
+        return _trigram_search(query, limit)
+    return prefix_index().search(query, limit)
@@ -1,6 +1,20 @@
 from rest_framework import serializers
+from django.db.models import Count, Q
 from .models import Celebrity, CelebrityProductPromotion, CelebrityMorningRoutine, CelebrityEveningRoutine
-from products.serializers import ProductSerializer
+from products.serializers import ProductListSerializer, ProductImageSerializer
+
+# Relations CelebrityProductSerializer reads: select the first ones with the
+# item and prefetch the others
+PRODUCT_RELATED = ('product__category', 'product__brand', 'product__rating_stats')
+PRODUCT_PREFETCH = ('product__images',)
+
+
+class CelebrityProductSerializer(ProductListSerializer):
+    """The compact product representation plus what the celebrity screens also show: description, category and gallery"""
+    images = ProductImageSerializer(many=True, read_only=True)
+    
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ['description', 'category', 'images']
 
 
 class CelebrityBasicSerializer(serializers.ModelSerializer):
@@ -20,7 +34,7 @@ class CelebrityBasicSerializer(serializers.ModelSerializer):
 class CelebrityProductPromotionSerializer(serializers.ModelSerializer):
     """Serializer for celebrity product promotions"""
     celebrity = CelebrityBasicSerializer(read_only=True)
-    product = ProductSerializer(read_only=True)
+    product = CelebrityProductSerializer(read_only=True)
     
     class Meta:
         model = CelebrityProductPromotion
@@ -32,7 +46,7 @@ class CelebrityProductPromotionSerializer(serializers.ModelSerializer):
 
 class CelebrityRoutineItemSerializer(serializers.ModelSerializer):
     """Base serializer for routine items"""
-    product = ProductSerializer(read_only=True)
+    product = CelebrityProductSerializer(read_only=True)
     
     class Meta:
         fields = ['id', 'product', 'order', 'description', 'created_at']
@@ -79,25 +93,37 @@ class CelebrityDetailSerializer(serializers.ModelSerializer):
             'evening_routine_count'
         ]
     
+    # The counts come from the prefetched items (see CelebrityDetailView)
     def get_total_promotions(self, obj):
-        return obj.product_promotions.count()
+        return len(obj.product_promotions.all())
     
     def get_featured_promotions(self, obj):
-        return obj.product_promotions.filter(is_featured=True).count()
+        return sum(1 for promotion in obj.product_promotions.all() if promotion.is_featured)
     
     def get_morning_routine_count(self, obj):
-        return obj.morning_routine_items.count()
+        return len(obj.morning_routine_items.all())
     
     def get_evening_routine_count(self, obj):
-        return obj.evening_routine_items.count()
+        return len(obj.evening_routine_items.all())
+
+
+def annotate_promotion_counts(queryset):
+    """Annotate the promotion counts CelebrityListSerializer reads, in the same query"""
+    return queryset.annotate(
+        total_promotions=Count('product_promotions'),
+        featured_promotions_count=Count('product_promotions', filter=Q(product_promotions__is_featured=True))
+    )
 
 
 class CelebrityListSerializer(serializers.ModelSerializer):
-    """Serializer for celebrity list view with summary information"""
+    """
+    Serializer for celebrity list view with summary information.
+    Expects a queryset passed through annotate_promotion_counts.
+    """
     full_name = serializers.CharField(read_only=True)
     social_media_links = serializers.DictField(read_only=True)
-    total_promotions = serializers.SerializerMethodField()
-    featured_promotions_count = serializers.SerializerMethodField()
+    total_promotions = serializers.IntegerField(read_only=True)
+    featured_promotions_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Celebrity
@@ -106,12 +132,6 @@ class CelebrityListSerializer(serializers.ModelSerializer):
             'bio', 'social_media_links', 'is_active', 'created_at',
             'total_promotions', 'featured_promotions_count'
         ]
-    
-    def get_total_promotions(self, obj):
-        return obj.product_promotions.count()
-    
-    def get_featured_promotions_count(self, obj):
-        return obj.product_promotions.filter(is_featured=True).count()
 
 
 # Product serializers with celebrity information
@@ -1,7 +1,10 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction
-from .models import CelebrityProductPromotion
+from .models import Celebrity, CelebrityProductPromotion, CelebrityMorningRoutine, CelebrityEveningRoutine
+from products.models import Product, DEFERRED
+from .category_map import schedule_category_refresh
+from .featured import schedule_featured_sync
+from .picks import invalidate_celebrity_cache
 
 
 @receiver(post_save, sender=CelebrityProductPromotion)
@@ -9,7 +12,11 @@ def update_product_featured_status_on_save(sender, instance, created, **kwargs):
     """
     Update product is_featured status when a celebrity promotion is created or updated
     """
-    update_product_featured_status(instance.product)
+    schedule_featured_sync(instance.product_id)
+    # A promotion moved to another celebrity or product changes both sides' categories
+    loaded = getattr(instance, '_loaded_link', None) or (instance.celebrity_id, instance.product_id)
+    schedule_category_refresh(celebrity_ids={loaded[0], instance.celebrity_id})
+    instance._loaded_link = (instance.celebrity_id, instance.product_id)
 
 
 @receiver(post_delete, sender=CelebrityProductPromotion)
@@ -17,23 +24,27 @@ def update_product_featured_status_on_delete(sender, instance, **kwargs):
     """
     Update product is_featured status when a celebrity promotion is deleted
     """
-    update_product_featured_status(instance.product)
+    schedule_featured_sync(instance.product_id)
+    schedule_category_refresh(celebrity_ids=[instance.celebrity_id])
 
 
-def update_product_featured_status(product):
+@receiver(post_save, sender=Product)
+def update_celebrity_categories_on_product_move(sender, instance, created, raw=False, **kwargs):
+    """Celebrities promoting a product that changed category follow it"""
+    if raw or created:
+        return
+    if getattr(instance, '_loaded_category_id', DEFERRED) != instance.category_id:
+        schedule_category_refresh(product_ids=[instance.pk])
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver([post_save, post_delete], sender=Celebrity)
+@receiver([post_save, post_delete], sender=CelebrityProductPromotion)
+@receiver([post_save, post_delete], sender=CelebrityMorningRoutine)
+@receiver([post_save, post_delete], sender=CelebrityEveningRoutine)
+def invalidate_celebrity_cache_on_change(sender, **kwargs):
     """
-    Update the is_featured status of a product based on its celebrity promotions
+    Drop cached celebrity payloads (picks) when celebrities, their promotions
+    or their routines change
     """
-    # Check if the product has any featured celebrity promotions
-    has_featured_promotions = CelebrityProductPromotion.objects.filter(
-        product=product,
-        is_featured=True
-    ).exists()
-    
-    # Update the product's is_featured status if it's different
-    if product.is_featured != has_featured_promotions:
-        with transaction.atomic():
-            product.is_featured = has_featured_promotions
-            product.save(update_fields=['is_featured'])
-            
-            print(f"Updated product '{product.name}' is_featured to {has_featured_promotions}") 
\ No newline at end of file
+    invalidate_celebrity_cache()
@@ -0,0 +1,333 @@
+import unittest
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from celebrities.models import (
+    Celebrity, CelebrityProductPromotion, CelebrityMorningRoutine, CelebrityEveningRoutine
+)
+from celebrities.picks import build_picks
+from products.models import Product, Category
+from decimal import Decimal
+from django.core.cache import cache
+
+
+class CelebrityDataMixin:
+    """Three celebrities with four-step routines and three promotions each"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Picks Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Pick Product {i}',
+                description='Celebrity picks test product',
+                price=Decimal('20.00'),
+                category=self.category,
+                sku=f'PICK{i:03d}'
+            )
+            for i in range(12)
+        ]
+        self.celebrities = [
+            Celebrity.objects.create(first_name=f'Star{i}', last_name='Test', bio=f'Bio {i}')
+            for i in range(3)
+        ]
+        for i, celebrity in enumerate(self.celebrities):
+            for step in range(4):
+                CelebrityMorningRoutine.objects.create(
+                    celebrity=celebrity, product=self.products[(i + step) % 12], order=step + 1
+                )
+                CelebrityEveningRoutine.objects.create(
+                    celebrity=celebrity, product=self.products[(i + step + 4) % 12], order=4 - step
+                )
+            for j in range(3):
+                CelebrityProductPromotion.objects.create(
+                    celebrity=celebrity, product=self.products[i * 3 + j], is_featured=(j == 0)
+                )
+
+
+
+class CelebrityPicksTestCase(CelebrityDataMixin, TestCase):
+    """Test cases for the batched celebrity picks payload"""
+
+    def _build(self, limit):
+        request = RequestFactory().get('/celebrities/picks/products/')
+        return build_picks(request, limit)
+
+    def test_sections_follow_routine_order(self):
+        picks = self._build(4)
+        self.assertEqual(len(picks), 4)
+        # The three featured promotions come first, newest first
+        self.assertEqual(
+            [pick['celebrity']['id'] for pick in picks[:3]],
+            [celebrity.id for celebrity in reversed(self.celebrities)]
+        )
+
+        pick = picks[2]
+        self.assertEqual(pick['name'], 'Star0 Test')
+        self.assertEqual(pick['product']['id'], self.products[0].id)
+        self.assertEqual([p['id'] for p in pick['morningRoutineProducts']], [p.id for p in self.products[0:3]])
+        # Evening steps were created in reverse order
+        self.assertEqual(
+            [p['id'] for p in pick['eveningRoutineProducts']],
+            [self.products[7].id, self.products[6].id, self.products[5].id]
+        )
+        # Other promotions of the same celebrity, without the picked one
+        self.assertEqual(
+            [p['id'] for p in pick['recommendedProducts']],
+            [self.products[2].id, self.products[1].id]
+        )
+        self.assertEqual(pick['celebrity']['bio'], 'Bio 0')
+        self.assertTrue(pick['testimonial'])
+
+    def test_fallback_skips_products_already_picked(self):
+        picks = self._build(6)
+        product_ids = [pick['product']['id'] for pick in picks]
+        self.assertEqual(len(product_ids), 6)
+        self.assertEqual(len(set(product_ids)), 6)
+
+    def test_query_count_does_not_grow_with_limit(self):
+        # promotions, fallback promotions, morning, evening, other promotions, products
+        with self.assertNumQueries(6):
+            self._build(4)
+        with self.assertNumQueries(6):
+            self._build(9)
+
+    def test_payload_is_cached_until_celebrities_change(self):
+        client = APIClient()
+        url = reverse('celebrities:celebrity-picks-products')
+        first = client.get(url, {'limit': 2})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data[0]['name'], 'Star2 Test')
+
+        Celebrity.objects.filter(pk=self.celebrities[2].pk).update(first_name='Renamed')
+        self.assertEqual(client.get(url, {'limit': 2}).data[0]['name'], 'Star2 Test')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            celebrity = Celebrity.objects.get(pk=self.celebrities[2].pk)
+            celebrity.save()
+        self.assertEqual(client.get(url, {'limit': 2}).data[0]['name'], 'Renamed Test')
+
+
+class CelebrityRoutineEndpointsTestCase(CelebrityDataMixin, TestCase):
+    """Test cases for the compact product representation on celebrity endpoints"""
+
+    def _queries(self, url):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries.captured_queries)
+
+    def test_detail_queries_do_not_grow_with_items(self):
+        celebrity = self.celebrities[0]
+        url = reverse('celebrities:celebrity-detail', args=[celebrity.pk])
+        response, before = self._queries(url)
+        self.assertEqual(response.data['total_promotions'], 3)
+        self.assertEqual(response.data['featured_promotions'], 1)
+        self.assertEqual(response.data['morning_routine_count'], 4)
+
+        product = response.data['morning_routine_items'][0]['product']
+        self.assertEqual(product['id'], self.products[0].id)
+        self.assertIn('rating', product)
+        self.assertNotIn('variants', product)
+
+        for product in self.products[6:10]:
+            CelebrityProductPromotion.objects.create(celebrity=celebrity, product=product, is_featured=True)
+        response, after = self._queries(url)
+        self.assertEqual(response.data['total_promotions'], 7)
+        self.assertEqual(response.data['featured_promotions'], 5)
+        self.assertEqual(after, before)
+
+    def test_routine_endpoint_uses_compact_products(self):
+        from products.models import ProductImage
+        url = reverse('celebrities:celebrity-evening-routine', args=[self.celebrities[1].pk])
+        response, before = self._queries(url)
+        items = response.data['evening_routine']
+        self.assertEqual([item['order'] for item in items], [1, 2, 3, 4])
+        self.assertEqual(items[0]['product']['id'], self.products[8].id)
+        self.assertEqual(items[0]['product']['images'], [])
+        self.assertEqual(items[0]['product']['description'], self.products[8].description)
+        self.assertEqual(items[0]['product']['category'], self.products[8].category_id)
+        self.assertNotIn('variants', items[0]['product'])
+
+        # Gallery images are prefetched for all items at once
+        for product in self.products[8:12]:
+            ProductImage.objects.create(product=product, image=f'products/{product.sku}.jpg')
+        response, after = self._queries(url)
+        image = response.data['evening_routine'][0]['product']['images'][0]
+        self.assertTrue(image['image'].startswith('http://testserver/'))
+        self.assertEqual(after, before)
+
+
+class CelebrityListCountsTestCase(CelebrityDataMixin, TestCase):
+    """Test cases for annotated promotion counts on celebrity lists"""
+
+    def test_list_counts_come_from_one_query(self):
+        CelebrityProductPromotion.objects.create(
+            celebrity=self.celebrities[1], product=self.products[11], is_featured=True
+        )
+        from celebrities.serializers import CelebrityListSerializer, annotate_promotion_counts
+        with self.assertNumQueries(1):
+            data = CelebrityListSerializer(annotate_promotion_counts(Celebrity.objects.all()), many=True).data
+        counts = {row['id']: (row['total_promotions'], row['featured_promotions_count']) for row in data}
+        self.assertEqual(counts[self.celebrities[0].id], (3, 1))
+        self.assertEqual(counts[self.celebrities[1].id], (4, 2))
+
+    def test_category_filter_counts_all_promotions(self):
+        other = Category.objects.create(name='Other Picks Category')
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[0].pk)
+            product.category = other
+            product.save()
+        response = APIClient().get(reverse('celebrities:celebrities-by-category'), {'category_id': other.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        celebrities = response.data['celebrities']
+        self.assertEqual([row['id'] for row in celebrities], [self.celebrities[0].id])
+        self.assertEqual(celebrities[0]['total_promotions'], 3)
+
+
+class CelebrityCategoryMapTestCase(CelebrityDataMixin, TestCase):
+    """Test cases for the maintained celebrity-category links"""
+
+    def _links(self):
+        from celebrities.models import CelebrityCategory
+        return set(CelebrityCategory.objects.values_list('celebrity_id', 'category_id', 'promotions'))
+
+    def test_links_follow_promotions_and_product_moves(self):
+        from celebrities.category_map import refresh_celebrity_categories
+        refresh_celebrity_categories()
+        star0, star1, star2 = self.celebrities
+        self.assertEqual(self._links(), {(c.id, self.category.id, 3) for c in self.celebrities})
+
+        lipsticks = Category.objects.create(name='Lipsticks', parent=self.category)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[1].pk)
+            product.category = lipsticks
+            product.save()
+            CelebrityProductPromotion.objects.create(celebrity=star2, product=self.products[1])
+            promotion = CelebrityProductPromotion.objects.get(celebrity=star1, product=self.products[3])
+            promotion.celebrity = star0
+            promotion.save()
+        self.assertEqual(self._links(), {
+            (star0.id, self.category.id, 3), (star0.id, lipsticks.id, 1),
+            (star1.id, self.category.id, 2),
+            (star2.id, self.category.id, 3), (star2.id, lipsticks.id, 1),
+        })
+
+        url = reverse('celebrities:celebrities-by-category')
+        response = APIClient().get(url, {'category_id': lipsticks.id})
+        self.assertEqual({row['id'] for row in response.data['celebrities']}, {star0.id, star2.id})
+        # Subtree filtering includes lipsticks; star0 has the most promotions there
+        response = APIClient().get(url, {'category_id': self.category.id, 'include_subcategories': 'true'})
+        self.assertEqual([row['id'] for row in response.data['celebrities']], [star0.id, star2.id, star1.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CelebrityProductPromotion.objects.filter(product=self.products[1]).delete()
+        self.assertNotIn(lipsticks.id, {category_id for _, category_id, _ in self._links()})
+
+
+class FeaturedSyncTestCase(CelebrityDataMixin, TestCase):
+    """Test cases for syncing Product.is_featured with featured promotions"""
+
+    def test_promotion_changes_sync_once_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for celebrity in self.celebrities:
+                CelebrityProductPromotion.objects.create(
+                    celebrity=celebrity, product=self.products[10], is_featured=True
+                )
+            CelebrityProductPromotion.objects.filter(product=self.products[0]).delete()
+        self.products[10].refresh_from_db()
+        self.assertFalse(self.products[10].is_featured)
+
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        product_queries = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(product_queries), 1)
+        self.assertEqual(
+            set(Product.objects.filter(is_featured=True).values_list('id', flat=True)),
+            {self.products[3].id, self.products[6].id, self.products[10].id}
+        )
+
+    def test_command_fixes_whole_catalog(self):
+        from io import StringIO
+        from django.core.management import call_command
+        Product.objects.update(is_featured=False)
+        Product.objects.filter(pk=self.products[11].pk).update(is_featured=True)
+
+        call_command('sync_featured_products', dry_run=True, stdout=StringIO())
+        self.assertFalse(Product.objects.get(pk=self.products[0].pk).is_featured)
+
+        call_command('sync_featured_products', stdout=StringIO())
+        self.assertEqual(
+            set(Product.objects.filter(is_featured=True).values_list('id', flat=True)),
+            {self.products[0].id, self.products[3].id, self.products[6].id}
+        )
+
+
+class CelebritySearchTestCase(TestCase):
+    """Test cases for folded, script-insensitive celebrity name search"""
+
+    def setUp(self):
+        cache.clear()
+        names = [('Haifa', 'Wehbe'), ('Nancy', 'Ajram'), ('Mohamed', 'Ramadan'), ('Zoé', 'Saldaña'), ('Nadine', 'Nassib')]
+        self.celebrities = {
+            first_name: Celebrity.objects.create(first_name=first_name, last_name=last_name)
+            for first_name, last_name in names
+        }
+        Celebrity.objects.create(first_name='Hidden', last_name='Star', is_active=False)
+
+    def _search(self, query):
+        response = APIClient().get(reverse('celebrities:search-celebrities'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['first_name'] for row in response.data['results']]
+
+    def test_folded_prefix_matching(self):
+        self.assertEqual(self._search('zoe sal'), ['Zoé'])
+        self.assertEqual(self._search('NA'), ['Nadine', 'Nancy'])
+        self.assertEqual(self._search('nassib nad'), ['Nadine'])
+        self.assertEqual(self._search('hidden'), [])
+
+    def test_arabic_and_latin_spellings_match(self):
+        self.assertEqual(self._search('هيفاء'), ['Haifa'])
+        self.assertEqual(self._search('محمد رمضان'), ['Mohamed'])
+        self.assertEqual(self._search('Muhammad'), ['Mohamed'])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'trigram search needs PostgreSQL')
+    def test_trigram_search_matches_word_prefixes(self):
+        from celebrities.search import _trigram_search
+        with self.settings(CELEBRITY_SEARCH_TRIGRAM_THRESHOLD=1.0):
+            self.assertEqual(_trigram_search('nassib nad', 10), [self.celebrities['Nadine'].id])
+            self.assertEqual(_trigram_search('zoe sal', 10), [self.celebrities['Zoé'].id])
+            self.assertEqual(_trigram_search('wehbe nancy', 10), [])
+            self.assertEqual(_trigram_search('Muhammad', 10), [self.celebrities['Mohamed'].id])
+
+    def test_index_follows_roster_changes(self):
+        self.assertEqual(self._search('ajram'), ['Nancy'])
+        with self.captureOnCommitCallbacks(execute=True):
+            celebrity = self.celebrities['Nancy']
+            celebrity.last_name = 'Abdo'
+            celebrity.save(update_fields=['last_name'])
+        self.assertEqual(self._search('ajram'), [])
+        self.assertEqual(self._search('abdo'), ['Nancy'])
+
+    def test_product_suggest_includes_celebrities(self):
+        category = Category.objects.create(name='Suggest Category')
+        Product.objects.create(
+            name='Nadine Lipstick', description='Suggest test product', price=Decimal('9.00'),
+            category=category, sku='SUGGEST001'
+        )
+        response = APIClient().get(reverse('product-suggest'), {'q': 'nad'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.data['products']], ['Nadine Lipstick'])
+        self.assertEqual([row['name'] for row in response.data['celebrities']], ['Nadine Nassib'])
+
+        for limit in ('abc', '-3'):
+            response = APIClient().get(reverse('product-suggest'), {'q': 'nad', 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['products']), 1)
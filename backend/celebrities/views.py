@@ -4,17 +4,25 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
 from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch, Q
+from django.db.models import Prefetch
 from django.conf import settings
 from .models import Celebrity, CelebrityProductPromotion, CelebrityMorningRoutine, CelebrityEveningRoutine
+from .category_map import category_celebrity_ids
+from .picks import get_picks
+from .search import search_celebrity_ids, search_limit
 from .serializers import (
     CelebrityListSerializer, 
     CelebrityDetailSerializer, 
     CelebrityProductPromotionSerializer,
-    ProductCelebrityEndorsementSerializer
+    ProductCelebrityEndorsementSerializer,
+    PRODUCT_RELATED, PRODUCT_PREFETCH, CelebrityProductSerializer,
+    annotate_promotion_counts
 )
 from products.models import Product
-from products.serializers import ProductSerializer, ProductListSerializer
+
+# Upper bound on ?limit= for celebrity_picks_products (each value is cached separately)
+MAX_PICKS_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
 
 
 # Custom throttle class for celebrity endpoints with higher limits
@@ -29,8 +37,8 @@ class CelebrityListView(generics.ListAPIView):
     throttle_classes = [CelebrityRateThrottle]
     
     def get_queryset(self):
-        return Celebrity.objects.filter(is_active=True).prefetch_related(
-            'product_promotions'
+        return annotate_promotion_counts(
+            Celebrity.objects.filter(is_active=True)
         ).order_by('first_name', 'last_name')
 
 
@@ -45,15 +53,21 @@ class CelebrityDetailView(generics.RetrieveAPIView):
         return Celebrity.objects.filter(is_active=True).prefetch_related(
             Prefetch(
                 'morning_routine_items',
-                queryset=CelebrityMorningRoutine.objects.select_related('product').order_by('order')
+                queryset=CelebrityMorningRoutine.objects.select_related(*PRODUCT_RELATED).prefetch_related(
+                    *PRODUCT_PREFETCH
+                ).order_by('order')
             ),
             Prefetch(
                 'evening_routine_items', 
-                queryset=CelebrityEveningRoutine.objects.select_related('product').order_by('order')
+                queryset=CelebrityEveningRoutine.objects.select_related(*PRODUCT_RELATED).prefetch_related(
+                    *PRODUCT_PREFETCH
+                ).order_by('order')
             ),
             Prefetch(
                 'product_promotions',
-                queryset=CelebrityProductPromotion.objects.select_related('product').order_by('-is_featured', '-created_at')
+                queryset=CelebrityProductPromotion.objects.select_related(*PRODUCT_RELATED).prefetch_related(
+                    *PRODUCT_PREFETCH
+                ).order_by('-is_featured', '-created_at')
             )
         )
 
@@ -67,14 +81,16 @@ def celebrity_promotions(request, celebrity_id):
     
     promotions = CelebrityProductPromotion.objects.filter(
         celebrity=celebrity
-    ).select_related('product').order_by('-is_featured', '-created_at')
+    ).select_related('celebrity', *PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH).order_by(
+        '-is_featured', '-created_at'
+    )
     
     # Filter by promotion type if specified
     promotion_type = request.GET.get('type')
     if promotion_type:
         promotions = promotions.filter(promotion_type=promotion_type)
     
-    serializer = CelebrityProductPromotionSerializer(promotions, many=True)
+    serializer = CelebrityProductPromotionSerializer(promotions, many=True, context={'request': request})
     return Response({
         'celebrity': celebrity.full_name,
         'promotions': serializer.data
@@ -90,11 +106,11 @@ def celebrity_morning_routine(request, celebrity_id):
     
     routine_items = CelebrityMorningRoutine.objects.filter(
         celebrity=celebrity
-    ).select_related('product').order_by('order')
+    ).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH).order_by('order')
     
     products_data = []
     for item in routine_items:
-        product_serializer = ProductSerializer(item.product)
+        product_serializer = CelebrityProductSerializer(item.product, context={'request': request})
         products_data.append({
             'order': item.order,
             'description': item.description,
@@ -116,11 +132,11 @@ def celebrity_evening_routine(request, celebrity_id):
     
     routine_items = CelebrityEveningRoutine.objects.filter(
         celebrity=celebrity
-    ).select_related('product').order_by('order')
+    ).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH).order_by('order')
     
     products_data = []
     for item in routine_items:
-        product_serializer = ProductSerializer(item.product)
+        product_serializer = CelebrityProductSerializer(item.product, context={'request': request})
         products_data.append({
             'order': item.order,
             'description': item.description,
@@ -143,7 +159,7 @@ def celebrity_picks(request):
     featured_promotions = CelebrityProductPromotion.objects.filter(
         is_featured=True,
         celebrity__is_active=True
-    ).select_related('celebrity', 'product').order_by('-created_at')
+    ).select_related('celebrity', *PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH).order_by('-created_at')
     
     # Filter by celebrity if specified
     celebrity_id = request.GET.get('celebrity_id')
@@ -156,7 +172,7 @@ def celebrity_picks(request):
     
     picks_data = []
     for promotion in featured_promotions:
-        product_serializer = ProductSerializer(promotion.product)
+        product_serializer = CelebrityProductSerializer(promotion.product, context={'request': request})
         picks_data.append({
             'celebrity': {
                 'id': promotion.celebrity.id,
@@ -180,123 +196,8 @@ def celebrity_picks_products(request):
     """Get celebrity picks in the original complex format for the existing UI"""
     
     try:
-        limit = int(request.GET.get('limit', 4))
-        
-        # Get featured promotions with proper error handling
-        featured_promotions = CelebrityProductPromotion.objects.filter(
-            is_featured=True,
-            celebrity__is_active=True,
-            product__is_active=True
-        ).select_related(
-            'product', 
-            'celebrity',
-            'product__category',
-            'product__brand'
-        ).prefetch_related(
-            'product__images'
-        ).order_by('-created_at')[:limit]
-        
-        # If we don't have enough featured promotions, fallback to any promotions
-        if len(featured_promotions) < limit:
-            remaining_needed = limit - len(featured_promotions)
-            existing_product_ids = [p.product.id for p in featured_promotions]
-            
-            fallback_promotions = CelebrityProductPromotion.objects.filter(
-                celebrity__is_active=True,
-                product__is_active=True
-            ).exclude(
-                product__id__in=existing_product_ids
-            ).select_related(
-                'product', 
-                'celebrity',
-                'product__category',
-                'product__brand'
-            ).prefetch_related(
-                'product__images'
-            ).order_by('-created_at')[:remaining_needed]
-            
-            featured_promotions = list(featured_promotions) + list(fallback_promotions)
-        
-        # Transform to the complex format expected by the original UI
-        picks_data = []
-        for promotion in featured_promotions:
-            try:
-                # Serialize product with all necessary fields
-                product_serializer = ProductListSerializer(promotion.product, context={'request': request})
-                celebrity = promotion.celebrity
-                
-                # Get related products with error handling
-                try:
-                    morning_routine = CelebrityMorningRoutine.objects.filter(
-                        celebrity=celebrity
-                    ).select_related('product', 'product__category', 'product__brand').prefetch_related('product__images')[:3]
-                    
-                    evening_routine = CelebrityEveningRoutine.objects.filter(
-                        celebrity=celebrity
-                    ).select_related('product', 'product__category', 'product__brand').prefetch_related('product__images')[:3]
-                    
-                    recommended_products = CelebrityProductPromotion.objects.filter(
-                        celebrity=celebrity
-                    ).exclude(id=promotion.id).select_related('product', 'product__category', 'product__brand').prefetch_related('product__images')[:3]
-                except Exception as e:
-                    print(f"Error fetching related products for celebrity {celebrity.id}: {e}")
-                    morning_routine = []
-                    evening_routine = []
-                    recommended_products = []
-                
-                # Safely get celebrity image URL
-                celebrity_image_url = None
-                if celebrity.image:
-                    try:
-                        celebrity_image_url = celebrity.image.url
-                        # Ensure full URL
-                        if not celebrity_image_url.startswith('http'):
-                            celebrity_image_url = request.build_absolute_uri(celebrity_image_url)
-                    except Exception as e:
-                        print(f"Error getting celebrity image URL: {e}")
-                        celebrity_image_url = None
-                
-                # Build social media links safely
-                social_media_links = {}
-                if hasattr(celebrity, 'social_media_links') and celebrity.social_media_links:
-                    try:
-                        social_media_links = celebrity.social_media_links if isinstance(celebrity.social_media_links, dict) else {}
-                    except Exception as e:
-                        print(f"Error processing social media links: {e}")
-                        social_media_links = {}
-                
-                pick_data = {
-                    'product': product_serializer.data,
-                    'name': celebrity.full_name or f"{celebrity.first_name} {celebrity.last_name}".strip(),
-                    'image': celebrity_image_url,
-                    'testimonial': promotion.testimonial or f"I absolutely love this {promotion.product.name}! It's become an essential part of my beauty routine.",
-                    'socialMediaLinks': social_media_links,
-                    'recommendedProducts': [
-                        ProductListSerializer(rp.product, context={'request': request}).data 
-                        for rp in recommended_products
-                    ],
-                    'morningRoutineProducts': [
-                        ProductListSerializer(mr.product, context={'request': request}).data 
-                        for mr in morning_routine
-                    ],
-                    'eveningRoutineProducts': [
-                        ProductListSerializer(er.product, context={'request': request}).data 
-                        for er in evening_routine
-                    ],
-                    'celebrity': {
-                        'id': celebrity.id,
-                        'name': celebrity.full_name or f"{celebrity.first_name} {celebrity.last_name}".strip(),
-                        'image': celebrity_image_url,
-                        'bio': celebrity.bio or f"Beauty expert and influencer {celebrity.full_name}"
-                    }
-                }
-                picks_data.append(pick_data)
-                
-            except Exception as e:
-                print(f"Error processing celebrity pick for promotion {promotion.id}: {e}")
-                continue
-        
-        return Response(picks_data)
+        limit = max(0, min(int(request.GET.get('limit', 4)), MAX_PICKS_LIMIT))
+        return Response(get_picks(request, limit))
         
     except Exception as e:
         print(f"Error in celebrity_picks_products view: {e}")
@@ -336,11 +237,16 @@ def celebrities_by_category(request):
     if not category_id:
         return Response({'error': 'category_id parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Get celebrities who promote products in the specified category
-    celebrities = Celebrity.objects.filter(
-        is_active=True,
-        product_promotions__product__category_id=category_id
-    ).distinct().prefetch_related('product_promotions')
+    try:
+        category_id = int(category_id)
+    except ValueError:
+        return Response({'error': 'category_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    include_subcategories = request.GET.get('include_subcategories', 'false').lower() == 'true'
+    
+    # Get celebrities who promote products in the specified category, most promotions first
+    celebrity_ids = category_celebrity_ids(category_id, include_subcategories=include_subcategories)
+    found = annotate_promotion_counts(Celebrity.objects.filter(id__in=celebrity_ids)).in_bulk()
+    celebrities = [found[celebrity_id] for celebrity_id in celebrity_ids if celebrity_id in found]
     
     serializer = CelebrityListSerializer(celebrities, many=True)
     
@@ -359,14 +265,20 @@ def search_celebrities(request):
     if not query:
         return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    celebrities = Celebrity.objects.filter(
-        Q(first_name__icontains=query) | Q(last_name__icontains=query),
-        is_active=True
-    ).prefetch_related('product_promotions').order_by('first_name', 'last_name')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', search_limit())), MAX_SEARCH_LIMIT))
+    except ValueError:
+        limit = search_limit()
+    
+    # Ranked matches from the name search, then one query for the listed fields
+    celebrity_ids = search_celebrity_ids(query, limit)
+    celebrities = annotate_promotion_counts(Celebrity.objects.filter(id__in=celebrity_ids)).in_bulk()
     
-    serializer = CelebrityListSerializer(celebrities, many=True)
+    serializer = CelebrityListSerializer(
+        [celebrities[celebrity_id] for celebrity_id in celebrity_ids if celebrity_id in celebrities], many=True
+    )
     
     return Response({
         'query': query,
         'results': serializer.data
-    }) 
\ No newline at end of file
+    })
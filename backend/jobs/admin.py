@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'priority', 'attempts', 'run_at', 'duration', 'worker', 'created_at']
+    list_filter = ['status', 'task', 'created_at']
+    search_fields = ['task', 'dedupe_key', 'last_error']
+    readonly_fields = [
+        'dedupe_key', 'attempts', 'worker', 'locked_at', 'started_at', 'finished_at',
+        'duration', 'result', 'last_error', 'created_at'
+    ]
+    date_hierarchy = 'created_at'
+    actions = ['requeue_jobs']
+    
+    def requeue_jobs(self, request, queryset):
+        """Run selected failed or finished jobs again"""
+        updated = queryset.exclude(status='running').update(
+            status='queued', run_at=timezone.now(), attempts=0, last_error=''
+        )
+        self.message_user(request, f"{updated} jobs requeued.")
+    requeue_jobs.short_description = "Requeue selected jobs"
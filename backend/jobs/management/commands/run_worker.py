@@ -0,0 +1,114 @@
+import os
+import signal
+import socket
+import threading
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from jobs.queue import claim_job, job_stats, recover_stale_jobs, run_job, schedule_periodic_jobs
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=getattr(settings, 'JOBS_WORKER_THREADS', 2),
+            help='Number of worker threads (default: JOBS_WORKER_THREADS)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'JOBS_POLL_INTERVAL', 2),
+            help='Seconds a thread sleeps when the queue is empty (default: JOBS_POLL_INTERVAL)'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Run until the queue is empty, then exit'
+        )
+        parser.add_argument(
+            '--no-schedule',
+            action='store_true',
+            help="Don't enqueue the periodic jobs from JOBS_PERIODIC"
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print per-task job counts and timings and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self._print_stats()
+            return
+
+        self.stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *args: self.stop.set())
+            signal.signal(signal.SIGINT, lambda *args: self.stop.set())
+
+        worker_name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(f"Starting {options['threads']} worker threads as {worker_name}")
+
+        recover_stale_jobs()
+        if not options['no_schedule']:
+            schedule_periodic_jobs()
+
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(f'{worker_name}:{i}', options['interval'], options['burst']),
+                daemon=True
+            )
+            for i in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+
+        # The main thread only schedules periodic jobs and waits for shutdown
+        while any(thread.is_alive() for thread in threads):
+            if self.stop.wait(options['interval']):
+                break
+            if not options['no_schedule'] and not options['burst']:
+                schedule_periodic_jobs()
+                recover_stale_jobs()
+
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
+
+    def _work(self, worker_name, interval, burst):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_job(worker_name)
+                if job is None:
+                    if burst:
+                        return
+                    self.stop.wait(interval)
+                    continue
+
+                ok = run_job(job)
+                self.stdout.write(
+                    f"[{worker_name}] {job.task} #{job.id} {'succeeded' if ok else 'failed'}"
+                )
+        finally:
+            connection.close()
+
+    def _print_stats(self):
+        rows = job_stats()
+        if not rows:
+            self.stdout.write(self.style.WARNING('No jobs recorded.'))
+            return
+
+        header = f"{'Task':<40} {'Total':>6} {'OK':>6} {'Failed':>6} {'Queued':>6} {'Avg ms':>9} {'Max ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['task'][:40]:<40} {row['total']:>6} {row['succeeded']:>6} {row['failed']:>6} "
+                f"{row['queued']:>6} {row['avg_duration'] or 0:>9.1f} {row['max_duration'] or 0:>9.1f}"
+            )
@@ -0,0 +1,182 @@
+"""
+Database-backed job queue.
+
+Jobs are rows in the jobs_job table. Workers claim due jobs with
+`SELECT ... FOR UPDATE SKIP LOCKED` (where the database supports it), so
+any number of worker threads and processes can share the queue without a
+broker and without picking up the same job twice. Failed jobs are retried
+with exponential backoff, and every attempt records its run time.
+
+While a job runs, a heartbeat thread refreshes its locked_at every
+JOBS_HEARTBEAT_INTERVAL seconds. recover_stale_jobs only requeues running
+jobs whose heartbeat has stopped, i.e. whose worker died.
+"""
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task_name, kwargs=None, run_at=None, priority=0, max_attempts=3, dedupe_key=None):
+    """
+    Add a job to the queue. With a dedupe_key, an existing job with the same
+    key is returned instead of queueing a duplicate.
+    """
+    get_task(task_name)  # fail fast on unknown task names
+    fields = {
+        'task': task_name,
+        'kwargs': kwargs or {},
+        'run_at': run_at or timezone.now(),
+        'priority': priority,
+        'max_attempts': max_attempts,
+    }
+    if dedupe_key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(dedupe_key=dedupe_key, defaults=fields)
+    return job
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'JOBS_RETRY_DELAY', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 60 * 60))
+
+
+def claim_job(worker_name):
+    """Lock and mark the next due job as running; returns None if nothing is due"""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Job.objects.filter(
+            status='queued', run_at__lte=now
+        ).order_by('-priority', 'run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+
+        # The status guard keeps backends without row locks from double-claiming
+        claimed = Job.objects.filter(id=job.id, status='queued').update(
+            status='running',
+            worker=worker_name,
+            locked_at=now,
+            started_at=now,
+            attempts=job.attempts + 1
+        )
+        if not claimed:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+@contextmanager
+def heartbeat(job_id):
+    """Keep a running job's locked_at fresh until the block exits"""
+    interval = getattr(settings, 'JOBS_HEARTBEAT_INTERVAL', 60)
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    Job.objects.filter(id=job_id, status='running').update(locked_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Heartbeat for job #{job_id} failed: {e}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome and timing"""
+    start = time.perf_counter()
+    try:
+        with heartbeat(job.id):
+            result = get_task(job.task)(**job.kwargs)
+    except Exception as e:
+        duration = (time.perf_counter() - start) * 1000
+        logger.warning(f"Job {job.task} #{job.id} failed (attempt {job.attempts}): {e}")
+        retry = job.attempts < job.max_attempts
+        Job.objects.filter(id=job.id).update(
+            status='queued' if retry else 'failed',
+            run_at=timezone.now() + retry_delay(job.attempts) if retry else job.run_at,
+            finished_at=timezone.now(),
+            duration=duration,
+            last_error=traceback.format_exc(),
+            locked_at=None
+        )
+        return False
+
+    duration = (time.perf_counter() - start) * 1000
+    Job.objects.filter(id=job.id).update(
+        status='succeeded',
+        finished_at=timezone.now(),
+        duration=duration,
+        result='' if result is None else str(result),
+        locked_at=None
+    )
+    return True
+
+
+def recover_stale_jobs():
+    """Requeue running jobs whose heartbeat stopped (their worker died mid-run)"""
+    stale_after = timedelta(seconds=getattr(settings, 'JOBS_STALE_AFTER', 5 * 60))
+    return Job.objects.filter(
+        status='running', locked_at__lt=timezone.now() - stale_after
+    ).update(status='queued', locked_at=None, worker='')
+
+
+def schedule_periodic_jobs(now=None):
+    """
+    Enqueue one job per period for every entry in JOBS_PERIODIC.
+    Each period gets a dedupe key, so several workers scheduling at once
+    still create a single job.
+    """
+    now = now or timezone.now()
+    timestamp = int(now.timestamp())
+    jobs = []
+    for name, entry in getattr(settings, 'JOBS_PERIODIC', {}).items():
+        interval = int(entry['interval'])
+        slot = timestamp // interval
+        jobs.append(Job(
+            task=entry['task'],
+            kwargs=entry.get('kwargs', {}),
+            priority=entry.get('priority', 0),
+            max_attempts=entry.get('max_attempts', 1),
+            run_at=now,
+            dedupe_key=f"periodic:{name}:{slot}"
+        ))
+    Job.objects.bulk_create(jobs, ignore_conflicts=True)
+
+
+def job_stats(since=None):
+    """Per-task counts and timings for the run_worker --stats report"""
+    queryset = Job.objects.all()
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    return list(queryset.values('task').annotate(
+        total=Count('id'),
+        succeeded=Count('id', filter=Q(status='succeeded')),
+        failed=Count('id', filter=Q(status='failed')),
+        queued=Count('id', filter=Q(status='queued')),
+        avg_duration=Avg('duration'),
+        max_duration=Max('duration')
+    ).order_by('task'))
@@ -0,0 +1,33 @@
+"""
+Registry of callables that can be run as background jobs.
+
+Apps declare tasks in their own tasks.py module, which is imported when the
+jobs app is ready:
+
+    from jobs.registry import task
+
+    @task('cart.clean_abandoned_carts')
+    def clean_abandoned_carts(days_old=30):
+        ...
+"""
+
+_tasks = {}
+
+
+def task(name):
+    """Decorator registering a function as a job under the given name"""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f"No job task registered as '{name}'")
+
+
+def registered_tasks():
+    return dict(_tasks)
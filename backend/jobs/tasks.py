@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.utils import timezone
+from .models import Job
+from .registry import task
+
+
+@task('jobs.cleanup')
+def cleanup_jobs(days=7):
+    """Delete finished jobs older than days; returns the count"""
+    cutoff_date = timezone.now() - timedelta(days=days)
+    _, deleted = Job.objects.filter(
+        status__in=['succeeded', 'failed'], created_at__lt=cutoff_date
+    ).delete()
+    return deleted.get('jobs.Job', 0)
@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_job, enqueue, recover_stale_jobs, run_job, schedule_periodic_jobs
+from .registry import task
+
+calls = []
+
+
+@task('jobs.tests.record')
+def record_call(value=None):
+    calls.append(value)
+    return value
+
+
+@task('jobs.tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+@task('jobs.tests.slow_recover')
+def slow_recover():
+    # Outlives the stale window, then checks whether recovery would take this job
+    time.sleep(0.5)
+    return recover_stale_jobs()
+
+
+class JobQueueTestCase(TestCase):
+    """Test cases for the database-backed job queue"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_runs_highest_priority_due_job(self):
+        enqueue('jobs.tests.record', {'value': 'low'})
+        enqueue('jobs.tests.record', {'value': 'high'}, priority=10)
+        enqueue('jobs.tests.record', {'value': 'later'}, run_at=timezone.now() + timedelta(hours=1))
+
+        job = claim_job('test-worker')
+        self.assertEqual(job.kwargs, {'value': 'high'})
+        self.assertEqual(job.status, 'running')
+        self.assertTrue(run_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, 'high')
+        self.assertIsNotNone(job.duration)
+
+        run_job(claim_job('test-worker'))
+        self.assertIsNone(claim_job('test-worker'))
+        self.assertEqual(calls, ['high', 'low'])
+
+    @override_settings(JOBS_RETRY_DELAY=60)
+    def test_failed_job_retries_with_backoff_then_fails(self):
+        job = enqueue('jobs.tests.explode', max_attempts=2)
+
+        self.assertFalse(run_job(claim_job('test-worker')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=30))
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_job('test-worker')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOBS_PERIODIC={'record': {'task': 'jobs.tests.record', 'interval': 3600}})
+    def test_periodic_jobs_enqueued_once_per_period(self):
+        now = timezone.now()
+        schedule_periodic_jobs(now)
+        schedule_periodic_jobs(now)
+        self.assertEqual(Job.objects.count(), 1)
+
+        schedule_periodic_jobs(now + timedelta(hours=1))
+        self.assertEqual(Job.objects.count(), 2)
+
+
+class JobHeartbeatTestCase(TransactionTestCase):
+    """The heartbeat runs in its own thread and connection, so commits are real"""
+
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.05, JOBS_STALE_AFTER=0.3)
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        enqueue('jobs.tests.slow_recover')
+        job = claim_job('live-worker')
+        # A job claimed by a worker that has since died
+        orphan = enqueue('jobs.tests.record', {'value': 'orphan'})
+        Job.objects.filter(id=orphan.id).update(
+            status='running', worker='dead-worker', locked_at=timezone.now() - timedelta(minutes=10)
+        )
+
+        self.assertTrue(run_job(job))
+
+        job.refresh_from_db()
+        orphan.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, '1')
+        self.assertEqual(orphan.status, 'queued')
+        self.assertEqual(orphan.worker, '')
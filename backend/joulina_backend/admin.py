@@ -9,7 +9,9 @@ from django.contrib import messages
 from django.contrib.admin import SimpleListFilter
 
 from users.models import User, PointTransaction
-from products.models import Product, Category, Brand, ProductVariant, InventoryLog
+from products.models import Product, Category, Brand, ProductVariant
+from products.inventory import apply_stock_adjustments
+from cart.tasks import abandoned_carts, clean_abandoned_carts
 from orders.models import Order, OrderItem, ShippingAddress, OrderStatusHistory
 from cart.models import Cart, CartItem, CartVariantItem
 from payments.models import Payment
@@ -52,31 +54,35 @@ class JoulinaAdminSite(AdminSite):
             path('replenish-low-stock/', self.admin_view(self.replenish_low_stock_view), name='replenish-low-stock'),
             path('clean-abandoned-carts/', self.admin_view(self.clean_abandoned_carts_view), name='clean-abandoned-carts'),
             path('sales-report/', self.admin_view(self.sales_report_view), name='sales-report'),
+            path('slo-report/', self.admin_view(self.slo_report_view), name='slo-report'),
         ]
         return custom_urls + urls
     
     def replenish_low_stock_view(self, request):
         """View to increase stock of low stock items"""
         if request.method == 'POST':
-            # Get all low stock products
-            low_stock_products = Product.objects.filter(stock__lte=F('low_stock_threshold'))
+            # Collect replenishment amounts for all low stock products
+            low_stock_ids = Product.objects.filter(
+                stock__lte=F('low_stock_threshold')
+            ).values_list('id', flat=True)
             
-            # Increase stock by the specified amount
-            for product in low_stock_products:
-                replenish_amount = int(request.POST.get(f'product_{product.id}', 0))
+            adjustments = []
+            for product_id in low_stock_ids:
+                replenish_amount = int(request.POST.get(f'product_{product_id}', 0) or 0)
                 if replenish_amount > 0:
-                    original_stock = product.stock
-                    product.stock += replenish_amount
-                    product.save()
-                    
-                    # Create inventory log
-                    InventoryLog.objects.create(
-                        product=product,
-                        quantity=replenish_amount,
-                        adjustment_type='stock_in',
-                        reference=f"Bulk replenishment by {request.user.username}",
-                        user=request.user
-                    )
+                    adjustments.append({
+                        'product_id': product_id,
+                        'quantity': replenish_amount,
+                        'adjustment_type': 'stock_in',
+                    })
+            
+            # Apply all increments and inventory logs in one transaction
+            if adjustments:
+                apply_stock_adjustments(
+                    adjustments,
+                    user=request.user,
+                    reference=f"Bulk replenishment by {request.user.username}"
+                )
             
             messages.success(request, "Stock levels have been updated successfully.")
             return HttpResponseRedirect(reverse('admin:index'))
@@ -96,40 +102,16 @@ class JoulinaAdminSite(AdminSite):
         """View to clean abandoned carts"""
         if request.method == 'POST':
             days_old = int(request.POST.get('days_old', 7))
-            cutoff_date = timezone.now() - timedelta(days=days_old)
-            
-            # Get abandoned carts
-            abandoned_carts = Cart.objects.filter(
-                merged=False,
-                updated_at__lt=cutoff_date
-            )
-            
-            count = abandoned_carts.count()
-            abandoned_carts.delete()
+            count = clean_abandoned_carts(days_old)
             
             messages.success(request, f"{count} abandoned carts have been removed successfully.")
             return HttpResponseRedirect(reverse('admin:index'))
         
         # Count abandoned carts by age
-        one_day = Cart.objects.filter(
-            merged=False,
-            updated_at__lt=timezone.now() - timedelta(days=1)
-        ).count()
-        
-        three_days = Cart.objects.filter(
-            merged=False,
-            updated_at__lt=timezone.now() - timedelta(days=3)
-        ).count()
-        
-        seven_days = Cart.objects.filter(
-            merged=False,
-            updated_at__lt=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        thirty_days = Cart.objects.filter(
-            merged=False,
-            updated_at__lt=timezone.now() - timedelta(days=30)
-        ).count()
+        one_day = abandoned_carts(1).count()
+        three_days = abandoned_carts(3).count()
+        seven_days = abandoned_carts(7).count()
+        thirty_days = abandoned_carts(30).count()
         
         context = {
             'title': 'Clean Abandoned Carts',
@@ -214,6 +196,41 @@ class JoulinaAdminSite(AdminSite):
         
         return self.render_to_response(request, 'admin/sales_report.html', context)
     
+    def slo_report_view(self, request):
+        """View to show per-endpoint latency percentiles against SLO targets"""
+        import time
+        from request_logs.models import RequestLog
+        from request_logs.metrics import build_report, histograms_from_logs, load_merged
+        
+        source = request.GET.get('source', 'live')
+        try:
+            hours = int(request.GET.get('hours', 24))
+        except ValueError:
+            hours = 24
+        
+        if source == 'logs':
+            since = timezone.now() - timedelta(hours=hours)
+            histograms = histograms_from_logs(RequestLog.objects.filter(timestamp__gte=since))
+            window_seconds = hours * 3600
+        else:
+            histograms, started_at = load_merged()
+            window_seconds = time.time() - started_at if started_at else 0
+        
+        rows = build_report(histograms, window_seconds)
+        
+        context = {
+            'title': 'SLO Report',
+            'source': source,
+            'hours': hours,
+            'window_minutes': window_seconds / 60,
+            'rows': rows,
+            'total_requests': sum(row['count'] for row in rows),
+            'breached_views': sum(1 for row in rows if not row['meets_slo']),
+            **self.each_context(request),
+        }
+        
+        return self.render_to_response(request, 'admin/slo_report.html', context)
+    
     def render_to_response(self, request, template, context):
         """Helper to render templates for admin views"""
         from django.template.response import TemplateResponse
@@ -380,6 +397,12 @@ class JoulinaAdminSite(AdminSite):
                 'description': 'View detailed sales analytics and reports',
                 'urgent': False,
             },
+            {
+                'name': 'SLO Report',
+                'url': reverse('admin:slo-report'),
+                'description': 'View p50/p95/p99 latency, throughput and error rates per endpoint',
+                'urgent': False,
+            },
         ]
         
         # Combine with any passed context
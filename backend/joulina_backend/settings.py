@@ -3,6 +3,7 @@ Django settings for joulina_backend project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
     'orders',
     'payments',
     'request_logs',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -270,6 +272,54 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For developm
 # EMAIL_HOST_USER = 'your_email@example.com'
 # EMAIL_HOST_PASSWORD = 'your_password'
 DEFAULT_FROM_EMAIL = 'noreply@joulina.com'
+EMAIL_OUTBOX_BATCH_SIZE = 50  # Emails sent per batch over one connection by send_queued_emails
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5  # Delivery attempts before an email is marked failed
+EMAIL_OUTBOX_RETRY_DELAY = 60  # Seconds before the first retry; doubles after each failure
+
+# Background job settings (run with `python manage.py run_worker`)
+JOBS_WORKER_THREADS = 2  # Worker threads per run_worker process
+JOBS_POLL_INTERVAL = 2  # Seconds an idle worker waits before polling the queue again
+JOBS_RETRY_DELAY = 30  # Seconds before the first retry of a failed job; doubles after each failure
+JOBS_HEARTBEAT_INTERVAL = 60  # Seconds between locked_at refreshes of a running job
+JOBS_STALE_AFTER = 5 * 60  # Running jobs without a heartbeat for this many seconds are requeued
+JOBS_PERIODIC = {
+    'send-queued-emails': {'task': 'orders.send_queued_emails', 'interval': 30},
+    'release-expired-reservations': {'task': 'orders.release_expired_reservations', 'interval': 15 * 60},
+    'expire-points': {'task': 'users.expire_points', 'interval': 24 * 60 * 60},
+    'clean-abandoned-carts': {'task': 'cart.clean_abandoned_carts', 'interval': 24 * 60 * 60, 'kwargs': {'days_old': 30}},
+    'cleanup-request-logs': {'task': 'request_logs.cleanup', 'interval': 24 * 60 * 60, 'kwargs': {'days': 30}},
+    'update-rating-stats': {'task': 'products.update_rating_stats', 'interval': 60 * 60},
+    'sync-featured-products': {'task': 'products.sync_featured_products', 'interval': 60 * 60},
+    'rollup-sales': {'task': 'products.rollup_sales', 'interval': 5 * 60},
+    'build-co-purchases': {'task': 'products.build_co_purchases', 'interval': 60 * 60},
+    'build-similar-products': {'task': 'products.build_similar_products', 'interval': 60 * 60},
+    'recount-product-counts': {'task': 'products.recount_product_counts', 'interval': 24 * 60 * 60},
+    'cleanup-jobs': {'task': 'jobs.cleanup', 'interval': 24 * 60 * 60},
+}
+
+# Inventory settings
+INVENTORY_BULK_MAX_ADJUSTMENTS = 5000  # Maximum lines accepted by the bulk stock endpoint
+ORDER_RESERVATION_TTL_MINUTES = 60 * 48  # Pending orders release their stock after this long
+
+# Sales rollup settings (trending and bestselling read the ProductSales rollup)
+PRODUCT_SALES_HOURLY_ROLLUP = False  # Also keep hourly buckets, used for windows of up to 7 days
+PRODUCT_SALES_ROLLUP_WINDOW_HOURS = 6  # Buckets this recent are recomputed on every rollup, catching late-committed checkouts
+PRODUCT_TRENDING_HALF_LIFE_HOURS = 48  # Trending weight of a sale halves every this many hours
+
+# Random product sampling settings (recommended and fallback picks)
+PRODUCT_SAMPLE_POOL_TTL = 15 * 60  # Seconds a cached id pool is reused before being rebuilt
+PRODUCT_SAMPLE_POOL_SIZE = 10000  # Maximum ids kept per pool
+PRODUCT_SAMPLE_SEED_PERIOD = 60 * 60  # Seconds a user keeps seeing the same random picks
+
+# "Also bought" recommendation settings
+PRODUCT_NEIGHBORS_TOP_K = 20  # Co-purchased neighbors kept per product
+PRODUCT_NEIGHBORS_MIN_ORDERS = 1  # Orders a pair must share before it counts as a neighbor
+PRODUCT_SIMILAR_TOP_K = 20  # Content-similar products kept per product
+CATALOG_STATS_TTL = 60 * 60  # Seconds the /products/stats/ snapshot lives if no catalog change drops it
+CELEBRITY_PICKS_CACHE_TTL = 15 * 60  # Seconds a celebrity picks payload is reused; celebrity changes drop it sooner
+CELEBRITY_SEARCH_LIMIT = 20  # Default number of celebrity name search results
+CELEBRITY_SEARCH_TRIGRAM_THRESHOLD = 0.3  # Minimum pg_trgm similarity for a fuzzy celebrity name match
+CART_BATCH_MAX_OPERATIONS = 100  # Largest number of operations accepted by one cart batch request
 
 # django-filter settings
 FILTERS_USE_BLANK_CHOICE = False
@@ -307,4 +357,19 @@ REQUEST_LOG_SKIP_USER_AGENTS = [
     'uptimerobot',
     'googlebot',
     'bingbot',
-]
\ No newline at end of file
+]
+
+# Request Metrics Configuration
+REQUEST_METRICS_ENABLED = True  # Record per-view latency histograms in each worker
+REQUEST_METRICS_DIR = os.environ.get(
+    'REQUEST_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'joulina_request_metrics')
+)  # Shared by all workers
+REQUEST_METRICS_FLUSH_INTERVAL = 10  # Seconds between per-worker snapshot writes
+REQUEST_METRICS_STALE_AFTER = 15 * 60  # Seconds after which a worker snapshot is left out of reports until the worker flushes again
+REQUEST_SLO_TARGETS = {
+    # Latency targets in milliseconds, error_rate as percentage of 5xx responses
+    'default': {'p95': 500, 'p99': 1000, 'error_rate': 1.0},
+    'checkout': {'p95': 1500, 'p99': 3000, 'error_rate': 0.5},
+    'cart-add-item': {'p95': 300, 'p99': 800},
+    'product-featured': {'p95': 200, 'p99': 500},
+}
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Order, OrderItem, ShippingAddress, OrderStatusHistory
+from django.utils import timezone
+from .models import Order, OrderItem, ShippingAddress, OrderStatusHistory, StockReservation, EmailOutbox
+from .reservations import release_reservations
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -42,6 +44,12 @@ class OrderAdmin(admin.ModelAdmin):
                 notes=f"Status updated to {obj.get_status_display()} by admin user {request.user.username}"
             )
         super().save_model(request, obj, form, change)
+        
+        if change and 'status' in form.changed_data:
+            previous_status = form.initial.get('status')
+            # Moves out of pending commit the reservations (orders.signals)
+            if obj.status == 'cancelled' and previous_status != 'cancelled':
+                release_reservations(obj)
 
 @admin.register(ShippingAddress)
 class ShippingAddressAdmin(admin.ModelAdmin):
@@ -69,3 +77,27 @@ class OrderStatusHistoryAdmin(admin.ModelAdmin):
     search_fields = ['order__id', 'notes']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'product', 'variant', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order__id', 'product__name', 'variant__name']
+    readonly_fields = ['order', 'product', 'variant', 'quantity', 'status', 'expires_at', 'released_at', 'created_at']
+    date_hierarchy = 'created_at'
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient', 'subject', 'order__id']
+    readonly_fields = ['order', 'recipient', 'subject', 'body', 'html_body', 'attempts', 'last_error', 'sent_at', 'created_at']
+    date_hierarchy = 'created_at'
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Requeue selected emails for immediate delivery"""
+        updated = queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} emails queued for retry.")
+    retry_now.short_description = "Retry selected emails now"
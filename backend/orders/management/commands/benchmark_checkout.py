@@ -0,0 +1,92 @@
+import statistics
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from cart.models import Cart, CartItem
+from orders.models import ShippingAddress
+from orders.serializers import CheckoutSerializer
+from products.models import Category, Product
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Measure checkout time and query count against cart size (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='1,5,10,25,50,100',
+            help='Comma-separated cart sizes (number of lines) to benchmark'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Checkouts per cart size; the median time is reported (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+
+        self.stdout.write(f"{'Lines':>6} {'Queries':>8} {'Median ms':>10} {'ms/line':>8}")
+        self.stdout.write('-' * 35)
+
+        for size in sizes:
+            timings = []
+            queries = 0
+            for _ in range(options['runs']):
+                elapsed, queries = self._run_checkout(size)
+                timings.append(elapsed)
+
+            median = statistics.median(timings)
+            self.stdout.write(f'{size:>6} {queries:>8} {median:>10.2f} {median / size:>8.3f}')
+
+    def _run_checkout(self, size):
+        """Build a cart with `size` lines, check it out and roll everything back"""
+        with transaction.atomic():
+            user = User.objects.create_user(
+                phone_number='+99999999999999',
+                password=None,
+                first_name='Benchmark',
+                last_name='User'
+            )
+            address = ShippingAddress.objects.create(
+                user=user, full_name='Benchmark User', phone_number='+99999999999999',
+                address_line1='Benchmark', city='Benchmark', state='Benchmark',
+                country='Benchmark', postal_code='00000'
+            )
+            category = Category.objects.create(name='Checkout Benchmark')
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'Benchmark Product {i}', description='Checkout benchmark',
+                    price=Decimal('10.00'), category=category,
+                    sku=f'CHECKOUT-BENCH-{i}', stock=1000
+                )
+                for i in range(size)
+            ])
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=2) for product in products
+            ])
+
+            request = RequestFactory().post('/api/v1/orders/checkout/')
+            request.user = user
+            serializer = CheckoutSerializer(
+                data={'shipping_address_id': address.id},
+                context={'request': request}
+            )
+            serializer.is_valid(raise_exception=True)
+
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                serializer.create_order(serializer.validated_data, cart)
+                elapsed = (time.perf_counter() - start) * 1000
+
+            transaction.set_rollback(True)
+
+        return elapsed, len(captured.captured_queries)
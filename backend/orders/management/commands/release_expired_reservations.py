@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.models import StockReservation
+from orders.reservations import expire_reservations
+
+class Command(BaseCommand):
+    help = 'Cancel pending orders whose stock reservations have expired and return the stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many reservations have expired without releasing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = StockReservation.objects.filter(
+                status='active', expires_at__lte=timezone.now(), order__status='pending'
+            )
+            orders = expired.values('order_id').distinct().count()
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would release {expired.count()} reservations across {orders} pending orders'
+                )
+            )
+            return
+
+        cancelled = expire_reservations()
+        if cancelled:
+            self.stdout.write(
+                self.style.SUCCESS(f'Cancelled {cancelled} expired pending orders and released their stock')
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('No expired stock reservations found.'))
@@ -1,6 +1,7 @@
 # orders/models.py
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product, ProductVariant
 
 class ShippingAddress(models.Model):
@@ -99,4 +100,70 @@ class OrderStatusHistory(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Order {self.order.id} - {self.status} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Order {self.order.id} - {self.status} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order. Stock is decremented when the reservation is
+    taken and returned when it is released (cancellation) or expires while
+    the order is still pending.
+    """
+    STATUS_CHOICES = (
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    )
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['order', 'status']),
+        ]
+    
+    def __str__(self):
+        item = self.product.name if self.product else str(self.variant)
+        return f"Order {self.order_id} - {self.quantity} x {item} ({self.status})"
+
+class EmailOutbox(models.Model):
+    """
+    Outgoing email written in the same transaction as the change that
+    triggered it and delivered later by the send_queued_emails command.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Email outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
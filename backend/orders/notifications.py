@@ -0,0 +1,125 @@
+# orders/notifications.py
+"""
+Transactional email outbox.
+
+Views queue emails with queue_email inside their own transaction, so a
+message is stored only if the order change commits and the request never
+waits on the mail server. send_queued_emails drains the outbox in batches
+over a single SMTP connection, retrying failures with exponential backoff.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed message stays invisible to other workers while it is
+# being sent; if a worker dies mid-batch the message is retried after this.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def queue_email(recipient, subject, template_name, context, order=None):
+    """Render an email template and store it in the outbox for delivery"""
+    if not recipient:
+        return None
+
+    html_message = render_to_string(template_name, context)
+    return EmailOutbox.objects.create(
+        order=order,
+        recipient=recipient,
+        subject=subject,
+        body=strip_tags(html_message),
+        html_body=html_message
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 60 * 60))
+
+
+def _claim_batch(batch_size):
+    """Lease a batch of due messages so concurrent workers don't send them twice"""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = EmailOutbox.objects.filter(
+            status='pending', next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset[:batch_size])
+        EmailOutbox.objects.filter(id__in=[message.id for message in batch]).update(
+            next_attempt_at=now + CLAIM_LEASE
+        )
+    return batch
+
+
+def _record_failure(message, error, max_attempts):
+    attempts = message.attempts + 1
+    logger.warning(f"Failed to send email {message.id} (attempt {attempts}): {error}")
+    EmailOutbox.objects.filter(id=message.id).update(
+        attempts=attempts,
+        last_error=str(error),
+        status='failed' if attempts >= max_attempts else 'pending',
+        next_attempt_at=timezone.now() + retry_delay(attempts)
+    )
+
+
+def dispatch_pending_emails(batch_size=None, max_attempts=None):
+    """
+    Send one batch of due messages over a shared mail connection.
+    Returns a (sent, failed) tuple for the batch.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = max_attempts or getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+    except Exception as e:
+        for message in batch:
+            _record_failure(message, e, max_attempts)
+        return 0, len(batch)
+
+    sent = failed = 0
+    try:
+        for message in batch:
+            email = EmailMultiAlternatives(
+                message.subject,
+                message.body,
+                settings.DEFAULT_FROM_EMAIL,
+                [message.recipient],
+                connection=mail_connection
+            )
+            if message.html_body:
+                email.attach_alternative(message.html_body, 'text/html')
+
+            try:
+                email.send()
+            except Exception as e:
+                _record_failure(message, e, max_attempts)
+                failed += 1
+            else:
+                EmailOutbox.objects.filter(id=message.id).update(
+                    attempts=message.attempts + 1,
+                    status='sent',
+                    sent_at=timezone.now(),
+                    last_error=''
+                )
+                sent += 1
+    finally:
+        mail_connection.close()
+
+    return sent, failed
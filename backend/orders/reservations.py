@@ -0,0 +1,179 @@
+# orders/reservations.py
+"""
+Race-free stock reservation for orders.
+
+Rows are locked in deterministic id order and stock is then taken with a
+single conditional decrement per table
+(`UPDATE ... SET stock = stock - CASE ... WHERE id IN (...) AND stock >= CASE ...`),
+so concurrent checkouts for the same SKU can never oversell, always acquire
+row locks in the same order, and a cart costs a constant number of queries
+regardless of its size. A StockReservation row records each hold so it can be
+released on cancellation or expiry.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django.utils import timezone
+
+from products.models import Product, ProductVariant
+from .models import Order, OrderStatusHistory, StockReservation
+
+
+class InsufficientStockError(Exception):
+    """Raised when a reservation line can't be satisfied from available stock"""
+
+    def __init__(self, name, requested):
+        self.name = name
+        self.requested = requested
+        super().__init__(f"Not enough stock available for {name}. Requested: {requested}")
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'ORDER_RESERVATION_TTL_MINUTES', 60 * 48))
+
+
+def _sorted_lines(lines):
+    """Merge duplicate lines and order them by (kind, id) for consistent lock ordering"""
+    merged = {}
+    for line in lines:
+        if line.get('variant_id') is not None:
+            key = ('variant', line['variant_id'])
+        else:
+            key = ('product', line['product_id'])
+        merged[key] = merged.get(key, 0) + line['quantity']
+    return sorted(merged.items())
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(id=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def _take_stock(model, kind, quantities):
+    """Lock rows in id order, then decrement them all with one conditional UPDATE"""
+    if not quantities:
+        return
+
+    locked = {
+        row['id']: row for row in model.objects.select_for_update().filter(
+            id__in=quantities
+        ).order_by('id').values('id', 'name', 'stock')
+    }
+    for item_id, quantity in sorted(quantities.items()):
+        row = locked.get(item_id)
+        if row is None or row['stock'] < quantity:
+            raise InsufficientStockError(row['name'] if row else f"{kind} {item_id}", quantity)
+
+    # The stock condition still guards backends without row locks
+    case = _quantity_case(quantities)
+    updated = model.objects.filter(id__in=quantities, stock__gte=case).update(
+        stock=F('stock') - case
+    )
+    if updated != len(quantities):
+        # Stock was taken by another transaction between the check and the update
+        raise InsufficientStockError(model._meta.verbose_name, sum(quantities.values()))
+
+
+def reserve_stock(order, lines):
+    """
+    Atomically decrement stock for every line and record reservations.
+
+    `lines` is an iterable of dicts with product_id or variant_id and quantity.
+    Must run inside a transaction; raises InsufficientStockError (rolling back
+    any decrements already made) if a line can't be satisfied.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError("reserve_stock must be called inside a transaction")
+
+    merged = _sorted_lines(lines)
+    product_quantities = {item_id: qty for (kind, item_id), qty in merged if kind == 'product'}
+    variant_quantities = {item_id: qty for (kind, item_id), qty in merged if kind == 'variant'}
+
+    _take_stock(Product, 'product', product_quantities)
+    _take_stock(ProductVariant, 'variant', variant_quantities)
+
+    expires_at = timezone.now() + reservation_ttl()
+    return StockReservation.objects.bulk_create([
+        StockReservation(
+            order=order,
+            product_id=item_id if kind == 'product' else None,
+            variant_id=item_id if kind == 'variant' else None,
+            quantity=quantity,
+            expires_at=expires_at
+        )
+        for (kind, item_id), quantity in merged
+    ])
+
+
+def _restock(reservations):
+    """Return reserved quantities to stock with one UPDATE per table"""
+    lines = [
+        {'product_id': r.product_id, 'variant_id': r.variant_id, 'quantity': r.quantity}
+        for r in reservations
+    ]
+    merged = _sorted_lines(lines)
+    for model, kind in ((Product, 'product'), (ProductVariant, 'variant')):
+        quantities = {item_id: qty for (k, item_id), qty in merged if k == kind}
+        if quantities:
+            model.objects.filter(id__in=quantities).update(stock=F('stock') + _quantity_case(quantities))
+
+
+@transaction.atomic
+def release_reservations(order, status='released'):
+    """
+    Return an order's held stock. Active and committed reservations are
+    restocked exactly once; orders placed before reservations existed are
+    restocked from their order items.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update().filter(order=order).order_by('id')
+    )
+
+    if not reservations:
+        _restock(list(order.items.all()))
+        return 0
+
+    held = [r for r in reservations if r.status in ('active', 'committed')]
+    if held:
+        _restock(held)
+        StockReservation.objects.filter(id__in=[r.id for r in held]).update(
+            status=status, released_at=timezone.now()
+        )
+    return len(held)
+
+
+def commit_reservations(order):
+    """Mark reservations as permanent once the order is paid or moves past pending"""
+    return StockReservation.objects.filter(order=order, status='active').update(status='committed')
+
+
+def expire_reservations(now=None):
+    """
+    Release reservations of unpaid pending orders whose hold has expired and
+    cancel those orders. Returns the number of orders cancelled.
+    """
+    now = now or timezone.now()
+    order_ids = StockReservation.objects.filter(
+        status='active', expires_at__lte=now, order__status='pending', order__is_paid=False
+    ).values_list('order_id', flat=True).distinct()
+
+    cancelled = 0
+    for order_id in list(order_ids):
+        with transaction.atomic():
+            order = Order.objects.select_for_update().filter(id=order_id, status='pending', is_paid=False).first()
+            if order is None:
+                continue
+            release_reservations(order, status='expired')
+            order.status = 'cancelled'
+            order.save(update_fields=['status', 'updated_at'])
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='cancelled',
+                notes='Order cancelled automatically after stock reservation expired'
+            )
+            cancelled += 1
+    return cancelled
@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from .models import ShippingAddress, Order, OrderItem, OrderStatusHistory
+from .reservations import reserve_stock
 from products.models import Product, ProductVariant
 from users.serializers import UserSerializer
 from django.db import transaction
+from decimal import Decimal
 
 class ShippingAddressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -38,12 +40,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
         if not request:
             return None
             
-        if obj.product and obj.product.primary_image:
-            return request.build_absolute_uri(obj.product.primary_image.url)
-        elif obj.variant and obj.variant.image:
-            return request.build_absolute_uri(obj.variant.image.url)
-        elif obj.variant and obj.variant.product.primary_image:
-            return request.build_absolute_uri(obj.variant.product.primary_image.url)
+        if obj.product and obj.product.featured_image:
+            return request.build_absolute_uri(obj.product.featured_image.url)
+        elif obj.variant and obj.variant.product.featured_image:
+            return request.build_absolute_uri(obj.variant.product.featured_image.url)
         return None
 
 class OrderStatusHistorySerializer(serializers.ModelSerializer):
@@ -112,8 +112,34 @@ class CheckoutSerializer(serializers.Serializer):
             address_data['user'] = user
             shipping_address = ShippingAddress.objects.create(**address_data)
         
+        # Snapshot the cart with its products and variants so prices and
+        # totals are computed once in Python instead of per line
+        cart_items = list(cart.items.select_related('product'))
+        cart_variant_items = list(cart.variant_items.select_related('variant__product'))
+        
+        order_items = []
+        for cart_item in cart_items:
+            unit_price = cart_item.product.price
+            order_items.append(OrderItem(
+                product=cart_item.product,
+                variant=None,
+                quantity=cart_item.quantity,
+                unit_price=unit_price,
+                subtotal=unit_price * cart_item.quantity
+            ))
+        for cart_variant_item in cart_variant_items:
+            variant = cart_variant_item.variant
+            unit_price = variant.product.price + variant.price_adjustment
+            order_items.append(OrderItem(
+                product=None,
+                variant=variant,
+                quantity=cart_variant_item.quantity,
+                unit_price=unit_price,
+                subtotal=unit_price * cart_variant_item.quantity
+            ))
+        
         # Calculate totals
-        subtotal = cart.total
+        subtotal = sum((item.subtotal for item in order_items), Decimal('0'))
         shipping_fee = 0  # Could be calculated based on address, weight, etc.
         discount = 0  # Could be calculated based on user tier, promotions, etc.
         total_amount = subtotal + shipping_fee - discount
@@ -136,39 +162,23 @@ class CheckoutSerializer(serializers.Serializer):
             notes='Order created'
         )
         
-        # Create order items from cart
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                variant=None,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price,
-                subtotal=cart_item.subtotal
-            )
-            
-            # Update product stock
-            product = cart_item.product
-            product.stock -= cart_item.quantity
-            product.save()
+        # Create order items in one insert (subtotals are already set, so
+        # skipping OrderItem.save is safe)
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
         
-        # Create order items for variants
-        for cart_variant_item in cart.variant_items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=None,
-                variant=cart_variant_item.variant,
-                quantity=cart_variant_item.quantity,
-                unit_price=cart_variant_item.variant.product.price + cart_variant_item.variant.price_adjustment,
-                subtotal=cart_variant_item.subtotal
-            )
-            
-            # Update variant stock
-            variant = cart_variant_item.variant
-            variant.stock -= cart_variant_item.quantity
-            variant.save()
+        # Reserve stock with conditional atomic decrements; raises
+        # InsufficientStockError and rolls back the order if any line is short
+        reserve_stock(order, [
+            {'product_id': item.product_id, 'quantity': item.quantity}
+            for item in cart_items
+        ] + [
+            {'variant_id': item.variant_id, 'quantity': item.quantity}
+            for item in cart_variant_items
+        ])
         
         # Clear the cart
         cart.clear()
         
-        return order
\ No newline at end of file
+        return order
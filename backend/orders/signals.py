@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Order
+from .reservations import commit_reservations
+
+
+@receiver(post_save, sender=Order)
+def commit_reservations_on_progress(sender, instance, created, raw=False, **kwargs):
+    """
+    Make an order's stock holds permanent once it is paid or moves past
+    pending, whichever path saved it (admin, payments, API), so expiry
+    never cancels it
+    """
+    if raw or created or instance.status == 'cancelled':
+        return
+    if instance.is_paid or instance.status != 'pending':
+        commit_reservations(instance)
@@ -0,0 +1,19 @@
+from jobs.registry import task
+from .notifications import dispatch_pending_emails
+from .reservations import expire_reservations
+
+
+@task('orders.send_queued_emails')
+def send_queued_emails():
+    """Drain the email outbox; returns the number of emails sent"""
+    total_sent = 0
+    while True:
+        sent, failed = dispatch_pending_emails()
+        total_sent += sent
+        if not sent and not failed:
+            return total_sent
+
+
+@task('orders.release_expired_reservations')
+def release_expired_reservations():
+    return expire_reservations()
@@ -1,3 +1,301 @@
-from django.test import TestCase
+import random
+import threading
+import time
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection, transaction, OperationalError
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
 
-# Create your tests here.
+from cart.models import Cart, CartItem
+from products.models import Product, Category
+from .models import Order, ShippingAddress, StockReservation, EmailOutbox
+from .notifications import dispatch_pending_emails
+from .reservations import InsufficientStockError, reserve_stock, expire_reservations
+
+User = get_user_model()
+
+
+def make_order(user, address):
+    return Order.objects.create(
+        user=user,
+        shipping_address=address,
+        subtotal=Decimal('10.00'),
+        total_amount=Decimal('10.00')
+    )
+
+
+class StockReservationTestCase(APITestCase):
+    """Test cases for checkout stock reservations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number='+9647700000010',
+            password='userpass123',
+            first_name='Test',
+            last_name='Customer',
+            email='customer@test.com'
+        )
+        self.address = ShippingAddress.objects.create(
+            user=self.user,
+            full_name='Test Customer',
+            phone_number='+9647700000010',
+            address_line1='Street 1',
+            city='Baghdad',
+            state='Baghdad',
+            country='Iraq',
+            postal_code='10001'
+        )
+        self.category = Category.objects.create(name='Reservation Category')
+        self.product = Product.objects.create(
+            name='Reserved Product',
+            description='Reservation test product',
+            price=Decimal('10.00'),
+            category=self.category,
+            sku='RES001',
+            stock=3
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _checkout(self, quantity):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.update_or_create(cart=cart, product=self.product, defaults={'quantity': quantity})
+        return self.client.post(reverse('checkout'), {'shipping_address_id': self.address.id}, format='json')
+
+    def test_checkout_reserves_and_cancel_releases_stock(self):
+        """Checkout takes stock once and cancelling returns it exactly once"""
+        response = self._checkout(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        reservation = StockReservation.objects.get(order_id=response.data['id'])
+        self.assertEqual(reservation.status, 'active')
+
+        cancel_url = reverse('order-cancel', args=[response.data['id']])
+        self.assertEqual(self.client.post(cancel_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(cancel_url).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'released')
+
+    def test_checkout_rejects_oversell(self):
+        """A cart asking for more than is in stock fails without touching stock"""
+        response = self._checkout(4)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_query_count_is_independent_of_cart_size(self):
+        """Order items, stock and reservations are written in bulk"""
+        def checkout_queries(lines):
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'Bulk Checkout {lines}-{i}', description='Checkout test product',
+                    price=Decimal('5.00'), category=self.category,
+                    sku=f'BULKCHK{lines}-{i}', stock=10
+                )
+                for i in range(lines)
+            ])
+            cart, _ = Cart.objects.get_or_create(user=self.user)
+            CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=2) for p in products])
+
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(
+                    reverse('checkout'), {'shipping_address_id': self.address.id}, format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.data['items']), lines)
+            self.assertEqual(Decimal(response.data['subtotal']), Decimal('10.00') * lines)
+            return len(captured.captured_queries)
+
+        self.assertEqual(checkout_queries(1), checkout_queries(15))
+        self.assertEqual(
+            set(Product.objects.filter(sku__startswith='BULKCHK').values_list('stock', flat=True)), {8}
+        )
+
+    def test_expired_reservations_cancel_pending_orders(self):
+        """Expired holds on pending orders are returned to stock"""
+        order = make_order(self.user, self.address)
+        with transaction.atomic():
+            reserve_stock(order, [{'product_id': self.product.id, 'quantity': 2}])
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(expire_reservations(), 1)
+
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(StockReservation.objects.get().status, 'expired')
+
+    def test_paid_orders_are_not_expired(self):
+        """Completing a payment commits the holds, and paid orders are never cancelled"""
+        from payments.models import Payment
+        paid = make_order(self.user, self.address)
+        flagged = make_order(self.user, self.address)
+        with transaction.atomic():
+            reserve_stock(paid, [{'product_id': self.product.id, 'quantity': 1}])
+            reserve_stock(flagged, [{'product_id': self.product.id, 'quantity': 1}])
+        Payment.objects.create(order=paid, amount=paid.total_amount, status='completed')
+        self.assertEqual(StockReservation.objects.get(order=paid).status, 'committed')
+
+        # Marked paid without going through a save
+        Order.objects.filter(pk=flagged.pk).update(is_paid=True)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expire_reservations(), 0)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'pending'})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+
+class EmailOutboxTestCase(APITestCase):
+    """Test cases for the transactional email outbox"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number='+9647700000012',
+            password='userpass123',
+            first_name='Mail',
+            last_name='Customer',
+            email='mail@test.com'
+        )
+        self.address = ShippingAddress.objects.create(
+            user=self.user,
+            full_name='Mail Customer',
+            phone_number='+9647700000012',
+            address_line1='Street 3',
+            city='Basra',
+            state='Basra',
+            country='Iraq',
+            postal_code='61001'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_cancel_queues_email_instead_of_sending(self):
+        order = make_order(self.user, self.address)
+
+        response = self.client.post(reverse('order-cancel', args=[order.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get(order=order)
+        self.assertEqual(queued.recipient, 'mail@test.com')
+
+        self.assertEqual(dispatch_pending_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f"Order Cancelled - Order #{order.id}")
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'sent')
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        queued = EmailOutbox.objects.create(recipient='mail@test.com', subject='Hello', body='Hi')
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(dispatch_pending_emails(max_attempts=2), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'pending')
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+
+        # Not due yet, so nothing is sent
+        self.assertEqual(dispatch_pending_emails(), (0, 0))
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            dispatch_pending_emails(max_attempts=2)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'failed')
+        self.assertEqual(queued.last_error, 'SMTP down')
+
+
+class StockReservationConcurrencyTestCase(TransactionTestCase):
+    """Stress test: many threads competing for the same SKU must never oversell"""
+
+    THREADS = 20
+    STOCK = 7
+    RETRY_SECONDS = 30
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number='+9647700000011',
+            password='userpass123',
+            first_name='Stress',
+            last_name='Tester'
+        )
+        self.address = ShippingAddress.objects.create(
+            user=self.user,
+            full_name='Stress Tester',
+            phone_number='+9647700000011',
+            address_line1='Street 2',
+            city='Erbil',
+            state='Erbil',
+            country='Iraq',
+            postal_code='44001'
+        )
+        category = Category.objects.create(name='Flash Sale')
+        self.product = Product.objects.create(
+            name='Flash Sale Product',
+            description='Concurrency test product',
+            price=Decimal('10.00'),
+            category=category,
+            sku='FLASH001',
+            stock=self.STOCK
+        )
+        self.orders = [make_order(self.user, self.address) for _ in range(self.THREADS)]
+
+    def test_concurrent_checkouts_never_oversell(self):
+        results = []
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(order):
+            outcome = 'error'
+            try:
+                barrier.wait()
+                deadline = time.monotonic() + self.RETRY_SECONDS
+                delay = 0.005
+                while time.monotonic() < deadline:
+                    try:
+                        with transaction.atomic():
+                            reserve_stock(order, [{'product_id': self.product.id, 'quantity': 1}])
+                        outcome = 'reserved'
+                    except InsufficientStockError:
+                        outcome = 'rejected'
+                    except OperationalError:
+                        # SQLite serializes writers and reports "database is locked"
+                        # instead of waiting on a row lock; back off and retry like a client would
+                        time.sleep(delay * random.uniform(0.5, 1.5))
+                        delay = min(delay * 2, 0.2)
+                        continue
+                    break
+            finally:
+                with results_lock:
+                    results.append(outcome)
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(order,)) for order in self.orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertNotIn('error', results)
+        self.assertEqual(results.count('reserved'), self.STOCK)
+        self.assertEqual(results.count('rejected'), self.THREADS - self.STOCK)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(StockReservation.objects.filter(status='active').count(), self.STOCK)
@@ -4,12 +4,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
-from django.utils.html import strip_tags
 
 from .models import Order, OrderItem, ShippingAddress, OrderStatusHistory
+from .notifications import queue_email
+from .reservations import InsufficientStockError, release_reservations
 from .serializers import (
     OrderSerializer, OrderItemSerializer, ShippingAddressSerializer, 
     CheckoutSerializer, OrderDetailSerializer, OrderStatusHistorySerializer
@@ -79,36 +77,34 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Cancel an order if it's still in 'pending' or 'confirmed' status"""
         order = self.get_object()
         
-        # Only cancel orders in pending or confirmed status
-        if order.status not in ['pending', 'confirmed']:
-            return Response(
-                {"detail": f"Cannot cancel order in {order.status} status."},
-                status=status.HTTP_400_BAD_REQUEST
+        with transaction.atomic():
+            # Lock the order so concurrent cancels can't restock twice
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            
+            # Only cancel orders in pending or confirmed status
+            if order.status not in ['pending', 'confirmed']:
+                return Response(
+                    {"detail": f"Cannot cancel order in {order.status} status."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Update order status
+            order.status = 'cancelled'
+            order.save()
+            
+            # Add to status history
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='cancelled',
+                notes=f"Order cancelled by {request.user.username}"
             )
-        
-        # Update order status
-        order.status = 'cancelled'
-        order.save()
-        
-        # Add to status history
-        OrderStatusHistory.objects.create(
-            order=order,
-            status='cancelled',
-            notes=f"Order cancelled by {request.user.username}"
-        )
-        
-        # Return inventory to stock
-        for item in order.items.all():
-            if item.product:
-                item.product.stock += item.quantity
-                item.product.save()
-            elif item.variant:
-                item.variant.stock += item.quantity
-                item.variant.save()
-        
-        # Send cancellation confirmation email
-        self._send_order_status_email(order, "Order Cancelled", 
-                                     "Your order has been cancelled.")
+            
+            # Return reserved inventory to stock
+            release_reservations(order)
+            
+            # Queue cancellation confirmation email
+            self._send_order_status_email(order, "Order Cancelled", 
+                                         "Your order has been cancelled.")
         
         return Response({"status": "Order cancelled successfully"})
     
@@ -120,7 +116,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     def _send_order_status_email(self, order, subject_prefix, status_message):
-        """Helper method to send order status emails"""
+        """Helper method to queue order status emails in the outbox"""
         user = order.user
         subject = f"{subject_prefix} - Order #{order.id}"
         
@@ -131,17 +127,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             'items': order.items.all(),
         }
         
-        html_message = render_to_string('orders/email/order_status_update.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        queue_email(user.email, subject, 'orders/email/order_status_update.html', context, order=order)
 
 class CheckoutView(viewsets.ViewSet):
     """
@@ -164,7 +150,7 @@ class CheckoutView(viewsets.ViewSet):
             )
         
         # Validate the cart has items
-        if cart.item_count == 0:
+        if not cart.items.exists() and not cart.variant_items.exists():
             return Response(
                 {"detail": "Your cart is empty."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -181,6 +167,12 @@ class CheckoutView(viewsets.ViewSet):
         try:
             order = serializer.create_order(serializer.validated_data, cart)
             
+            # Reload with everything the response and email render, so the
+            # cost doesn't grow with the number of order lines
+            order = Order.objects.select_related('user', 'shipping_address').prefetch_related(
+                'items__product', 'items__variant__product', 'status_history'
+            ).get(pk=order.pk)
+            
             # Add points for purchase (example: 1 point per $1 spent)
             points_earned = int(order.total_amount)
             if points_earned > 0:
@@ -199,13 +191,18 @@ class CheckoutView(viewsets.ViewSet):
                 user.update_tier()
                 user.save()
             
-            # Send order confirmation email
+            # Queue order confirmation email; it's delivered by send_queued_emails
             self._send_order_confirmation_email(order, points_earned)
             
             # Return the created order
             order_serializer = OrderDetailSerializer(order, context={'request': request})
             return Response(order_serializer.data, status=status.HTTP_201_CREATED)
             
+        except InsufficientStockError as e:
+            return Response(
+                {"detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             # Log the error
             import logging
@@ -219,7 +216,7 @@ class CheckoutView(viewsets.ViewSet):
             )
     
     def _send_order_confirmation_email(self, order, points_earned=0):
-        """Send order confirmation email to customer"""
+        """Queue order confirmation email to customer in the outbox"""
         user = order.user
         subject = f"Order Confirmation - Order #{order.id}"
         
@@ -231,14 +228,5 @@ class CheckoutView(viewsets.ViewSet):
             'points_earned': points_earned,
         }
         
-        html_message = render_to_string('orders/email/order_confirmation.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        queue_email(user.email, subject, 'orders/email/order_confirmation.html', context, order=order)
+
@@ -3,8 +3,9 @@ from django.utils.html import format_html
 from .models import (
     Category, Brand, Product, ProductImage, ProductVariant,
     ProductAttribute, ProductAttributeValue, InventoryLog,
-    Review, ProductRating
+    Review, ProductRating, ProductSales
 )
+from .ratings import recalculate_product_ratings
 
 class SubcategoryInline(admin.TabularInline):
     model = Category
@@ -16,15 +17,16 @@ class SubcategoryInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'parent', 'is_active', 'product_count', 'created_at']
+    list_display = ['name', 'parent', 'is_active', 'total_products', 'created_at']
     list_filter = ['is_active', 'parent']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['product_count', 'subtree_product_count', 'created_at', 'updated_at']
     inlines = [SubcategoryInline]
     
-    def product_count(self, obj):
-        return obj.products.count()
-    product_count.short_description = 'Products'
+    def total_products(self, obj):
+        return obj.subtree_product_count
+    total_products.short_description = 'Products'
+    total_products.admin_order_field = 'subtree_product_count'
     
     def get_queryset(self, request):
         # Filter to show only top-level categories in the list view
@@ -38,7 +40,7 @@ class BrandAdmin(admin.ModelAdmin):
     list_display = ['name', 'display_logo', 'is_active', 'product_count', 'created_at']
     list_filter = ['is_active']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at', 'display_logo_large']
+    readonly_fields = ['product_count', 'created_at', 'updated_at', 'display_logo_large']
     
     def display_logo(self, obj):
         if obj.logo:
@@ -51,10 +53,6 @@ class BrandAdmin(admin.ModelAdmin):
             return format_html('<img src="{}" height="100" />', obj.logo.url)
         return "-"
     display_logo_large.short_description = 'Logo Preview'
-    
-    def product_count(self, obj):
-        return obj.products.count()
-    product_count.short_description = 'Products'
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
@@ -109,12 +107,17 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews', 'mark_verified_purchase']
     
     def approve_reviews(self, request, queryset):
+        product_ids = list(queryset.values_list('product_id', flat=True))
         updated = queryset.update(is_approved=True)
+        # queryset.update() skips the review signals, so recount the affected products
+        recalculate_product_ratings(product_ids)
         self.message_user(request, f'{updated} reviews were successfully approved.')
     approve_reviews.short_description = "Approve selected reviews"
     
     def disapprove_reviews(self, request, queryset):
+        product_ids = list(queryset.values_list('product_id', flat=True))
         updated = queryset.update(is_approved=False)
+        recalculate_product_ratings(product_ids)
         self.message_user(request, f'{updated} reviews were successfully disapproved.')
     disapprove_reviews.short_description = "Disapprove selected reviews"
     
@@ -126,11 +129,11 @@ class ReviewAdmin(admin.ModelAdmin):
 
 @admin.register(ProductRating)
 class ProductRatingAdmin(admin.ModelAdmin):
-    list_display = ['product', 'total_reviews', 'average_rating', 'last_calculated']
+    list_display = ['product', 'total_reviews', 'average_rating', 'ranking_score', 'last_calculated']
     list_filter = ['total_reviews', 'last_calculated']
     search_fields = ['product__name']
     readonly_fields = [
-        'total_reviews', 'average_rating',
+        'total_reviews', 'rating_sum', 'average_rating', 'ranking_score',
         'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
         'last_calculated'
     ]
@@ -140,7 +143,7 @@ class ProductRatingAdmin(admin.ModelAdmin):
             'fields': ('product',)
         }),
         ('Rating Statistics', {
-            'fields': ('total_reviews', 'average_rating')
+            'fields': ('total_reviews', 'rating_sum', 'average_rating', 'ranking_score')
         }),
         ('Rating Distribution', {
             'fields': ('rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count')
@@ -153,14 +156,20 @@ class ProductRatingAdmin(admin.ModelAdmin):
     actions = ['recalculate_stats']
     
     def recalculate_stats(self, request, queryset):
-        updated = 0
-        for rating_stats in queryset:
-            rating_stats.update_stats()
-            updated += 1
+        updated = recalculate_product_ratings(queryset.values_list('product_id', flat=True))
         self.message_user(request, f'Rating statistics recalculated for {updated} products.')
     recalculate_stats.short_description = "Recalculate rating statistics"
 
 
+@admin.register(ProductSales)
+class ProductSalesAdmin(admin.ModelAdmin):
+    list_display = ['product', 'granularity', 'bucket_start', 'units', 'revenue']
+    list_filter = ['granularity', 'bucket_start']
+    search_fields = ['product__name']
+    date_hierarchy = 'bucket_start'
+    readonly_fields = ['product', 'granularity', 'bucket_start', 'units', 'revenue']
+
+
 
 
 
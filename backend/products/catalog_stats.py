@@ -0,0 +1,75 @@
+# products/catalog_stats.py
+"""
+Catalog statistics behind ProductViewSet.stats.
+
+compute_catalog_stats needs three queries whatever the catalog size: one
+aggregate over active products (counts, featured and on-sale counts via
+conditional aggregation, price range) and one GROUP BY each for categories
+and brands. The result is kept as a snapshot in the cache; product, category
+and brand changes drop it (see products.signals), so the endpoint is a
+single cache read that is recomputed at most once per change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Avg, Count, Max, Min
+
+from .models import Product
+
+SNAPSHOT_CACHE_KEY = 'catalog_stats'
+
+
+def snapshot_ttl():
+    # Safety net for changes that bypass signals, such as queryset.update()
+    return getattr(settings, 'CATALOG_STATS_TTL', 60 * 60)
+
+
+def _counts_by(products, relation):
+    """{name: active product count} for the active related objects"""
+    counts = {}
+    for row in products.filter(**{f'{relation}__is_active': True}).order_by().values(
+        f'{relation}_id', f'{relation}__name'
+    ).annotate(count=Count('id')):
+        name = row[f'{relation}__name']
+        counts[name] = counts.get(name, 0) + row['count']
+    return dict(sorted(counts.items()))
+
+
+def compute_catalog_stats():
+    products = Product.objects.filter(is_active=True)
+
+    totals = products.aggregate(
+        total_products=Count('id'),
+        featured_count=Count('id', filter=Q(is_featured=True)),
+        on_sale_count=Count('id', filter=Q(sale_price__isnull=False, sale_price__lt=F('price'))),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        avg_price=Avg('price')
+    )
+
+    return {
+        'total_products': totals['total_products'],
+        'featured_count': totals['featured_count'],
+        'on_sale_count': totals['on_sale_count'],
+        'price_stats': {
+            'min_price': totals['min_price'],
+            'max_price': totals['max_price'],
+            'avg_price': totals['avg_price'],
+        },
+        'categories': _counts_by(products, 'category'),
+        'brands': _counts_by(products, 'brand'),
+    }
+
+
+def get_catalog_stats():
+    """The cached snapshot, recomputed if it was invalidated or expired"""
+    stats = cache.get(SNAPSHOT_CACHE_KEY)
+    if stats is None:
+        stats = compute_catalog_stats()
+        cache.set(SNAPSHOT_CACHE_KEY, stats, snapshot_ttl())
+    return stats
+
+
+def invalidate_catalog_stats():
+    """Drop the snapshot once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(SNAPSHOT_CACHE_KEY))
@@ -0,0 +1,144 @@
+# products/category_tree.py
+"""
+Closure table for the product category tree.
+
+CategoryClosure holds a row for every (ancestor, descendant) pair, so "all
+products anywhere under a category" is one indexed join at any depth:
+
+    Product.objects.filter(in_category_subtree(category))
+
+The rows are kept in step by Category signals: a new category links to its
+parent's ancestors, and a move detaches the category's subtree from its old
+ancestors and attaches it under the new parent's, in a few set-based queries,
+moving the subtree's active product count (products.counters) with it.
+rebuild_closure recomputes the whole table from parent links.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Category, CategoryClosure
+
+
+def in_category_subtree(category, field='category'):
+    """Filter matching objects whose category is `category` or any category below it"""
+    return Q(**{f'{field}__ancestor_links__ancestor_id': getattr(category, 'pk', category)})
+
+
+def subtree_ids(category):
+    return list(CategoryClosure.objects.filter(
+        ancestor_id=getattr(category, 'pk', category)
+    ).values_list('descendant_id', flat=True))
+
+
+def _subtree_product_count(category_id):
+    return Category.objects.filter(pk=category_id).values_list('subtree_product_count', flat=True).first() or 0
+
+
+def _attach(category_id, parent_id):
+    """
+    Link every category in the subtree of category_id under parent_id's
+    ancestors, and add the subtree's products to their counters
+    """
+    if parent_id is None:
+        return
+    ancestors = list(CategoryClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list('descendant_id', 'depth'))
+    CategoryClosure.objects.bulk_create([
+        CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+        for ancestor_id, up in ancestors
+        for descendant_id, down in subtree
+    ], batch_size=1000)
+
+    moved = _subtree_product_count(category_id)
+    if moved:
+        Category.objects.filter(pk__in=[ancestor_id for ancestor_id, _ in ancestors]).update(
+            subtree_product_count=F('subtree_product_count') + moved
+        )
+
+
+def _detach(category_id):
+    """
+    Unlink the subtree of category_id from every category above it, and
+    take the subtree's products off their counters
+    """
+    above = list(CategoryClosure.objects.filter(
+        descendant_id=category_id, depth__gt=0
+    ).values_list('ancestor_id', flat=True))
+    if not above:
+        return
+    subtree = CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+    CategoryClosure.objects.filter(descendant_id__in=subtree, ancestor_id__in=above).delete()
+
+    moved = _subtree_product_count(category_id)
+    if moved:
+        Category.objects.filter(pk__in=above).update(subtree_product_count=F('subtree_product_count') - moved)
+
+
+@transaction.atomic
+def category_created(category):
+    CategoryClosure.objects.create(ancestor_id=category.pk, descendant_id=category.pk, depth=0)
+    _attach(category.pk, category.parent_id)
+
+
+@transaction.atomic
+def category_moved(category):
+    """Re-link the category's subtree under its current parent"""
+    if not CategoryClosure.objects.filter(ancestor_id=category.pk, descendant_id=category.pk).exists():
+        CategoryClosure.objects.create(ancestor_id=category.pk, descendant_id=category.pk, depth=0)
+    _detach(category.pk)
+    _attach(category.pk, category.parent_id)
+
+
+@transaction.atomic
+def category_deleting(category):
+    """
+    Deleting a category deletes its products and turns its children into
+    top-level categories (parent is SET_NULL), so its whole subtree leaves
+    the ancestors. The category's own rows go with it by cascade.
+    """
+    _detach(category.pk)
+
+
+@transaction.atomic
+def rebuild_closure():
+    """Recompute the whole closure table from parent links; returns the number of rows"""
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    rows = []
+    for category_id in parents:
+        depth, current, seen = 0, category_id, set()
+        # Walk up to the root, stopping at cycles left by direct database edits
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(CategoryClosure(ancestor_id=current, descendant_id=category_id, depth=depth))
+            current = parents.get(current)
+            depth += 1
+
+    CategoryClosure.objects.all().delete()
+    CategoryClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def build_tree(categories):
+    """
+    Nest (id, name, parent_id, subtree_product_count) rows into
+    [{'id', 'name', 'product_count', 'children'}, ...].
+    Categories whose parent isn't among the rows (e.g. it is inactive) are
+    left out along with their subtrees. Sibling order follows the rows.
+    """
+    children = defaultdict(list)
+    for category in categories:
+        children[category['parent_id']].append(category)
+
+    def nest(parent_id):
+        return [
+            {
+                'id': category['id'],
+                'name': category['name'],
+                'product_count': category['subtree_product_count'],
+                'children': nest(category['id'])
+            }
+            for category in children.get(parent_id, ())
+        ]
+
+    return nest(None)
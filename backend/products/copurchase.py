@@ -0,0 +1,210 @@
+# products/copurchase.py
+"""
+Item-to-item "also bought" recommendations from order baskets.
+
+build_co_purchases counts, for every pair of products, how many orders
+(cancelled ones aside) contained both (CoPurchaseCount), using one self-join aggregate per chunk of
+new orders and a cursor so each run only reads orders placed since the last
+one. The diagonal row (product, product) counts the orders containing the
+product, which gives the cosine similarity
+
+    score(a, b) = orders(a, b) / sqrt(orders(a) * orders(b))
+
+ProductNeighbor keeps only the PRODUCT_NEIGHBORS_TOP_K best neighbors per
+product, so reading recommendations is a single indexed lookup.
+"""
+import heapq
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Sum, Count
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CoPurchaseCount, ProductNeighbor, SalesRollupCursor
+
+# Orders younger than this are left for the next run, so a checkout that
+# committed late with a lower order item id isn't skipped by the cursor
+ROLLUP_GRACE = timedelta(minutes=2)
+
+CURSOR_NAME = 'co_purchase'
+ORDER_CHUNK_SIZE = 2000
+NEIGHBOR_CHUNK_SIZE = 500
+
+
+def top_k():
+    return getattr(settings, 'PRODUCT_NEIGHBORS_TOP_K', 20)
+
+
+def min_orders():
+    return getattr(settings, 'PRODUCT_NEIGHBORS_MIN_ORDERS', 1)
+
+
+def _pair_counts(order_ids):
+    """{(product_id, other_id): orders} for the given orders, diagonal included"""
+    from orders.models import OrderItem
+
+    rows = OrderItem.objects.filter(order_id__in=order_ids).exclude(order__status='cancelled').annotate(
+        sold_product_id=Coalesce('product_id', 'variant__product_id'),
+        other_product_id=Coalesce('order__items__product_id', 'order__items__variant__product_id')
+    ).filter(
+        sold_product_id__isnull=False, other_product_id__isnull=False
+    ).order_by().values('sold_product_id', 'other_product_id').annotate(
+        orders=Count('order_id', distinct=True)
+    )
+    return {(row['sold_product_id'], row['other_product_id']): row['orders'] for row in rows}
+
+
+def _apply_pair_counts(counts):
+    """Add pair counts onto CoPurchaseCount rows"""
+    product_ids = {product_id for product_id, _ in counts}
+    existing = {
+        (row.product_id, row.other_id): row for row in CoPurchaseCount.objects.filter(
+            product_id__in=product_ids, other_id__in={other_id for _, other_id in counts}
+        )
+    }
+
+    to_update, to_create = [], []
+    for (product_id, other_id), orders in counts.items():
+        row = existing.get((product_id, other_id))
+        if row:
+            row.orders += orders
+            to_update.append(row)
+        else:
+            to_create.append(CoPurchaseCount(product_id=product_id, other_id=other_id, orders=orders))
+
+    CoPurchaseCount.objects.bulk_update(to_update, ['orders'], batch_size=1000)
+    CoPurchaseCount.objects.bulk_create(to_create, batch_size=1000)
+
+
+def _neighbors_chunk(product_ids, k, threshold):
+    """Recompute the top-k neighbors of one chunk of products"""
+    rows = list(CoPurchaseCount.objects.filter(
+        product_id__in=product_ids, orders__gte=threshold
+    ).exclude(other_id=F('product_id')).values_list('product_id', 'other_id', 'orders'))
+
+    involved = set(product_ids) | {other_id for _, other_id, _ in rows}
+    totals = dict(CoPurchaseCount.objects.filter(
+        product_id__in=involved, other_id=F('product_id')
+    ).values_list('product_id', 'orders'))
+
+    candidates = {}
+    for product_id, other_id, orders in rows:
+        denominator = totals.get(product_id, 0) * totals.get(other_id, 0)
+        if denominator:
+            candidates.setdefault(product_id, []).append((orders / math.sqrt(denominator), other_id))
+
+    neighbors = [
+        ProductNeighbor(product_id=product_id, neighbor_id=other_id, score=score)
+        for product_id, scored in candidates.items()
+        for score, other_id in heapq.nlargest(k, scored)
+    ]
+    with transaction.atomic():
+        ProductNeighbor.objects.filter(product_id__in=product_ids).delete()
+        ProductNeighbor.objects.bulk_create(neighbors, batch_size=1000)
+    return len(neighbors)
+
+
+def _affected_products(product_ids, chunk_size=NEIGHBOR_CHUNK_SIZE):
+    """
+    product_ids plus every product that has one of them as a neighbor: a
+    product's order total is part of its neighbors' scores too
+    """
+    product_ids = sorted(set(product_ids))
+    affected = set(product_ids)
+    for start in range(0, len(product_ids), chunk_size):
+        affected.update(ProductNeighbor.objects.filter(
+            neighbor_id__in=product_ids[start:start + chunk_size]
+        ).values_list('product_id', flat=True))
+    return affected
+
+
+def refresh_neighbors(product_ids, chunk_size=NEIGHBOR_CHUNK_SIZE):
+    """Rebuild the ProductNeighbor rows of the given products"""
+    product_ids = sorted(set(product_ids))
+    k, threshold = top_k(), min_orders()
+    stored = 0
+    for start in range(0, len(product_ids), chunk_size):
+        stored += _neighbors_chunk(product_ids[start:start + chunk_size], k, threshold)
+    return stored
+
+
+def build_co_purchases(now=None, chunk_size=ORDER_CHUNK_SIZE):
+    """
+    Fold orders placed since the last run into CoPurchaseCount, then refresh
+    the neighbors of every product they contained and of every product
+    that has one of those as a neighbor. An order is counted once, when the
+    cursor passes its first order item; cancelled orders are skipped.
+    Returns the number of orders processed.
+    """
+    from orders.models import OrderItem
+
+    now = now or timezone.now()
+    touched = set()
+    with transaction.atomic():
+        # Locking the cursor serializes concurrent builds
+        SalesRollupCursor.objects.get_or_create(name=CURSOR_NAME)
+        cursor = SalesRollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+        last = cursor.last_order_item_id
+
+        upper = OrderItem.objects.filter(
+            id__gt=last, order__created_at__lte=now - ROLLUP_GRACE
+        ).aggregate(upper=Max('id'))['upper']
+        if upper is None:
+            return 0
+
+        order_ids = sorted(set(OrderItem.objects.filter(
+            id__gt=last, id__lte=upper
+        ).exclude(order__items__id__lte=last).values_list('order_id', flat=True)))
+
+        for start in range(0, len(order_ids), chunk_size):
+            counts = _pair_counts(order_ids[start:start + chunk_size])
+            _apply_pair_counts(counts)
+            touched.update(product_id for product_id, _ in counts)
+
+        cursor.last_order_item_id = upper
+        cursor.save(update_fields=['last_order_item_id', 'updated_at'])
+
+    refresh_neighbors(_affected_products(touched))
+    return len(order_ids)
+
+
+def rebuild_co_purchases():
+    """Discard the counts and neighbors and rebuild them from the full order history"""
+    with transaction.atomic():
+        SalesRollupCursor.objects.filter(name=CURSOR_NAME).delete()
+        CoPurchaseCount.objects.all().delete()
+        ProductNeighbor.objects.all().delete()
+    return build_co_purchases()
+
+
+def also_bought_ids(product_id, limit):
+    """Ids of the active products most often bought with product_id, best first"""
+    return list(ProductNeighbor.objects.filter(
+        product_id=product_id, neighbor__is_active=True
+    ).order_by('-score').values_list('neighbor_id', flat=True)[:limit])
+
+
+def personalized_product_ids(user, limit, history=50):
+    """
+    Ids of active products most often bought with the user's recent
+    purchases, excluding what they already bought, best first.
+    """
+    from orders.models import OrderItem
+
+    purchased = list(OrderItem.objects.filter(order__user=user).exclude(
+        order__status='cancelled'
+    ).annotate(
+        sold_product_id=Coalesce('product_id', 'variant__product_id')
+    ).filter(sold_product_id__isnull=False).order_by().values('sold_product_id').annotate(
+        last_ordered=Max('order__created_at')
+    ).order_by('-last_ordered').values_list('sold_product_id', flat=True)[:history])
+    if not purchased:
+        return []
+
+    return list(ProductNeighbor.objects.filter(
+        product_id__in=purchased, neighbor__is_active=True
+    ).exclude(neighbor_id__in=purchased).order_by().values('neighbor_id').annotate(
+        total_score=Sum('score')
+    ).order_by('-total_score', 'neighbor_id').values_list('neighbor_id', flat=True)[:limit])
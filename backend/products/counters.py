@@ -0,0 +1,62 @@
+# products/counters.py
+"""
+Active-product counters on Category (direct and subtree) and Brand.
+
+A product write changes the counters by at most one product, so signals
+apply the difference with F() updates instead of recounting: one UPDATE for
+the category and all its ancestors (found through the closure table) and one
+for the brand. Category moves shift a whole subtree's count between
+ancestors (see products.category_tree). recount_product_counts is the
+set-based repair for changes that bypass signals, such as queryset.update().
+"""
+from django.db.models import F, Func, Case, When, OuterRef, Subquery, Value, PositiveIntegerField
+from django.db.models.functions import Coalesce
+
+from .models import Brand, Category, Product
+
+
+def _adjust(state, delta):
+    category_id, brand_id = state
+    if category_id:
+        Category.objects.filter(descendant_links__descendant_id=category_id).update(
+            subtree_product_count=F('subtree_product_count') + delta,
+            product_count=Case(
+                When(pk=category_id, then=F('product_count') + delta),
+                default=F('product_count'),
+                output_field=PositiveIntegerField()
+            )
+        )
+    if brand_id:
+        Brand.objects.filter(pk=brand_id).update(product_count=F('product_count') + delta)
+
+
+def apply_product_change(old_state, new_state, categories=True):
+    """
+    Apply the counter change between two Product.count_state() values
+    (either may be None). categories=False only touches brand counters.
+    """
+    if old_state == new_state:
+        return
+    if not categories:
+        old_state = old_state and (None, old_state[1])
+        new_state = new_state and (None, new_state[1])
+    if old_state:
+        _adjust(old_state, -1)
+    if new_state:
+        _adjust(new_state, 1)
+
+
+def _count(queryset):
+    return Coalesce(Subquery(
+        queryset.order_by().annotate(total=Func(F('id'), function='COUNT')).values('total')
+    ), Value(0))
+
+
+def recount_product_counts():
+    """Recompute every category and brand counter in three UPDATE statements"""
+    active = Product.objects.filter(is_active=True)
+    Category.objects.update(
+        product_count=_count(active.filter(category_id=OuterRef('pk'))),
+        subtree_product_count=_count(active.filter(category__ancestor_links__ancestor_id=OuterRef('pk')))
+    )
+    Brand.objects.update(product_count=_count(active.filter(brand_id=OuterRef('pk'))))
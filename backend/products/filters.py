@@ -1,7 +1,35 @@
 import django_filters
 from django.db.models import F
+from rest_framework import filters
 from .models import Product, Category, Brand
 
+# Sort keys that live on the related ProductRating row
+ORDERING_ALIASES = {
+    'rating': 'rating_stats__average_rating',
+    'ranking': 'rating_stats__ranking_score',
+}
+
+
+def product_ordering(term):
+    """
+    Order expression for a sort term such as '-ranking' or 'price'.
+    Products without rating stats sort last in either direction.
+    """
+    descending = term.startswith('-')
+    name = term.lstrip('-')
+    expression = F(ORDERING_ALIASES.get(name, name))
+    return expression.desc(nulls_last=True) if descending else expression.asc(nulls_last=True)
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that understands the rating and ranking aliases"""
+    
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if ordering:
+            return queryset.order_by(*[product_ordering(term) for term in ordering])
+        return queryset
+
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
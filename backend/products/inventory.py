@@ -0,0 +1,196 @@
+# products/inventory.py
+"""
+Set-based stock adjustments.
+
+All adjustments in a batch are validated against row-locked stock levels,
+applied with one `UPDATE ... SET stock = stock + CASE ...` statement per
+chunk of products/variants, and logged with a single bulk insert.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django.utils import timezone
+
+from .models import Product, ProductVariant, InventoryLog
+
+ADJUSTMENT_TYPES = ('stock_in', 'stock_out', 'adjustment')
+UPDATE_CHUNK_SIZE = 500
+
+
+def signed_delta(adjustment_type, quantity):
+    """Stock change for an adjustment; stock_out removes, everything else adds"""
+    return -quantity if adjustment_type == 'stock_out' else quantity
+
+
+def _parse_line(raw):
+    """Normalize one adjustment line, returning (line, error)"""
+    if not isinstance(raw, dict):
+        return None, "Each adjustment must be an object"
+
+    product_id = raw.get('product_id')
+    variant_id = raw.get('variant_id')
+    if product_id is None and variant_id is None:
+        return None, "Either product_id or variant_id must be provided"
+    if product_id is not None and variant_id is not None:
+        return None, "Please provide either product_id or variant_id, not both"
+
+    try:
+        product_id = int(product_id) if product_id is not None else None
+        variant_id = int(variant_id) if variant_id is not None else None
+        quantity = int(raw.get('quantity', 0))
+    except (TypeError, ValueError):
+        return None, "Invalid quantity value"
+
+    adjustment_type = raw.get('adjustment_type', '')
+    if adjustment_type not in ADJUSTMENT_TYPES:
+        return None, "Invalid adjustment type. Must be 'stock_in', 'stock_out', or 'adjustment'"
+    if adjustment_type != 'adjustment' and quantity < 0:
+        return None, "Quantity must not be negative"
+
+    return {
+        'product_id': product_id,
+        'variant_id': variant_id,
+        'quantity': quantity,
+        'adjustment_type': adjustment_type,
+        'reference': raw.get('reference'),
+    }, None
+
+
+def _bulk_increment(model, deltas):
+    """Apply {id: delta} with one conditional UPDATE per chunk"""
+    items = [(pk, delta) for pk, delta in deltas.items() if delta]
+    now = timezone.now()
+
+    for start in range(0, len(items), UPDATE_CHUNK_SIZE):
+        chunk = items[start:start + UPDATE_CHUNK_SIZE]
+
+        # Group ids sharing the same delta to keep the CASE expression small
+        ids_by_delta = defaultdict(list)
+        for pk, delta in chunk:
+            ids_by_delta[delta].append(pk)
+
+        model.objects.filter(id__in=[pk for pk, _ in chunk]).update(
+            stock=F('stock') + Case(
+                *[When(id__in=ids, then=Value(delta)) for delta, ids in ids_by_delta.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            ),
+            updated_at=now
+        )
+
+
+def apply_stock_adjustments(adjustments, user=None, reference=None, all_or_nothing=False):
+    """
+    Validate and apply a batch of stock adjustments in one transaction.
+
+    Each adjustment is a dict with product_id or variant_id, quantity,
+    adjustment_type and an optional reference. Lines are validated in order
+    against the running stock so several lines may touch the same product.
+    Returns a summary with a per-line result list.
+    """
+    results = [None] * len(adjustments)
+    parsed = []
+
+    for index, raw in enumerate(adjustments):
+        line, error = _parse_line(raw)
+        if error:
+            results[index] = {'line': index, 'success': False, 'error': error}
+        else:
+            line['index'] = index
+            parsed.append(line)
+
+    product_ids = {line['product_id'] for line in parsed if line['product_id'] is not None}
+    variant_ids = {line['variant_id'] for line in parsed if line['variant_id'] is not None}
+
+    with transaction.atomic():
+        # Lock in deterministic id order so concurrent batches can't deadlock
+        running_stock = {}
+        variant_products = {}
+        for row in Product.objects.select_for_update().filter(
+            id__in=product_ids
+        ).order_by('id').values('id', 'stock'):
+            running_stock[('product', row['id'])] = row['stock']
+        for row in ProductVariant.objects.select_for_update().filter(
+            id__in=variant_ids
+        ).order_by('id').values('id', 'stock', 'product_id'):
+            running_stock[('variant', row['id'])] = row['stock']
+            variant_products[row['id']] = row['product_id']
+
+        product_deltas = defaultdict(int)
+        variant_deltas = defaultdict(int)
+        logs = []
+
+        for line in parsed:
+            index = line['index']
+            if line['variant_id'] is not None:
+                key = ('variant', line['variant_id'])
+                not_found = "Product variant not found"
+            else:
+                key = ('product', line['product_id'])
+                not_found = "Product not found"
+
+            if key not in running_stock:
+                results[index] = {'line': index, 'success': False, 'error': not_found}
+                continue
+
+            current = running_stock[key]
+            quantity = line['quantity']
+            delta = signed_delta(line['adjustment_type'], quantity)
+
+            if line['adjustment_type'] == 'stock_out' and current < quantity:
+                results[index] = {
+                    'line': index, 'success': False,
+                    'error': f"Not enough stock. Current stock: {current}, Requested: {quantity}"
+                }
+                continue
+            if current + delta < 0:
+                results[index] = {
+                    'line': index, 'success': False,
+                    'error': f"Adjustment would make stock negative. Current stock: {current}, Adjustment: {quantity}"
+                }
+                continue
+
+            running_stock[key] = current + delta
+            if key[0] == 'variant':
+                variant_deltas[key[1]] += delta
+                product_id = variant_products[key[1]]
+                variant_id = key[1]
+            else:
+                product_deltas[key[1]] += delta
+                product_id = key[1]
+                variant_id = None
+
+            logs.append(InventoryLog(
+                product_id=product_id,
+                variant_id=variant_id,
+                quantity=abs(quantity),
+                adjustment_type=line['adjustment_type'],
+                reference=line['reference'] or reference,
+                user=user
+            ))
+            results[index] = {
+                'line': index, 'success': True,
+                'product_id': product_id, 'variant_id': variant_id,
+                'new_stock': running_stock[key]
+            }
+
+        rejected = sum(1 for result in results if not result['success'])
+
+        if all_or_nothing and rejected:
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['error'] = "Not applied because other adjustments in the batch failed"
+                    result.pop('new_stock', None)
+            applied = 0
+        else:
+            _bulk_increment(Product, product_deltas)
+            _bulk_increment(ProductVariant, variant_deltas)
+            InventoryLog.objects.bulk_create(logs, batch_size=UPDATE_CHUNK_SIZE)
+            applied = len(logs)
+
+    return {
+        'applied': applied,
+        'rejected': len(results) - applied,
+        'results': results,
+    }
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from products.copurchase import build_co_purchases, rebuild_co_purchases
+from products.models import ProductNeighbor
+
+class Command(BaseCommand):
+    help = 'Fold new orders into the co-purchase counts and refresh "also bought" neighbors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Discard the counts and rebuild them from the full order history'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            processed = rebuild_co_purchases()
+        else:
+            processed = build_co_purchases()
+
+        if processed:
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} orders; {ProductNeighbor.objects.count()} neighbors stored'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('No new orders to process.'))
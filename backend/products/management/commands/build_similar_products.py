@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from products.similarity import build_similar_products
+
+class Command(BaseCommand):
+    help = 'Recompute content-based similar products for products whose features changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every active product, not only changed ones'
+        )
+
+    def handle(self, *args, **options):
+        recomputed = build_similar_products(rebuild=options['rebuild'])
+        if recomputed:
+            self.stdout.write(self.style.SUCCESS(f'Recomputed similar products for {recomputed} products'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No product features changed.'))
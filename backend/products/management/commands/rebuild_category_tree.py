@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from products.category_tree import rebuild_closure
+from products.counters import recount_product_counts
+
+class Command(BaseCommand):
+    help = 'Recompute the category closure table from parent links'
+
+    def handle(self, *args, **options):
+        rows = rebuild_closure()
+        # Subtree counts follow the closure table
+        recount_product_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt category tree with {rows} ancestor links'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from products.counters import recount_product_counts
+
+class Command(BaseCommand):
+    help = 'Recompute the active product counters on categories and brands'
+
+    def handle(self, *args, **options):
+        recount_product_counts()
+        self.stdout.write(self.style.SUCCESS('Category and brand product counts recomputed.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.sales import rebuild_sales_rollup, rollup_sales
+
+class Command(BaseCommand):
+    help = 'Fold new order items into the ProductSales rollup used by trending and bestselling'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Discard the rollup and rebuild it from the full order history'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            processed = rebuild_sales_rollup()
+        else:
+            processed = rollup_sales()
+
+        if processed:
+            self.stdout.write(self.style.SUCCESS(f'Rolled up {processed} order items'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No new order items to roll up.'))
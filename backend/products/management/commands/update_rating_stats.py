@@ -1,6 +1,8 @@
+import time
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from products.models import Product, ProductRating
+from django.db.models import Exists, OuterRef
+from products.models import Product, ProductRating, Review
+from products.ratings import REBUILD_CHUNK_SIZE, rebuild_rating_stats
 
 
 class Command(BaseCommand):
@@ -12,49 +14,53 @@ class Command(BaseCommand):
             action='store_true',
             help='Recalculate all product ratings from scratch',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=REBUILD_CHUNK_SIZE,
+            help=f'Products recomputed per aggregate query and bulk upsert (default: {REBUILD_CHUNK_SIZE})',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting rating statistics update...'))
+        start = time.perf_counter()
 
-        with transaction.atomic():
-            # Update product ratings
-            products_updated = 0
-            products_with_reviews = Product.objects.filter(reviews__isnull=False).distinct()
-            
-            self.stdout.write(f'Updating ratings for {products_with_reviews.count()} products...')
-            
-            for product in products_with_reviews:
-                rating_stats = product.get_or_create_rating_stats()
-                
-                if options['recalculate_all']:
-                    # Force recalculation
-                    rating_stats.update_stats()
-                else:
-                    # Only update if stats are outdated or missing
-                    if rating_stats.total_reviews == 0 or not rating_stats.last_calculated:
-                        rating_stats.update_stats()
-                
-                products_updated += 1
-                
-                if products_updated % 100 == 0:
-                    self.stdout.write(f'Updated {products_updated} products...')
+        has_reviews = Exists(Review.objects.filter(product=OuterRef('pk')))
+        has_stats = Exists(ProductRating.objects.filter(product=OuterRef('pk')))
+        if options['recalculate_all']:
+            # Every product with reviews, plus stale stats whose reviews are gone
+            products = Product.objects.filter(has_reviews | has_stats)
+        else:
+            # Only update if stats are missing or empty
+            up_to_date = Exists(ProductRating.objects.filter(product=OuterRef('pk'), total_reviews__gt=0))
+            products = Product.objects.filter(has_reviews & ~up_to_date)
 
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Successfully updated rating statistics for {products_updated} products!'
-                )
+        product_ids = list(products.order_by().values_list('id', flat=True))
+        self.stdout.write(f'Updating ratings for {len(product_ids)} products...')
+
+        def report(done, total):
+            self.stdout.write(f'Updated {done}/{total} products...')
+
+        products_updated = rebuild_rating_stats(
+            product_ids, chunk_size=options['chunk_size'], progress=report
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully updated rating statistics for {products_updated} products '
+                f'in {time.perf_counter() - start:.2f}s!'
             )
+        )
 
         # Display some example results
         self.stdout.write('\n--- Sample Product Ratings ---')
-        sample_products = Product.objects.filter(
-            rating_stats__total_reviews__gt=0
-        ).order_by('-rating_stats__total_reviews')[:5]
+        sample_stats = ProductRating.objects.filter(
+            total_reviews__gt=0
+        ).select_related('product').order_by('-total_reviews')[:5]
         
-        for product in sample_products:
-            stats = product.rating_stats
+        for stats in sample_stats:
             self.stdout.write(
-                f'{product.name[:50]}... | '
+                f'{stats.product.name[:50]}... | '
                 f'Reviews: {stats.total_reviews} | '
                 f'Average: {stats.average_rating}'
-            ) 
\ No newline at end of file
+            )
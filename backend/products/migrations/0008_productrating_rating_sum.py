@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_sum(apps, schema_editor):
+    ProductRating = apps.get_model('products', 'ProductRating')
+    Review = apps.get_model('products', 'Review')
+    approved_sum = Review.objects.filter(
+        product_id=OuterRef('product_id'), is_approved=True
+    ).order_by().values('product_id').annotate(total=Sum('rating')).values('total')
+    ProductRating.objects.update(rating_sum=Coalesce(Subquery(approved_sum), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_remove_category_brand_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productrating',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:11
+
+import math
+
+from django.db import migrations, models
+
+
+def backfill_ranking_score(apps, schema_editor):
+    ProductRating = apps.get_model('products', 'ProductRating')
+    z = 1.96
+    updated = []
+    for stats in ProductRating.objects.filter(total_reviews__gt=0).iterator():
+        n = stats.total_reviews
+        phat = (stats.rating_sum - n) / (4 * n)
+        spread = z * math.sqrt((phat * (1 - phat) + z * z / (4 * n)) / n)
+        stats.ranking_score = (phat + z * z / (2 * n) - spread) / (1 + z * z / n)
+        updated.append(stats)
+    ProductRating.objects.bulk_update(updated, ['ranking_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_productrating_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productrating',
+            name='ranking_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='productrating',
+            index=models.Index(fields=['-ranking_score', '-total_reviews'], name='products_pr_ranking_57070c_idx'),
+        ),
+        migrations.RunPython(backfill_ranking_score, migrations.RunPython.noop),
+    ]
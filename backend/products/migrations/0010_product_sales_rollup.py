@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_productrating_ranking_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_order_item_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('hour', 'Hour')], default='day', max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product sales',
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='products_pr_granula_d2778b_idx')],
+                'unique_together': {('product', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
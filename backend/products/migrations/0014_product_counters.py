@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:25
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Brand = apps.get_model('products', 'Brand')
+    Product = apps.get_model('products', 'Product')
+    active = Product.objects.filter(is_active=True)
+
+    def count(queryset):
+        return Coalesce(Subquery(
+            queryset.order_by().annotate(total=Func(F('id'), function='COUNT')).values('total')
+        ), Value(0))
+
+    Category.objects.update(
+        product_count=count(active.filter(category_id=OuterRef('pk'))),
+        subtree_product_count=count(active.filter(category__ancestor_links__ancestor_id=OuterRef('pk')))
+    )
+    Brand.objects.update(product_count=count(active.filter(brand_id=OuterRef('pk'))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_category_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='subtree_product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
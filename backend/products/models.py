@@ -1,34 +1,99 @@
 # products/models.py
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg, Count
+from django.db.models import Count, Sum, Q
 import math
 from datetime import datetime, timedelta
 
-class Category(models.Model):
+# Marks state that wasn't loaded from the database (deferred fields)
+DEFERRED = object()
+
+
+class CounterFieldsMixin:
+    """
+    Leaves COUNTER_FIELDS out of saves of existing rows unless update_fields
+    names them: the counters move with F() updates (products.counters), and
+    an instance loaded before one of those would write the old value back.
+    """
+    COUNTER_FIELDS = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class Category(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='subcategories')
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Active products directly in this category / anywhere in its subtree (products.counters)
+    product_count = models.PositiveIntegerField(default=0)
+    subtree_product_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    COUNTER_FIELDS = ('product_count', 'subtree_product_count')
+    
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored parent so saves only touch the closure table on moves
+        instance._loaded_parent_id = instance.__dict__.get('parent_id', DEFERRED)
+        return instance
+    
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({'parent': 'A category cannot be moved under itself or its subcategories.'})
 
-class Brand(models.Model):
+
+class CategoryClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair in the category tree, including
+    each category paired with itself at depth 0. Maintained by
+    products.category_tree from Category signals.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+
+class Brand(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     logo = models.ImageField(upload_to='brands/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Active products of this brand (products.counters)
+    product_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    COUNTER_FIELDS = ('product_count',)
+    
     class Meta:
         ordering = ['name']
     
@@ -74,6 +139,28 @@ class Product(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the category and brand counters currently count for this
+        # product so saves and deletes can apply deltas
+        instance._loaded_count_state = instance.count_state()
+        # And the stored category and price, which other apps' mappings and
+        # cached totals follow
+        instance._loaded_category_id = instance.__dict__.get('category_id', DEFERRED)
+        instance._loaded_price = instance.__dict__.get('price', DEFERRED)
+        return instance
+    
+    def count_state(self):
+        """
+        (category_id, brand_id) counted for this product, None if it is
+        inactive, or DEFERRED if any of the fields is deferred
+        """
+        values = self.__dict__
+        if not all(field in values for field in ('category_id', 'brand_id', 'is_active')):
+            return DEFERRED
+        return (values['category_id'], values['brand_id']) if values['is_active'] else None
+    
     @property
     def is_on_sale(self):
         return bool(self.sale_price is not None and self.sale_price < self.price)
@@ -173,6 +260,13 @@ class ProductVariant(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored adjustment so saves can tell when the price changed
+        instance._loaded_price_adjustment = instance.__dict__.get('price_adjustment', DEFERRED)
+        return instance
+    
     def __str__(self):
         return f"{self.product.name} - {self.name}"
     
@@ -237,6 +331,21 @@ class Review(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name} - {self.rating} stars"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the rating aggregates currently count for this review
+        # so saves and deletes can apply deltas instead of recounting
+        instance._loaded_rating_state = instance.rating_state()
+        return instance
+    
+    def rating_state(self):
+        """(product_id, rating, is_approved), or None if any of them is deferred"""
+        values = self.__dict__
+        if not all(field in values for field in ('product_id', 'rating', 'is_approved')):
+            return None
+        return (values['product_id'], values['rating'], values['is_approved'])
 
 class ProductRating(models.Model):
     """Aggregated rating statistics for products - Simple and Clean"""
@@ -245,8 +354,12 @@ class ProductRating(models.Model):
     
     # Basic statistics
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)  # Sum of approved ratings; average = rating_sum / total_reviews
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     
+    # Wilson lower bound of the rating (0-1); used to rank top-rated products
+    ranking_score = models.FloatField(default=0)
+    
     # Rating distribution (for showing star breakdown)
     rating_1_count = models.PositiveIntegerField(default=0)
     rating_2_count = models.PositiveIntegerField(default=0) 
@@ -261,34 +374,34 @@ class ProductRating(models.Model):
         indexes = [
             models.Index(fields=['-average_rating']),
             models.Index(fields=['-total_reviews']),
+            models.Index(fields=['-ranking_score', '-total_reviews']),
         ]
     
     def __str__(self):
         return f"{self.product.name} - {self.average_rating} ({self.total_reviews} reviews)"
     
     def update_stats(self):
-        """Update rating statistics from approved reviews"""
+        """Recalculate rating statistics from approved reviews (full repair path)"""
         from decimal import Decimal
         
-        approved_reviews = self.product.reviews.filter(is_approved=True)
+        stats = self.product.reviews.filter(is_approved=True).aggregate(
+            total=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+        )
         
-        # Update total count
-        self.total_reviews = approved_reviews.count()
+        self.total_reviews = stats['total']
+        self.rating_sum = stats['rating_sum'] or 0
+        for i in range(1, 6):
+            setattr(self, f'rating_{i}_count', stats[f'rating_{i}'])
         
         if self.total_reviews > 0:
-            # Calculate average rating
-            avg_result = approved_reviews.aggregate(avg=Avg('rating'))
-            self.average_rating = Decimal(str(avg_result['avg'] or 0))
-            
-            # Update rating distribution
-            for i in range(1, 6):
-                count = approved_reviews.filter(rating=i).count()
-                setattr(self, f'rating_{i}_count', count)
+            self.average_rating = (Decimal(self.rating_sum) / self.total_reviews).quantize(Decimal('0.01'))
         else:
-            # No reviews
             self.average_rating = Decimal('0.00')
-            for i in range(1, 6):
-                setattr(self, f'rating_{i}_count', 0)
+        
+        from .ratings import wilson_score
+        self.ranking_score = wilson_score(self.total_reviews, self.rating_sum)
         
         self.save()
     
@@ -314,3 +427,99 @@ class ProductRating(models.Model):
             for count in self.rating_distribution
         ]
 
+
+class ProductSales(models.Model):
+    """
+    Units and revenue sold per product per day (or hour), rolled up from
+    order items by products.sales.rollup_sales.
+    """
+    GRANULARITY_CHOICES = (
+        ('day', 'Day'),
+        ('hour', 'Hour'),
+    )
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollup')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES, default='day')
+    bucket_start = models.DateTimeField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Product sales'
+        unique_together = ('product', 'granularity', 'bucket_start')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} - {self.units} units"
+
+class SalesRollupCursor(models.Model):
+    """Highest order item id already folded into a rollup (ProductSales, CoPurchaseCount)"""
+    name = models.CharField(max_length=50, unique=True)
+    last_order_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_order_item_id}"
+
+
+class CoPurchaseCount(models.Model):
+    """
+    Number of orders containing both product and other, maintained by
+    products.copurchase. The diagonal row (other == product) holds the number
+    of orders containing the product.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchase_counts')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'other')
+    
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders} orders"
+
+
+class ProductNeighbor(models.Model):
+    """Top co-purchased products per product, best first"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'neighbor')
+        ordering = ['product', '-score']
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class SimilarProduct(models.Model):
+    """Top content-similar products per product, best first"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_products')
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'similar')
+        ordering = ['product', '-score']
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class ProductSimilarityState(models.Model):
+    """Fingerprint of the features SimilarProduct rows were last computed from"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='similarity_state')
+    fingerprint = models.CharField(max_length=40)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.fingerprint}"
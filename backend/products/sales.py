@@ -0,0 +1,192 @@
+# products/sales.py
+"""
+Sales-velocity rollup behind the trending and bestselling endpoints.
+
+rollup_sales keeps ProductSales (units and revenue per product per day, and
+optionally per hour) in step with the order items. Buckets in a trailing
+window are recomputed from scratch on every run, so a checkout that commits
+late, after a run that already passed its order item id, is still counted.
+Older buckets only receive items added to older orders since the last run,
+found with a cursor on the order item id.
+Endpoints then score products with a grouped read over the small rollup
+table instead of aggregating the whole order history per request.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, Max, Case, When, Value, FloatField
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import ProductSales, SalesRollupCursor
+
+CURSOR_NAME = 'order_items'
+
+# Longest ?days= window the sales endpoints accept
+MAX_WINDOW_DAYS = 365
+
+# Sales weighted less than this by recency decay are left out of the score
+MIN_DECAY_WEIGHT = 1e-4
+
+TRUNCATE = {
+    'day': TruncDay,
+    'hour': TruncHour,
+}
+
+
+def rollup_window():
+    return timedelta(hours=getattr(settings, 'PRODUCT_SALES_ROLLUP_WINDOW_HOURS', 6))
+
+
+def rollup_granularities():
+    if getattr(settings, 'PRODUCT_SALES_HOURLY_ROLLUP', False):
+        return ['day', 'hour']
+    return ['day']
+
+
+def _apply_increments(granularity, increments):
+    """Add {(product_id, bucket_start): (units, revenue)} onto ProductSales rows"""
+    if not increments:
+        return
+
+    product_ids = {product_id for product_id, _ in increments}
+    buckets = {bucket for _, bucket in increments}
+    existing = {
+        (row.product_id, row.bucket_start): row for row in ProductSales.objects.filter(
+            granularity=granularity, product_id__in=product_ids, bucket_start__in=buckets
+        )
+    }
+
+    to_update, to_create = [], []
+    for key, (units, revenue) in increments.items():
+        row = existing.get(key)
+        if row:
+            row.units += units
+            row.revenue += revenue
+            to_update.append(row)
+        else:
+            to_create.append(ProductSales(
+                product_id=key[0], granularity=granularity, bucket_start=key[1],
+                units=units, revenue=revenue
+            ))
+
+    ProductSales.objects.bulk_update(to_update, ['units', 'revenue'], batch_size=1000)
+    ProductSales.objects.bulk_create(to_create, batch_size=1000)
+
+
+def _window_start(granularity, now):
+    """Start of the first bucket overlapping the trailing rollup window (buckets are local time)"""
+    start = timezone.localtime(now - rollup_window()).replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if granularity == 'day' else start
+
+
+def _increments(items, granularity):
+    """{(product_id, bucket_start): (units, revenue)} of an order item queryset"""
+    rows = items.annotate(
+        sold_product_id=Coalesce('product_id', 'variant__product_id'),
+        bucket=TRUNCATE[granularity]('order__created_at')
+    ).filter(sold_product_id__isnull=False).order_by().values('sold_product_id', 'bucket').annotate(
+        units=Sum('quantity'),
+        revenue=Sum('subtotal')
+    )
+    return {(row['sold_product_id'], row['bucket']): (row['units'], row['revenue']) for row in rows}
+
+
+@transaction.atomic
+def rollup_sales(now=None):
+    """
+    Recompute the buckets of the trailing window and fold order items added
+    to older orders since the last run into ProductSales. Variant sales
+    count towards their parent product. Returns the number of order items
+    added since the last run.
+    """
+    from orders.models import OrderItem
+
+    now = now or timezone.now()
+    # Locking the cursor serializes concurrent rollups
+    SalesRollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    cursor = SalesRollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+
+    pending = OrderItem.objects.filter(id__gt=cursor.last_order_item_id)
+    upper = pending.aggregate(upper=Max('id'))['upper']
+    new_items = pending.filter(id__lte=upper) if upper is not None else pending.none()
+    processed = new_items.count()
+
+    for granularity in rollup_granularities():
+        window_start = _window_start(granularity, now)
+        _apply_increments(granularity, _increments(
+            new_items.filter(order__created_at__lt=window_start), granularity
+        ))
+        ProductSales.objects.filter(granularity=granularity, bucket_start__gte=window_start).delete()
+        _apply_increments(granularity, _increments(
+            OrderItem.objects.filter(order__created_at__gte=window_start), granularity
+        ))
+
+    if upper is not None:
+        cursor.last_order_item_id = upper
+        cursor.save(update_fields=['last_order_item_id', 'updated_at'])
+    return processed
+
+
+@transaction.atomic
+def rebuild_sales_rollup():
+    """Discard the rollup and rebuild it from the full order history"""
+    SalesRollupCursor.objects.filter(name=CURSOR_NAME).delete()
+    ProductSales.objects.all().delete()
+    return rollup_sales()
+
+
+def trending_half_life():
+    return timedelta(hours=getattr(settings, 'PRODUCT_TRENDING_HALF_LIFE_HOURS', 48))
+
+
+def decay_weight(age, half_life):
+    """Weight of sales that happened `age` ago; halves every half_life"""
+    if not half_life:
+        return 1.0
+    return 0.5 ** (max(age.total_seconds(), 0) / half_life.total_seconds())
+
+
+def top_selling_product_ids(start, end, limit, half_life=None, exclude_ids=None):
+    """
+    Ids of the best-scoring active products sold in [start, end), best first.
+    Each bucket's units are weighted by how long before `end` it started.
+    """
+    granularity = 'hour' if 'hour' in rollup_granularities() and end - start <= timedelta(days=7) else 'day'
+    # Align the window with bucket boundaries (buckets are truncated in local time)
+    start = timezone.localtime(start).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        start = start.replace(hour=0)
+
+    rows = ProductSales.objects.filter(
+        granularity=granularity,
+        bucket_start__gte=start,
+        bucket_start__lt=end,
+        product__is_active=True
+    )
+    if exclude_ids:
+        rows = rows.exclude(product_id__in=exclude_ids)
+
+    if half_life:
+        step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+        # One WHEN per bucket; buckets weighing less than MIN_DECAY_WEIGHT fall
+        # through to the default, which bounds the CASE however long the window is
+        weights = []
+        bucket = start
+        while bucket < end:
+            bucket_weight = decay_weight(end - bucket, half_life)
+            if bucket_weight >= MIN_DECAY_WEIGHT:
+                weights.append((bucket, bucket_weight))
+            bucket += step
+        weight = Case(
+            *[When(bucket_start=bucket, then=Value(bucket_weight)) for bucket, bucket_weight in weights],
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+        score = Sum(F('units') * weight, output_field=FloatField())
+    else:
+        score = Sum('units')
+
+    return list(rows.order_by().values('product_id').annotate(
+        score=score
+    ).filter(score__gt=0).order_by('-score', 'product_id').values_list('product_id', flat=True)[:limit])
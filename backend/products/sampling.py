@@ -0,0 +1,102 @@
+# products/sampling.py
+"""
+Random sampling of product querysets without ORDER BY RANDOM().
+
+order_by('?') makes the database sort every matching row to return a few,
+so random picks cost O(n log n) per call. Here picks cost O(k):
+
+- On PostgreSQL we probe random ids between the table's min and max id
+  (both read from the primary key index) and keep the ones the queryset
+  matches. Product ids are dense, so a handful of probes per pick is enough.
+- Otherwise, or when probing comes up short (sparse filters, large id gaps),
+  we sample from a cached, shuffled pool of the queryset's ids. The pool is
+  rebuilt once it expires (PRODUCT_SAMPLE_POOL_TTL), not on every request.
+
+Picked ids are always re-checked against the queryset, so a stale pool can
+only return fewer rows, never rows the queryset excludes. Passing a seed
+makes the picks repeatable, e.g. per user per hour via sampling_seed().
+"""
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Min, Max
+
+POOL_CACHE_PREFIX = 'sample_pool'
+
+# Random ids probed per requested row
+PROBE_FACTOR = 8
+
+
+def pool_ttl():
+    return getattr(settings, 'PRODUCT_SAMPLE_POOL_TTL', 15 * 60)
+
+
+def pool_size():
+    return getattr(settings, 'PRODUCT_SAMPLE_POOL_SIZE', 10000)
+
+
+def sampling_seed(request):
+    """Seed that varies per user and changes every PRODUCT_SAMPLE_SEED_PERIOD seconds"""
+    if not request.user.is_authenticated:
+        return None
+    period = int(time.time() // getattr(settings, 'PRODUCT_SAMPLE_SEED_PERIOD', 60 * 60))
+    return f'{request.user.pk}:{period}'
+
+
+def _id_pool(queryset, pool_key, refresh=False):
+    """Shuffled ids of the queryset, cached under pool_key"""
+    cache_key = f'{POOL_CACHE_PREFIX}:{queryset.model._meta.label_lower}:{pool_key}'
+    pool = None if refresh else cache.get(cache_key)
+    if pool is None:
+        pool = list(queryset.order_by().values_list('pk', flat=True))
+        random.shuffle(pool)
+        pool = pool[:pool_size()]
+        cache.set(cache_key, pool, pool_ttl())
+    return pool
+
+
+def _probe_ids(queryset, count, rng, exclude):
+    """Ids matched by probing random points of the primary key range"""
+    bounds = queryset.model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    span = range(bounds['low'], bounds['high'] + 1)
+    candidates = rng.sample(span, min(len(span), count * PROBE_FACTOR))
+    matched = set(queryset.filter(pk__in=candidates).values_list('pk', flat=True))
+    return [pk for pk in candidates if pk in matched and pk not in exclude]
+
+
+def sample(queryset, k, pool_key, seed=None, exclude_ids=()):
+    """
+    Up to k random objects from queryset, in random order.
+    pool_key names the fallback id pool and must identify the queryset's
+    filters, e.g. f'category:{category.id}'.
+    """
+    if k <= 0:
+        return []
+    rng = random.Random(f'{seed}:{pool_key}') if seed is not None else random.Random()
+    exclude = set(exclude_ids)
+
+    picked = []
+    if connection.vendor == 'postgresql':
+        picked = _probe_ids(queryset, k, rng, exclude)[:k]
+    objects = queryset.in_bulk(picked) if picked else {}
+
+    refresh = False
+    while len(objects) < k:
+        pool = _id_pool(queryset, pool_key, refresh=refresh)
+        skip = exclude.union(picked)
+        # Oversample so excluded and stale ids can be skipped
+        wanted = min(len(pool), 2 * k + len(skip))
+        extra = [pk for pk in rng.sample(pool, wanted) if pk not in skip][:2 * (k - len(objects))]
+        found = queryset.in_bulk(extra)
+        objects.update(found)
+        picked += extra
+        # Ids that no longer match mean the cached pool is stale: rebuild it once
+        if refresh or len(found) == len(extra):
+            break
+        refresh = True
+
+    return [objects[pk] for pk in picked if pk in objects][:k]
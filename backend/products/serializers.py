@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     Category, Product, ProductImage, Brand, 
     ProductAttribute, ProductAttributeValue, 
-    ProductVariant, InventoryLog, Review, ProductRating
+    ProductVariant, InventoryLog, Review, ProductRating, CategoryClosure
 )
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -11,8 +11,15 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'parent', 'parent_name', 
-                  'image', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+                  'image', 'is_active', 'product_count', 'subtree_product_count', 'created_at', 'updated_at']
+        read_only_fields = ['product_count', 'subtree_product_count', 'created_at', 'updated_at']
+    
+    def validate_parent(self, parent):
+        if parent and self.instance and CategoryClosure.objects.filter(
+            ancestor_id=self.instance.pk, descendant_id=parent.pk
+        ).exists():
+            raise serializers.ValidationError('A category cannot be moved under itself or its subcategories.')
+        return parent
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -25,8 +32,8 @@ class CategorySerializer(serializers.ModelSerializer):
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
-        fields = ['id', 'name', 'description', 'logo', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'logo', 'is_active', 'product_count', 'created_at', 'updated_at']
+        read_only_fields = ['product_count', 'created_at', 'updated_at']
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -87,7 +94,7 @@ class ProductRatingSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductRating
         fields = [
-            'total_reviews', 'average_rating', 'last_calculated',
+            'total_reviews', 'average_rating', 'ranking_score', 'last_calculated',
             'rating_1_count', 'rating_2_count', 'rating_3_count', 
             'rating_4_count', 'rating_5_count', 'rating_distribution', 
             'rating_percentages'
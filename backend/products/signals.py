@@ -1,23 +1,103 @@
 # products/signals.py - Simplified Review Signals
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Review, ProductRating
+from .models import Review, Product, Category, Brand, DEFERRED
+from .category_tree import category_created, category_moved, category_deleting
+from .counters import apply_product_change
+from .catalog_stats import invalidate_catalog_stats
+from .ratings import apply_review_change, recalculate_product_ratings
 
 
 @receiver(post_save, sender=Review)
 def update_product_rating_on_review_save(sender, instance, created, **kwargs):
-    """Update product rating stats when a review is created or updated"""
-    # Get or create rating stats for the product
-    rating_stats, _ = ProductRating.objects.get_or_create(product=instance.product)
-    rating_stats.update_stats()
+    """Apply the review's rating change to the product's rating stats"""
+    new_state = instance.rating_state()
+    
+    if created:
+        apply_review_change(None, new_state)
+    elif hasattr(instance, '_loaded_rating_state') and instance._loaded_rating_state and new_state:
+        apply_review_change(instance._loaded_rating_state, new_state)
+    else:
+        # We don't know what the stats counted before this save; recount
+        recalculate_product_ratings([instance.product_id])
+    
+    instance._loaded_rating_state = new_state
 
 
 @receiver(post_delete, sender=Review)
 def update_product_rating_on_review_delete(sender, instance, **kwargs):
-    """Update product rating stats when a review is deleted"""
-    try:
-        rating_stats = ProductRating.objects.get(product=instance.product)
-        rating_stats.update_stats()
-    except ProductRating.DoesNotExist:
-        # Rating stats don't exist, nothing to update
-        pass 
\ No newline at end of file
+    """Remove the deleted review's rating from the product's rating stats"""
+    state = getattr(instance, '_loaded_rating_state', None) or instance.rating_state()
+    apply_review_change(state, None)
+
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_catalog_stats_on_change(sender, **kwargs):
+    """Catalog changes make the stats snapshot stale"""
+    invalidate_catalog_stats()
+
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure_on_save(sender, instance, created, raw=False, **kwargs):
+    """Link new categories into the closure table and re-link moved ones"""
+    if raw:
+        return
+    if created:
+        category_created(instance)
+    elif getattr(instance, '_loaded_parent_id', DEFERRED) != instance.parent_id:
+        category_moved(instance)
+    instance._loaded_parent_id = instance.parent_id
+
+
+@receiver(pre_delete, sender=Category)
+def update_category_closure_on_delete(sender, instance, **kwargs):
+    """Children of a deleted category become top-level categories"""
+    category_deleting(instance)
+
+
+
+def stored_count_state(product_id):
+    stored = Product.objects.filter(pk=product_id).only('category_id', 'brand_id', 'is_active').first()
+    return stored.count_state() if stored else None
+
+
+@receiver(pre_save, sender=Product)
+def load_product_count_state(sender, instance, raw=False, **kwargs):
+    """Read what the counters count for products that weren't loaded with those fields"""
+    if raw or not instance.pk or getattr(instance, '_loaded_count_state', DEFERRED) is not DEFERRED:
+        return
+    instance._loaded_count_state = stored_count_state(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_counters_on_product_save(sender, instance, created, raw=False, **kwargs):
+    """Apply the product's category, brand and activation change to the counters"""
+    if raw:
+        return
+    new_state = instance.count_state()
+    if new_state is DEFERRED:
+        new_state = stored_count_state(instance.pk)
+    apply_product_change(None if created else instance._loaded_count_state, new_state)
+    instance._loaded_count_state = new_state
+
+
+@receiver(post_delete, sender=Product)
+def update_counters_on_product_delete(sender, instance, origin=None, **kwargs):
+    """Take the deleted product off the counters"""
+    state = getattr(instance, '_loaded_count_state', DEFERRED)
+    if state is DEFERRED:
+        state = instance.count_state()
+    if state is DEFERRED:
+        # Not knowable once the row is gone; recount_product_counts repairs it
+        return
+    # Products deleted along with their category were already taken off the
+    # category counters when the category left the tree
+    deleting_category = isinstance(origin, Category) or getattr(origin, 'model', None) is Category
+    apply_product_change(state, None, categories=not deleting_category)
@@ -0,0 +1,215 @@
+# products/similarity.py
+"""
+Content-based "similar products", for products without purchase history.
+
+Each active product becomes a sparse feature vector (a dict of feature to
+weight): its category and parent category, brand, attribute values, price
+band, and TF-IDF weighted words from its name, description and
+meta_keywords. Vectors are L2-normalized, so the similarity of two products
+is the dot product of their vectors, computed through an inverted index
+over the features two products share.
+
+build_similar_products stores the top PRODUCT_SIMILAR_TOP_K matches per
+product in SimilarProduct and a fingerprint of the raw features in
+ProductSimilarityState, so later runs only recompute products whose
+features changed (plus the products whose lists they enter or leave).
+"""
+import hashlib
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import Product, ProductSimilarityState, SimilarProduct
+
+WRITE_CHUNK_SIZE = 500
+
+# Relative weight of each feature group in a product vector
+FEATURE_WEIGHTS = {
+    'category': 1.0,
+    'parent': 0.5,
+    'brand': 0.8,
+    'attribute': 0.6,
+    'price': 0.5,
+    'text': 1.2,
+}
+
+# Words in more than this share of products carry no signal (once there are enough products)
+MAX_DOCUMENT_FREQUENCY = 0.5
+MIN_PRODUCTS_FOR_MAX_DF = 20
+
+TOKEN_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+STOP_WORDS = frozenset({
+    'and', 'the', 'for', 'with', 'your', 'you', 'this', 'that', 'from', 'are', 'its', 'our',
+    'all', 'has', 'have', 'into', 'more', 'can', 'will', 'not', 'but', 'any', 'per',
+})
+
+
+def top_k():
+    return getattr(settings, 'PRODUCT_SIMILAR_TOP_K', 20)
+
+
+def tokenize(text):
+    return [word for word in TOKEN_RE.findall((text or '').lower()) if word not in STOP_WORDS]
+
+
+def price_band(price, sale_price=None):
+    """Half-octave band of the effective price, so 40 and 50 match but 40 and 120 don't"""
+    effective = sale_price if sale_price is not None and sale_price < price else price
+    return int(math.log2(max(float(effective), 1.0)) * 2)
+
+
+def _load_features():
+    """{product_id: (structural features, word counts)} for active products"""
+    attributes = defaultdict(list)
+    for product_id, value_id in Product.attributes.through.objects.filter(
+        product__is_active=True
+    ).values_list('product_id', 'productattributevalue_id'):
+        attributes[product_id].append(value_id)
+
+    features = {}
+    for row in Product.objects.filter(is_active=True).order_by().values_list(
+        'id', 'name', 'description', 'meta_keywords', 'category_id', 'category__parent_id',
+        'brand_id', 'price', 'sale_price'
+    ):
+        product_id, name, description, keywords, category_id, parent_id, brand_id, price, sale_price = row
+        structural = {f'category:{category_id}': FEATURE_WEIGHTS['category']}
+        if parent_id:
+            structural[f'parent:{parent_id}'] = FEATURE_WEIGHTS['parent']
+        if brand_id:
+            structural[f'brand:{brand_id}'] = FEATURE_WEIGHTS['brand']
+        for value_id in attributes.get(product_id, ()):
+            structural[f'attribute:{value_id}'] = FEATURE_WEIGHTS['attribute']
+        structural[f'price:{price_band(price, sale_price)}'] = FEATURE_WEIGHTS['price']
+
+        # Words in the name count double
+        words = Counter(tokenize(name) * 2 + tokenize(description) + tokenize(keywords))
+        features[product_id] = (structural, words)
+    return features
+
+
+def fingerprint(structural, words):
+    raw = repr((sorted(structural.items()), sorted(words.items())))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def build_vectors(features):
+    """Normalized sparse vectors {product_id: {feature: weight}}"""
+    total = len(features)
+    document_frequency = Counter()
+    for _, words in features.values():
+        document_frequency.update(words.keys())
+    max_df = MAX_DOCUMENT_FREQUENCY * total if total >= MIN_PRODUCTS_FOR_MAX_DF else total
+
+    vectors = {}
+    for product_id, (structural, words) in features.items():
+        text = {
+            f'text:{word}': (1 + math.log(count)) * (math.log((1 + total) / (1 + document_frequency[word])) + 1)
+            for word, count in words.items() if document_frequency[word] <= max_df
+        }
+        text_norm = math.sqrt(sum(weight * weight for weight in text.values()))
+        vector = dict(structural)
+        for feature, weight in text.items():
+            vector[feature] = FEATURE_WEIGHTS['text'] * weight / text_norm
+
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors[product_id] = {feature: weight / norm for feature, weight in vector.items()}
+    return vectors
+
+
+def build_index(vectors):
+    """Inverted index {feature: [(product_id, weight), ...]}"""
+    index = defaultdict(list)
+    for product_id, vector in vectors.items():
+        for feature, weight in vector.items():
+            index[feature].append((product_id, weight))
+    return index
+
+
+def most_similar(product_id, vectors, index, k):
+    """[(score, other_id), ...] of the k products most similar to product_id"""
+    scores = defaultdict(float)
+    for feature, weight in vectors[product_id].items():
+        for other_id, other_weight in index[feature]:
+            scores[other_id] += weight * other_weight
+    scores.pop(product_id, None)
+    return heapq.nlargest(k, ((score, other_id) for other_id, score in scores.items()))
+
+
+def _save(similar, fingerprints):
+    """Replace the SimilarProduct rows of the products in `similar`"""
+    product_ids = sorted(similar)
+    for start in range(0, len(product_ids), WRITE_CHUNK_SIZE):
+        chunk = product_ids[start:start + WRITE_CHUNK_SIZE]
+        with transaction.atomic():
+            SimilarProduct.objects.filter(product_id__in=chunk).delete()
+            SimilarProduct.objects.bulk_create([
+                SimilarProduct(product_id=product_id, similar_id=other_id, score=score)
+                for product_id in chunk for score, other_id in similar[product_id]
+            ], batch_size=1000)
+            ProductSimilarityState.objects.bulk_create(
+                [
+                    ProductSimilarityState(product_id=product_id, fingerprint=fingerprints[product_id])
+                    for product_id in chunk
+                ],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['fingerprint', 'updated_at']
+            )
+
+
+def build_similar_products(rebuild=False):
+    """
+    Recompute similar products for active products whose features changed
+    since the last run, or for every active product with rebuild=True.
+    Returns the number of products whose lists were recomputed.
+    """
+    features = _load_features()
+    fingerprints = {
+        product_id: fingerprint(structural, words) for product_id, (structural, words) in features.items()
+    }
+    if rebuild:
+        changed = set(features)
+        SimilarProduct.objects.filter(product__is_active=False).delete()
+    else:
+        stored = dict(ProductSimilarityState.objects.values_list('product_id', 'fingerprint'))
+        changed = {product_id for product_id, value in fingerprints.items() if stored.get(product_id) != value}
+    if not changed:
+        return 0
+
+    vectors = build_vectors(features)
+    index = build_index(vectors)
+    k = top_k()
+
+    similar = {product_id: most_similar(product_id, vectors, index, k) for product_id in changed}
+
+    if not rebuild:
+        # Lists that contained a changed product, or that it now belongs in, are stale too
+        stale = set(SimilarProduct.objects.filter(
+            similar_id__in=changed
+        ).values_list('product_id', flat=True))
+        current = {
+            row['product_id']: (row['total'], row['lowest']) for row in SimilarProduct.objects.order_by().values(
+                'product_id'
+            ).annotate(total=Count('id'), lowest=Min('score'))
+        }
+        for scored in similar.values():
+            for score, other_id in scored:
+                total, lowest = current.get(other_id, (0, 0))
+                if total < k or score > lowest:
+                    stale.add(other_id)
+        for product_id in (stale & set(features)) - changed:
+            similar[product_id] = most_similar(product_id, vectors, index, k)
+
+    _save(similar, fingerprints)
+    return len(similar)
+
+
+def similar_product_ids(product_id, limit):
+    """Ids of the active products most similar to product_id, best first"""
+    return list(SimilarProduct.objects.filter(
+        product_id=product_id, similar__is_active=True
+    ).order_by('-score').values_list('similar_id', flat=True)[:limit])
@@ -0,0 +1,39 @@
+from django.core.management import call_command
+from jobs.registry import task
+from .copurchase import build_co_purchases as run_co_purchase_build
+from .counters import recount_product_counts as run_product_recount
+from .sales import rollup_sales as run_sales_rollup
+from .similarity import build_similar_products as run_similarity_build
+
+
+@task('products.update_rating_stats')
+def update_rating_stats(recalculate_all=False):
+    call_command('update_rating_stats', recalculate_all=recalculate_all)
+
+
+@task('products.sync_featured_products')
+def sync_featured_products():
+    call_command('sync_featured_products')
+
+
+@task('products.rollup_sales')
+def rollup_sales():
+    """Fold new order items into ProductSales; returns the number processed"""
+    return run_sales_rollup()
+
+
+@task('products.build_co_purchases')
+def build_co_purchases():
+    """Fold new orders into the co-purchase counts; returns the number processed"""
+    return run_co_purchase_build()
+
+
+@task('products.build_similar_products')
+def build_similar_products(rebuild=False):
+    """Recompute similar products whose features changed; returns the number recomputed"""
+    return run_similarity_build(rebuild=rebuild)
+
+
+@task('products.recount_product_counts')
+def recount_product_counts():
+    run_product_recount()
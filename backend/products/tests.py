@@ -1,12 +1,28 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from products.models import Product, Category, Brand
+from products.models import (
+    Product, Category, Brand, InventoryLog, Review, ProductRating, ProductSales, ProductVariant,
+    CoPurchaseCount, ProductNeighbor, ProductAttribute, ProductAttributeValue, CategoryClosure
+)
+from products.sales import rollup_sales, rebuild_sales_rollup
+from products.sampling import sample, _probe_ids
+from products.copurchase import build_co_purchases, rebuild_co_purchases, personalized_product_ids
+from products.similarity import build_similar_products, similar_product_ids
+from products.catalog_stats import get_catalog_stats
+from products.category_tree import rebuild_closure, subtree_ids
+from products.counters import recount_product_counts
+from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 import json
+from io import StringIO
+from django.core.management import call_command
 from decimal import Decimal
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -288,3 +304,684 @@ class CategoryAPITestCase(APITestCase):
         
         # Verify category was created
         self.assertTrue(Category.objects.filter(slug='new-test-category').exists())
+
+
+class BulkStockAdjustmentTestCase(APITestCase):
+    """Test cases for the bulk stock adjustment endpoint"""
+    
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            phone_number='+9647700000001',
+            password='adminpass123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.category = Category.objects.create(name='Bulk Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Bulk Product {i}',
+                description='Bulk stock test product',
+                price=Decimal('10.00'),
+                category=self.category,
+                sku=f'BULK{i:03d}',
+                stock=5
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin_user)
+        self.url = reverse('product-bulk-update-stock')
+    
+    def test_bulk_adjustments_applied_with_per_line_results(self):
+        """Valid lines are applied and invalid lines are reported"""
+        data = {'adjustments': [
+            {'product_id': self.products[0].id, 'quantity': 10, 'adjustment_type': 'stock_in'},
+            {'product_id': self.products[0].id, 'quantity': 12, 'adjustment_type': 'stock_out'},
+            {'product_id': self.products[1].id, 'quantity': 6, 'adjustment_type': 'stock_out'},
+            {'product_id': 999999, 'quantity': 1, 'adjustment_type': 'stock_in'},
+            {'product_id': self.products[2].id, 'quantity': 1, 'adjustment_type': 'bogus'},
+        ]}
+        
+        response = self.client.post(self.url, data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 2)
+        self.assertEqual(response.data['rejected'], 3)
+        self.assertEqual(
+            [line['success'] for line in response.data['results']],
+            [True, True, False, False, False]
+        )
+        self.products[0].refresh_from_db()
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 3)
+        self.assertEqual(self.products[1].stock, 5)
+        self.assertEqual(InventoryLog.objects.count(), 2)
+    
+    def test_all_or_nothing_rolls_back_batch(self):
+        """With all_or_nothing a single invalid line prevents any change"""
+        data = {
+            'all_or_nothing': True,
+            'adjustments': [
+                {'product_id': self.products[0].id, 'quantity': 10, 'adjustment_type': 'stock_in'},
+                {'product_id': self.products[1].id, 'quantity': 50, 'adjustment_type': 'stock_out'},
+            ]
+        }
+        
+        response = self.client.post(self.url, data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 5)
+        self.assertFalse(InventoryLog.objects.exists())
+
+
+class IncrementalRatingStatsTestCase(TestCase):
+    """Test cases for incremental rating aggregate maintenance"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name='Rating Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Rated Product {i}',
+                description='Rating test product',
+                price=Decimal('10.00'),
+                category=self.category,
+                sku=f'RATE{i:03d}'
+            )
+            for i in range(2)
+        ]
+        self.users = [
+            User.objects.create_user(
+                phone_number=f'+96477000001{i:02d}',
+                password='userpass123',
+                first_name='Reviewer',
+                last_name=str(i)
+            )
+            for i in range(3)
+        ]
+    
+    def assertMatchesRecompute(self, product):
+        stats = ProductRating.objects.get(product=product)
+        incremental = (
+            stats.total_reviews, stats.rating_sum, stats.average_rating, stats.rating_distribution
+        )
+        incremental_score = stats.ranking_score
+        stats.update_stats()
+        stats.refresh_from_db()
+        self.assertEqual(incremental, (
+            stats.total_reviews, stats.rating_sum, stats.average_rating, stats.rating_distribution
+        ))
+        self.assertAlmostEqual(incremental_score, stats.ranking_score)
+        return stats
+    
+    def test_create_update_and_delete_apply_deltas(self):
+        product = self.products[0]
+        first = Review.objects.create(product=product, user=self.users[0], rating=5)
+        Review.objects.create(product=product, user=self.users[1], rating=4)
+        hidden = Review.objects.create(product=product, user=self.users[2], rating=1, is_approved=False)
+        
+        stats = self.assertMatchesRecompute(product)
+        self.assertEqual(stats.total_reviews, 2)
+        self.assertEqual(stats.average_rating, Decimal('4.50'))
+        
+        # Changing a rating is a single UPDATE on the aggregates
+        review = Review.objects.get(pk=first.pk)
+        review.rating = 2
+        with self.assertNumQueries(2):
+            review.save()
+        stats = self.assertMatchesRecompute(product)
+        self.assertEqual(stats.rating_distribution, [0, 1, 0, 1, 0])
+        
+        # Approval toggles and deletes
+        hidden.is_approved = True
+        hidden.save()
+        Review.objects.get(pk=first.pk).delete()
+        stats = self.assertMatchesRecompute(product)
+        self.assertEqual(stats.total_reviews, 2)
+        self.assertEqual(stats.average_rating, Decimal('2.50'))
+    
+    def test_moving_review_between_products(self):
+        review = Review.objects.create(product=self.products[0], user=self.users[0], rating=3)
+        Review.objects.create(product=self.products[1], user=self.users[1], rating=5)
+        
+        review = Review.objects.get(pk=review.pk)
+        review.product = self.products[1]
+        review.save()
+        
+        self.assertEqual(self.assertMatchesRecompute(self.products[0]).total_reviews, 0)
+        self.assertEqual(self.assertMatchesRecompute(self.products[1]).average_rating, Decimal('4.00'))
+    
+    def test_rebuild_command_repairs_stats_in_bulk(self):
+        for product in self.products:
+            for i, user in enumerate(self.users):
+                Review.objects.create(product=product, user=user, rating=i + 3)
+        # Bypass signals so the stored aggregates drift
+        Review.objects.filter(product=self.products[0]).update(rating=1)
+        Review.objects.filter(product=self.products[1]).delete()
+        ProductRating.objects.filter(product=self.products[1]).update(total_reviews=99, rating_sum=99)
+        
+        # Id lookup + sample listing, then aggregate and upsert (plus savepoint) per chunk
+        with self.assertNumQueries(2 + 2 * 4):
+            call_command('update_rating_stats', recalculate_all=True, chunk_size=1, stdout=StringIO())
+        
+        first = self.assertMatchesRecompute(self.products[0])
+        self.assertEqual(first.rating_distribution, [3, 0, 0, 0, 0])
+        self.assertEqual(first.average_rating, Decimal('1.00'))
+        self.assertEqual(self.assertMatchesRecompute(self.products[1]).total_reviews, 0)
+    
+    def test_ranking_score_orders_top_rated(self):
+        """A single 5-star review ranks below several 4-5 star reviews"""
+        Review.objects.create(product=self.products[0], user=self.users[0], rating=5)
+        for user, rating in zip(self.users, [5, 5, 4]):
+            Review.objects.create(product=self.products[1], user=user, rating=rating)
+        
+        first = self.assertMatchesRecompute(self.products[0])
+        second = self.assertMatchesRecompute(self.products[1])
+        self.assertGreater(first.average_rating, second.average_rating)
+        self.assertGreater(second.ranking_score, first.ranking_score)
+        
+        client = APIClient()
+        response = client.get(reverse('product-top-rated'), {'limit': 5})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.products[1].id, self.products[0].id])
+        
+        response = client.get(reverse('product-list'), {'ordering': '-ranking'})
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([p['id'] for p in results], [self.products[1].id, self.products[0].id])
+
+
+class OrderHistoryMixin:
+    """Creates a customer and products, and places backdated orders"""
+    
+    def setUp(self):
+        from orders.models import ShippingAddress
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_number='+9647700000200',
+            password='userpass123',
+            first_name='Sales',
+            last_name='Customer'
+        )
+        self.address = ShippingAddress.objects.create(
+            user=self.user,
+            full_name='Sales Customer',
+            phone_number='+9647700000200',
+            address_line1='Street 1',
+            city='Baghdad',
+            state='Baghdad',
+            country='Iraq',
+            postal_code='10001'
+        )
+        self.category = Category.objects.create(name='Sales Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Sold Product {i}',
+                description='Sales test product',
+                price=Decimal('10.00'),
+                category=self.category,
+                sku=f'SOLD{i:03d}',
+                stock=10
+            )
+            for i in range(3)
+        ]
+        self.variant = ProductVariant.objects.create(product=self.products[2], name='Large', sku='SOLD002-L')
+    
+    def _order(self, lines, days_ago=0):
+        from orders.models import Order, OrderItem
+        order = Order.objects.create(
+            user=self.user,
+            shipping_address=self.address,
+            subtotal=Decimal('10.00'),
+            total_amount=Decimal('10.00')
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago, minutes=5))
+        for target, quantity in lines:
+            kind = 'variant' if isinstance(target, ProductVariant) else 'product'
+            OrderItem.objects.create(order=order, quantity=quantity, unit_price=Decimal('10.00'), **{kind: target})
+        return order
+
+
+class SalesRollupTestCase(OrderHistoryMixin, TestCase):
+    """Test cases for the ProductSales rollup behind trending and bestselling"""
+    
+    def test_rollup_is_incremental(self):
+        self._order([(self.products[0], 2), (self.variant, 1)])
+        self._order([(self.products[0], 1)])
+        self.assertEqual(rollup_sales(), 3)
+        # Nothing new to fold in
+        self.assertEqual(rollup_sales(), 0)
+        
+        self._order([(self.products[0], 4)])
+        self.assertEqual(rollup_sales(), 1)
+        
+        first = ProductSales.objects.get(product=self.products[0], granularity='day')
+        self.assertEqual(first.units, 7)
+        self.assertEqual(first.revenue, Decimal('70.00'))
+        # Variant sales count towards the parent product
+        self.assertEqual(ProductSales.objects.get(product=self.products[2]).units, 1)
+        
+        totals = list(ProductSales.objects.order_by('product_id').values_list('product_id', 'units'))
+        self.assertEqual(rebuild_sales_rollup(), 4)
+        self.assertEqual(list(ProductSales.objects.order_by('product_id').values_list('product_id', 'units')), totals)
+    
+    def test_late_commits_are_picked_up(self):
+        from orders.models import OrderItem
+        order = self._order([(self.products[0], 1), (self.products[1], 1)])
+        # A checkout that got the lower id but commits after the next rollup
+        late = OrderItem.objects.get(order=order, product=self.products[0])
+        late_fields = {
+            'id': late.id, 'order': order, 'product': self.products[0], 'quantity': 3, 'unit_price': late.unit_price
+        }
+        late.delete()
+        self.assertEqual(rollup_sales(), 1)
+        self.assertFalse(ProductSales.objects.filter(product=self.products[0]).exists())
+        
+        OrderItem.objects.create(**late_fields)
+        rollup_sales()
+        self.assertEqual(ProductSales.objects.get(product=self.products[0]).units, 3)
+        
+        # Items added to orders older than the window are folded in through the cursor
+        old_order = self._order([(self.products[1], 2)], days_ago=3)
+        self.assertEqual(rollup_sales(), 1)
+        self.assertEqual(
+            sorted(ProductSales.objects.filter(product=self.products[1]).values_list('units', flat=True)), [1, 2]
+        )
+        OrderItem.objects.create(order=old_order, product=self.products[2], quantity=1, unit_price=Decimal('10.00'))
+        self.assertEqual(rollup_sales(), 1)
+        # and only once
+        self.assertEqual(rollup_sales(), 0)
+        self.assertEqual(ProductSales.objects.get(product=self.products[2]).units, 1)
+    
+    def test_trending_weights_recent_sales(self):
+        # Product 0 sold more units, but six days ago; product 1 sells today
+        self._order([(self.products[0], 5)], days_ago=6)
+        self._order([(self.products[1], 3)], days_ago=0)
+        # Outside the trending window
+        self._order([(self.products[2], 50)], days_ago=20)
+        rollup_sales()
+        
+        response = APIClient().get(reverse('product-trending'), {'limit': 2})
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([p['id'] for p in results], [self.products[1].id, self.products[0].id])
+        
+        response = APIClient().get(reverse('product-bestselling'), {'limit': 1, 'days': 30, 'offset': 7})
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([p['id'] for p in results], [self.products[2].id])
+    
+    def test_long_trending_windows_keep_the_decay_bounded(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from products.sales import top_selling_product_ids, trending_half_life
+        self._order([(self.products[0], 2)], days_ago=1)
+        rollup_sales()
+        
+        response = APIClient().get(reverse('product-trending'), {'days': 100000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        now = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            ids = top_selling_product_ids(now - timedelta(days=3000), now, 5, half_life=trending_half_life())
+        self.assertEqual(ids, [self.products[0].id])
+        # The CASE appears in both the SELECT and the HAVING clause
+        self.assertLessEqual(queries.captured_queries[-1]['sql'].count('WHEN'), 2 * 30)
+
+
+class ProductSamplingTestCase(TestCase):
+    """Test cases for random product sampling without ORDER BY RANDOM()"""
+    
+    def setUp(self):
+        cache.clear()
+        self.categories = [Category.objects.create(name=f'Sample Category {i}') for i in range(2)]
+        self.products = [
+            Product.objects.create(
+                name=f'Sampled Product {i}',
+                description='Sampling test product',
+                price=Decimal('10.00'),
+                category=self.categories[i % 2],
+                sku=f'SAMPLE{i:03d}'
+            )
+            for i in range(20)
+        ]
+    
+    def test_sample_respects_queryset_and_exclusions(self):
+        queryset = Product.objects.filter(category=self.categories[0])
+        excluded = [self.products[0].id, self.products[2].id]
+        picked = sample(queryset, 5, pool_key='test:category', exclude_ids=excluded)
+        self.assertEqual(len(picked), 5)
+        self.assertEqual(len({p.id for p in picked}), 5)
+        for product in picked:
+            self.assertEqual(product.category_id, self.categories[0].id)
+            self.assertNotIn(product.id, excluded)
+        
+        # Asking for more than exist returns everything available
+        self.assertEqual(len(sample(queryset, 50, pool_key='test:category')), 10)
+    
+    def test_seeded_sample_is_repeatable(self):
+        queryset = Product.objects.all()
+        first = [p.id for p in sample(queryset, 5, pool_key='test:all', seed='1:100')]
+        self.assertEqual([p.id for p in sample(queryset, 5, pool_key='test:all', seed='1:100')], first)
+    
+    def test_stale_pool_never_returns_excluded_rows(self):
+        queryset = Product.objects.filter(is_active=True)
+        sample(queryset, 1, pool_key='test:active')
+        # The cached pool still holds these ids
+        Product.objects.filter(id__in=[p.id for p in self.products[:15]]).update(is_active=False)
+        picked = sample(queryset, 5, pool_key='test:active')
+        self.assertTrue(picked)
+        self.assertTrue(all(p.is_active for p in picked))
+    
+    def test_id_probing_stays_within_queryset(self):
+        import random
+        queryset = Product.objects.filter(category=self.categories[1])
+        ids = _probe_ids(queryset, 5, random.Random(1), exclude={self.products[1].id})
+        allowed = {p.id for p in self.products[1::2]} - {self.products[1].id}
+        self.assertTrue(set(ids) <= allowed)
+        self.assertEqual(len(ids), len(set(ids)))
+    
+    def test_recommended_does_not_sort_randomly(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(reverse('product-recommended'), {'limit': 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(len({p['id'] for p in response.data}), 6)
+        self.assertFalse(any('RANDOM()' in q['sql'].upper() for q in queries.captured_queries))
+
+
+class CoPurchaseTestCase(OrderHistoryMixin, TestCase):
+    """Test cases for "also bought" co-purchase neighbors"""
+    
+    def test_build_counts_pairs_incrementally(self):
+        self._order([(self.products[0], 1), (self.products[1], 2)])
+        self._order([(self.products[0], 1), (self.variant, 1)])
+        self.assertEqual(build_co_purchases(), 2)
+        self.assertEqual(build_co_purchases(), 0)
+        self._order([(self.products[0], 1), (self.products[1], 1)])
+        self.assertEqual(build_co_purchases(), 1)
+        
+        counts = {
+            (row.product_id, row.other_id): row.orders for row in CoPurchaseCount.objects.all()
+        }
+        first, second, third = [p.id for p in self.products]
+        self.assertEqual(counts[(first, first)], 3)
+        self.assertEqual(counts[(first, second)], 2)
+        self.assertEqual(counts[(second, first)], 2)
+        # Variant purchases count towards the parent product
+        self.assertEqual(counts[(first, third)], 1)
+        
+        neighbors = list(ProductNeighbor.objects.filter(product_id=first).values_list('neighbor_id', 'score'))
+        self.assertEqual([n for n, _ in neighbors], [second, third])
+        self.assertAlmostEqual(neighbors[0][1], 2 / (3 * 2) ** 0.5)
+        
+        snapshot = sorted(counts.items())
+        rebuild_co_purchases()
+        self.assertEqual(sorted(
+            ((row.product_id, row.other_id), row.orders) for row in CoPurchaseCount.objects.all()
+        ), snapshot)
+    
+    def test_neighbors_of_touched_products_are_rescored(self):
+        from orders.models import Order
+        first, second, third = [p.id for p in self.products]
+        self._order([(self.products[0], 1), (self.products[1], 1)])
+        build_co_purchases()
+        self.assertAlmostEqual(ProductNeighbor.objects.get(product_id=second).score, 1.0)
+        
+        # Only the first product is in the new order, but it is the second's neighbor
+        self._order([(self.products[0], 1)])
+        cancelled = self._order([(self.products[0], 1), (self.products[2], 1)])
+        Order.objects.filter(pk=cancelled.pk).update(status='cancelled')
+        self.assertEqual(build_co_purchases(), 2)
+        
+        self.assertAlmostEqual(ProductNeighbor.objects.get(product_id=second).score, 1 / 2 ** 0.5)
+        self.assertEqual(CoPurchaseCount.objects.get(product_id=first, other_id=first).orders, 2)
+        self.assertFalse(CoPurchaseCount.objects.filter(other_id=third).exists())
+    
+    def test_also_bought_and_personalized_recommendations(self):
+        self._order([(self.products[0], 1), (self.products[1], 1)])
+        self._order([(self.products[0], 1), (self.products[1], 1)])
+        self._order([(self.products[0], 1), (self.products[2], 1)])
+        build_co_purchases()
+        
+        client = APIClient()
+        response = client.get(reverse('product-also-bought', args=[self.products[0].id]), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data], [self.products[1].id, self.products[2].id])
+        
+        shopper = User.objects.create_user(
+            phone_number='+9647700000201',
+            password='userpass123',
+            first_name='Repeat',
+            last_name='Shopper'
+        )
+        self.assertEqual(personalized_product_ids(shopper, 5), [])
+        self.user, shopper = shopper, self.user
+        self._order([(self.products[1], 1)])
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('product-recommended'), {'limit': 1})
+        self.assertEqual([p['id'] for p in response.data], [self.products[0].id])
+
+
+class SimilarProductsTestCase(TestCase):
+    """Test cases for the content-based similar products index"""
+    
+    def setUp(self):
+        cache.clear()
+        skincare = Category.objects.create(name='Skincare')
+        makeup = Category.objects.create(name='Makeup')
+        brand = Brand.objects.create(name='Glow')
+        oily = ProductAttributeValue.objects.create(
+            attribute=ProductAttribute.objects.create(name='Skin type'), value='Oily'
+        )
+        
+        def make(name, description, category, price, sku, brand=None):
+            return Product.objects.create(
+                name=name, description=description, price=Decimal(price),
+                category=category, brand=brand, sku=sku
+            )
+        
+        self.serum = make('Vitamin C Serum', 'Brightening vitamin serum for oily skin', skincare, '40.00', 'SIM001', brand)
+        self.serum.attributes.add(oily)
+        self.twin = make('Vitamin C Night Serum', 'Brightening night serum', skincare, '45.00', 'SIM002', brand)
+        self.twin.attributes.add(oily)
+        self.cleanser = make('Gentle Cleanser', 'Foaming face wash', skincare, '15.00', 'SIM003')
+        self.lipstick = make('Matte Lipstick', 'Long lasting red lipstick', makeup, '120.00', 'SIM004')
+    
+    def test_similar_products_rank_by_shared_features(self):
+        self.assertEqual(build_similar_products(), 4)
+        self.assertEqual(similar_product_ids(self.serum.id, 3)[:2], [self.twin.id, self.cleanser.id])
+        
+        response = APIClient().get(reverse('product-similar', args=[self.serum.id]), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data], [self.twin.id, self.cleanser.id])
+    
+    @override_settings(PRODUCT_SIMILAR_TOP_K=1)
+    def test_only_changed_products_are_recomputed(self):
+        build_similar_products()
+        self.assertEqual(build_similar_products(), 0)
+        
+        self.lipstick.description = 'Long lasting matte lipstick'
+        self.lipstick.save()
+        # The lipstick, and lists it appears in or now enters; not the serums
+        self.assertLess(build_similar_products(), 3)
+        self.assertEqual(build_similar_products(), 0)
+        
+        self.assertEqual(build_similar_products(rebuild=True), 4)
+
+
+class CatalogStatsTestCase(TestCase):
+    """Test cases for the catalog statistics snapshot"""
+    
+    def setUp(self):
+        cache.clear()
+        self.categories = [Category.objects.create(name=f'Stats Category {i}') for i in range(3)]
+        self.brand = Brand.objects.create(name='Stats Brand')
+        Brand.objects.create(name='Empty Brand')
+        for i in range(6):
+            Product.objects.create(
+                name=f'Stats Product {i}',
+                description='Stats test product',
+                price=Decimal('10.00') * (i + 1),
+                sale_price=Decimal('5.00') if i < 2 else None,
+                category=self.categories[i % 2],
+                brand=self.brand if i % 3 == 0 else None,
+                is_featured=i == 5,
+                sku=f'STAT{i:03d}'
+            )
+    
+    def test_stats_snapshot_is_one_read_and_refreshes_on_change(self):
+        with self.assertNumQueries(3):
+            get_catalog_stats()
+        with self.assertNumQueries(0):
+            get_catalog_stats()
+        
+        url = reverse('product-stats')
+        client = APIClient()
+        response = client.get(url)
+        self.assertEqual(response.data['total_products'], 6)
+        self.assertEqual(response.data['featured_count'], 1)
+        self.assertEqual(response.data['on_sale_count'], 2)
+        self.assertEqual(response.data['price_stats']['min_price'], Decimal('10.00'))
+        self.assertEqual(response.data['price_stats']['max_price'], Decimal('60.00'))
+        self.assertEqual(response.data['categories'], {'Stats Category 0': 3, 'Stats Category 1': 3})
+        self.assertEqual(response.data['brands'], {'Stats Brand': 2})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Late Product', description='Stats test product', price=Decimal('70.00'),
+                category=self.categories[2], sku='STAT099'
+            )
+        response = client.get(url)
+        self.assertEqual(response.data['total_products'], 7)
+        self.assertEqual(response.data['categories']['Stats Category 2'], 1)
+
+
+class CategoryTreeTestCase(TestCase):
+    """Test cases for the category closure table"""
+    
+    def setUp(self):
+        cache.clear()
+        self.root = Category.objects.create(name='Beauty')
+        self.child = Category.objects.create(name='Skin', parent=self.root)
+        self.grandchild = Category.objects.create(name='Serums', parent=self.child)
+        self.other = Category.objects.create(name='Hair')
+        self.product = Product.objects.create(
+            name='Deep Product', description='Tree test product', price=Decimal('10.00'),
+            category=self.grandchild, sku='TREE001'
+        )
+    
+    def ancestors(self, category):
+        return set(CategoryClosure.objects.filter(descendant=category).values_list('ancestor_id', 'depth'))
+    
+    def test_closure_follows_creates_moves_and_deletes(self):
+        self.assertEqual(self.ancestors(self.grandchild), {
+            (self.grandchild.id, 0), (self.child.id, 1), (self.root.id, 2)
+        })
+        
+        # Moving a category carries its subtree along
+        child = Category.objects.get(pk=self.child.pk)
+        child.parent = self.other
+        child.save()
+        self.assertEqual(self.ancestors(self.grandchild), {
+            (self.grandchild.id, 0), (self.child.id, 1), (self.other.id, 2)
+        })
+        self.assertEqual(subtree_ids(self.root), [self.root.id])
+        
+        # Deleting the middle category makes its child top-level
+        child.delete()
+        self.assertEqual(self.ancestors(self.grandchild), {(self.grandchild.id, 0)})
+        
+        snapshot = set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        rebuild_closure()
+        self.assertEqual(set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')), snapshot)
+    
+    def test_cannot_move_category_under_its_subtree(self):
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+    
+    def test_tree_and_subtree_products(self):
+        client = APIClient()
+        response = client.get(reverse('category-tree'))
+        self.assertEqual(response.data, [
+            {'id': self.root.id, 'name': 'Beauty', 'product_count': 1, 'children': [
+                {'id': self.child.id, 'name': 'Skin', 'product_count': 1, 'children': [
+                    {'id': self.grandchild.id, 'name': 'Serums', 'product_count': 1, 'children': []}
+                ]}
+            ]},
+            {'id': self.other.id, 'name': 'Hair', 'product_count': 0, 'children': []},
+        ])
+        
+        url = reverse('category-products', args=[self.root.id])
+        response = client.get(url, {'include_subcategories': 'true'})
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([p['id'] for p in results], [self.product.id])
+        response = client.get(url)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(results, [])
+
+    
+    def counts(self):
+        return {
+            category.name: (category.product_count, category.subtree_product_count)
+            for category in Category.objects.all()
+        }
+    
+    def test_counters_follow_product_and_category_changes(self):
+        brand = Brand.objects.create(name='Tree Brand')
+        self.assertEqual(self.counts(), {
+            'Beauty': (0, 1), 'Skin': (0, 1), 'Serums': (1, 1), 'Hair': (0, 0)
+        })
+        
+        product = Product.objects.get(pk=self.product.pk)
+        product.category = self.child
+        product.brand = brand
+        product.save()
+        self.assertEqual(self.counts()['Skin'], (1, 1))
+        self.assertEqual(self.counts()['Serums'], (0, 0))
+        self.assertEqual(Brand.objects.get(pk=brand.pk).product_count, 1)
+        
+        product.is_active = False
+        product.save()
+        self.assertEqual(self.counts()['Beauty'], (0, 0))
+        self.assertEqual(Brand.objects.get(pk=brand.pk).product_count, 0)
+        product.is_active = True
+        product.save()
+        
+        # Moving a category moves its products' counts between ancestors
+        child = Category.objects.get(pk=self.child.pk)
+        child.parent = self.other
+        child.save()
+        self.assertEqual(self.counts()['Beauty'], (0, 0))
+        self.assertEqual(self.counts()['Hair'], (0, 1))
+        
+        # Deleting a category deletes its products
+        Category.objects.get(pk=self.child.pk).delete()
+        self.assertEqual(self.counts(), {'Beauty': (0, 0), 'Serums': (0, 0), 'Hair': (0, 0)})
+        self.assertEqual(Brand.objects.get(pk=brand.pk).product_count, 0)
+    
+    def test_saving_a_stale_instance_keeps_counters(self):
+        brand = Brand.objects.create(name='Stale Brand')
+        stale_category = Category.objects.get(pk=self.grandchild.pk)
+        stale_brand = Brand.objects.get(pk=brand.pk)
+        Product.objects.create(
+            name='Second Product', description='Tree test product', price=Decimal('5.00'),
+            category=self.grandchild, brand=brand, sku='TREE002'
+        )
+        stale_category.description = 'Renamed'
+        stale_category.save()
+        stale_brand.description = 'Renamed'
+        stale_brand.save()
+        self.assertEqual(self.counts()['Serums'], (2, 2))
+        self.assertEqual(Category.objects.get(pk=self.grandchild.pk).description, 'Renamed')
+        self.assertEqual(Brand.objects.get(pk=brand.pk).product_count, 1)
+    
+    def test_recount_repairs_counters(self):
+        Product.objects.update(is_active=False)
+        Category.objects.update(product_count=5, subtree_product_count=5)
+        recount_product_counts()
+        self.assertEqual(set(self.counts().values()), {(0, 0)})
+        
+        Product.objects.update(is_active=True)
+        recount_product_counts()
+        self.assertEqual(self.counts()['Beauty'], (0, 1))
+        self.assertEqual(self.counts()['Serums'], (1, 1))
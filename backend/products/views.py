@@ -1,16 +1,16 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, F, Count, Avg, Sum, Min, Max, Case, When, Value, IntegerField
+from django.db.models import Q, F, Case, When, Value, IntegerField
 from rest_framework import viewsets, permissions, filters, status, mixins
 from rest_framework.decorators import action, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 from django.conf import settings
+from django.utils import timezone
 import datetime
 from datetime import timedelta
 
@@ -26,7 +26,14 @@ from .serializers import (
     ProductRatingSerializer
 )
 from .permissions import IsAdminOrReadOnly
-from .filters import ProductFilter
+from .filters import ProductFilter, ProductOrderingFilter, product_ordering
+from .inventory import apply_stock_adjustments
+from .sales import MAX_WINDOW_DAYS, top_selling_product_ids, trending_half_life
+from .sampling import sample, sampling_seed
+from .copurchase import also_bought_ids, personalized_product_ids
+from .similarity import similar_product_ids
+from .catalog_stats import get_catalog_stats
+from .category_tree import build_tree, in_category_subtree
 
 # Custom throttle classes
 class ProductRateThrottle(UserRateThrottle):
@@ -54,15 +61,14 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def products(self, request, pk=None):
         """Get all products in this category"""
         category = self.get_object()
-        products = Product.objects.filter(category=category, is_active=True)
+        products = Product.objects.filter(is_active=True)
         
-        # Include products from subcategories if requested
+        # Include products from subcategories at any depth if requested
         include_subcategories = request.query_params.get('include_subcategories', 'false').lower() == 'true'
         if include_subcategories:
-            subcategories = Category.objects.filter(parent=category)
-            for subcategory in subcategories:
-                subcategory_products = Product.objects.filter(category=subcategory, is_active=True)
-                products = products | subcategory_products
+            products = products.filter(in_category_subtree(category))
+        else:
+            products = products.filter(category=category)
         
         # Apply additional filtering
         price_min = request.query_params.get('price_min')
@@ -81,7 +87,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         sort_dir = request.query_params.get('sort_dir', 'desc')
         
         order_field = '-' + sort_by if sort_dir == 'desc' else sort_by
-        products = products.order_by(order_field)
+        products = products.select_related('rating_stats', 'category', 'brand').order_by(product_ordering(order_field))
         
         page = self.paginate_queryset(products)
         if page is not None:
@@ -91,35 +97,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
     
-    @method_decorator(cache_page(60*60*24))  # Cache for 24 hours
+    @method_decorator(cache_page(60*15))  # Cache for 15 minutes (includes product counts)
     @action(detail=False)
     def tree(self, request):
         """
         Get hierarchical category tree
         """
-        top_categories = Category.objects.filter(parent=None, is_active=True)
-        
-        def get_children(category):
-            children = Category.objects.filter(parent=category, is_active=True)
-            return [
-                {
-                    'id': child.id,
-                    'name': child.name,
-                    'children': get_children(child)
-                }
-                for child in children
-            ]
-        
-        result = [
-            {
-                'id': category.id,
-                'name': category.name,
-                'children': get_children(category)
-            }
-            for category in top_categories
-        ]
-        
-        return Response(result)
+        # One query; nested in memory
+        categories = Category.objects.filter(is_active=True).values('id', 'name', 'parent_id', 'subtree_product_count')
+        return Response(build_tree(categories))
 
     @method_decorator(cache_page(60*60*2))  # Cache for 2 hours
     @action(detail=False)
@@ -195,7 +181,7 @@ class BrandViewSet(viewsets.ModelViewSet):
         sort_dir = request.query_params.get('sort_dir', 'desc')
         
         order_field = '-' + sort_by if sort_dir == 'desc' else sort_by
-        products = products.order_by(order_field)
+        products = products.select_related('rating_stats', 'category', 'brand').order_by(product_ordering(order_field))
         
         page = self.paginate_queryset(products)
         if page is not None:
@@ -229,10 +215,10 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description', 'meta_keywords', 'sku']
-    ordering_fields = ['price', 'created_at', 'name', 'rating']
+    ordering_fields = ['price', 'created_at', 'name', 'rating', 'ranking']
     throttle_classes = [ProductRateThrottle]
     
     def get_queryset(self):
@@ -265,7 +251,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         order_field = '-' + sort_by if sort_dir == 'desc' else sort_by
         featured_products = Product.objects.filter(
             is_featured=True, is_active=True
-        ).select_related('rating_stats', 'category', 'brand').order_by(order_field)[:limit]
+        ).select_related('rating_stats', 'category', 'brand').order_by(product_ordering(order_field))[:limit]
         
         page = self.paginate_queryset(featured_products)
         if page is not None:
@@ -387,7 +373,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         sort_dir = request.query_params.get('sort_dir', 'desc')
         
         order_field = '-' + sort_by if sort_dir == 'desc' else sort_by
-        products = products.order_by(order_field)
+        products = products.select_related('rating_stats', 'category', 'brand').order_by(product_ordering(order_field))
         
         page = self.paginate_queryset(products)
         if page is not None:
@@ -396,7 +382,38 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
-    
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Search-as-you-type suggestions: product names and celebrities matching q"""
+        from celebrities.models import Celebrity
+        from celebrities.search import search_celebrity_ids
+
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 5)), 20))
+        except ValueError:
+            limit = 5
+        if not query:
+            return Response({'products': [], 'celebrities': []})
+
+        products = Product.objects.filter(
+            is_active=True, name__icontains=query
+        ).order_by('name').values('id', 'name')[:limit]
+
+        celebrity_ids = search_celebrity_ids(query, limit)
+        celebrities = Celebrity.objects.only('id', 'first_name', 'last_name', 'image').in_bulk(celebrity_ids)
+        celebrity_data = [
+            {
+                'id': celebrity.id,
+                'name': celebrity.full_name,
+                'image': request.build_absolute_uri(celebrity.image.url) if celebrity.image else None
+            }
+            for celebrity in (celebrities[celebrity_id] for celebrity_id in celebrity_ids if celebrity_id in celebrities)
+        ]
+
+        return Response({'products': list(products), 'celebrities': celebrity_data})
+
     @method_decorator(cache_page(60*60*2))  # Cache for 2 hours
     @action(detail=False, methods=['get'])
     def app_essentials(self, request):
@@ -434,52 +451,11 @@ class ProductViewSet(viewsets.ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @method_decorator(cache_page(60*60*24))  # Cache for 24 hours
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get product statistics (total count, price ranges, etc.)"""
-        # Get all active products
-        products = Product.objects.filter(is_active=True)
-        
-        # Get category counts
-        category_counts = {}
-        categories = Category.objects.filter(is_active=True)
-        for category in categories:
-            count = products.filter(category=category).count()
-            if count > 0:
-                category_counts[category.name] = count
-        
-        # Get brand counts
-        brand_counts = {}
-        brands = Brand.objects.filter(is_active=True)
-        for brand in brands:
-            count = products.filter(brand=brand).count()
-            if count > 0:
-                brand_counts[brand.name] = count
-        
-        # Get price statistics
-        price_stats = products.aggregate(
-            min_price=Min('price'),
-            max_price=Max('price'),
-            avg_price=Avg('price')
-        )
-        
-        # Get counts
-        total_products = products.count()
-        featured_count = products.filter(is_featured=True).count()
-        on_sale_count = products.filter(sale_price__isnull=False).filter(sale_price__lt=F('price')).count()
-        
-        # Build response
-        response_data = {
-            'total_products': total_products,
-            'featured_count': featured_count,
-            'on_sale_count': on_sale_count,
-            'price_stats': price_stats,
-            'categories': category_counts,
-            'brands': brand_counts
-        }
-        
-        return Response(response_data)
+        # Snapshot computed in three queries and dropped on catalog changes
+        return Response(get_catalog_stats())
     
     @action(detail=False, methods=['get'])
     def new_arrivals(self, request):
@@ -504,30 +480,19 @@ class ProductViewSet(viewsets.ModelViewSet):
     def bestselling(self, request):
         """
         Get best selling products from recent past period (default: 30 days, offset by 7 days)
-        Uses two-step approach: 1) Get sales data from OrderItem, 2) Get fresh product data from Product
+        Uses two-step approach: 1) Get sales data from the ProductSales rollup, 2) Get fresh product data from Product
         """
-        from orders.models import OrderItem
-        
         limit = int(request.query_params.get('limit', 10))
-        days = int(request.query_params.get('days', 30))  # Period length
+        days = max(1, min(int(request.query_params.get('days', 30)), MAX_WINDOW_DAYS))  # Period length
         offset = int(request.query_params.get('offset', 7))  # Start offset (proven winners from past)
         
         # Calculate date thresholds for offset period
-        end_date = datetime.datetime.now() - timedelta(days=offset)      # 7 days ago
-        start_date = end_date - timedelta(days=days)                     # 37 days ago
-        
-        # STEP 1: Get sales analytics from OrderItem table (historical sales data)
-        bestselling_sales = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lt=end_date,
-            product__isnull=False,  # Only items with products (not variants)
-            product__is_active=True  # Only active products
-        ).values('product_id').annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold')[:limit]
-        
-        # Extract product IDs from sales data
-        bestselling_product_ids = [item['product_id'] for item in bestselling_sales]
+        now = timezone.now()
+        end_date = now - timedelta(days=offset)      # 7 days ago
+        start_date = end_date - timedelta(days=days)  # 37 days ago
+        
+        # STEP 1: Get units sold per product from the precomputed sales rollup
+        bestselling_product_ids = top_selling_product_ids(start_date, end_date, limit)
         
         # STEP 2: Get fresh product details from Product table
         if bestselling_product_ids:
@@ -553,16 +518,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         
         # FALLBACK SYSTEM: Get trending IDs to exclude them from bestselling fallbacks
-        trending_threshold = datetime.datetime.now() - timedelta(days=7)
-        trending_sales = OrderItem.objects.filter(
-            order__created_at__gte=trending_threshold,
-            product__isnull=False,
-            product__is_active=True
-        ).values('product_id').annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold')[:10]
-        
-        trending_ids = set(item['product_id'] for item in trending_sales)
+        trending_ids = set(top_selling_product_ids(now - timedelta(days=7), now, 10, half_life=trending_half_life()))
         
         # If no trending from sales, add newest products to trending exclusion
         if len(trending_ids) < 10:
@@ -604,11 +560,12 @@ class ProductViewSet(viewsets.ModelViewSet):
             still_needed = limit - len(final_results)
             final_excluded_ids = set(p.id for p in final_results) | trending_ids
             
-            last_resort = list(Product.objects.filter(
-                is_active=True
-            ).exclude(
-                id__in=final_excluded_ids
-            ).select_related('category', 'brand').order_by('?')[:still_needed])
+            last_resort = sample(
+                Product.objects.filter(is_active=True).select_related('category', 'brand'),
+                still_needed,
+                pool_key='active',
+                exclude_ids=final_excluded_ids
+            )
             
             final_results.extend(last_resort)
         
@@ -627,27 +584,18 @@ class ProductViewSet(viewsets.ModelViewSet):
     def trending(self, request):
         """
         Get trending products based on recent sales activity (default: last 7 days from now)
-        Uses two-step approach: 1) Get sales data from OrderItem, 2) Get fresh product data from Product
+        Sales are weighted by recency (PRODUCT_TRENDING_HALF_LIFE_HOURS), so a product selling now
+        outranks one that sold the same units at the start of the window.
+        Uses two-step approach: 1) Get sales data from the ProductSales rollup, 2) Get fresh product data from Product
         """
-        from orders.models import OrderItem
-        
         limit = int(request.query_params.get('limit', 10))
-        days = int(request.query_params.get('days', 7))  # Default to 7 days for trending
-        
-        # Calculate date threshold (no offset - current period)
-        threshold_date = datetime.datetime.now() - timedelta(days=days)
+        days = max(1, min(int(request.query_params.get('days', 7)), MAX_WINDOW_DAYS))  # Default to 7 days for trending
         
-        # STEP 1: Get sales analytics from OrderItem table (recent sales data)
-        trending_sales = OrderItem.objects.filter(
-            order__created_at__gte=threshold_date,
-            product__isnull=False,  # Only items with products (not variants)
-            product__is_active=True  # Only active products
-        ).values('product_id').annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold')[:limit]
-        
-        # Extract product IDs from sales data
-        trending_product_ids = [item['product_id'] for item in trending_sales]
+        # STEP 1: Get decayed sales scores from the precomputed sales rollup
+        now = timezone.now()
+        trending_product_ids = top_selling_product_ids(
+            now - timedelta(days=days), now, limit, half_life=trending_half_life()
+        )
         
         # STEP 2: Get fresh product details from Product table
         if trending_product_ids:
@@ -690,53 +638,53 @@ class ProductViewSet(viewsets.ModelViewSet):
         """Update product stock"""
         product = self.get_object()
         
-        try:
-            # Get data from request
-            quantity = int(request.data.get('quantity', 0))
-            adjustment_type = request.data.get('adjustment_type', '')
-            reference = request.data.get('reference', '')
-            
-            if adjustment_type not in ['stock_in', 'stock_out', 'adjustment']:
-                return Response(
-                    {"error": "Invalid adjustment type. Must be 'stock_in', 'stock_out', or 'adjustment'"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            with transaction.atomic():
-                # Update product stock based on adjustment type
-                if adjustment_type == 'stock_in':
-                    product.stock += quantity
-                elif adjustment_type == 'stock_out':
-                    if product.stock < quantity:
-                        return Response(
-                            {"error": f"Not enough stock. Current stock: {product.stock}, Requested: {quantity}"},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    product.stock -= quantity
-                elif adjustment_type == 'adjustment':
-                    # For direct adjustment, quantity can be negative
-                    product.stock += quantity
-                
-                product.save()
-                
-                # Create inventory log
-                InventoryLog.objects.create(
-                    product=product,
-                    quantity=abs(quantity),
-                    adjustment_type=adjustment_type,
-                    reference=reference,
-                    user=request.user
-                )
-                
-                # Serialize and return updated product
-                serializer = self.get_serializer(product)
-                return Response(serializer.data)
-                
-        except ValueError:
+        result = apply_stock_adjustments([{
+            'product_id': product.id,
+            'quantity': request.data.get('quantity', 0),
+            'adjustment_type': request.data.get('adjustment_type', ''),
+            'reference': request.data.get('reference', ''),
+        }], user=request.user)
+        
+        line = result['results'][0]
+        if not line['success']:
+            return Response({"error": line['error']}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Serialize and return updated product
+        product.refresh_from_db()
+        serializer = self.get_serializer(product)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_update_stock(self, request):
+        """
+        Apply many stock adjustments in one transaction.
+        Expects {"adjustments": [{product_id|variant_id, quantity, adjustment_type, reference}],
+        "reference": "...", "all_or_nothing": false} and returns per-line results.
+        """
+        adjustments = request.data.get('adjustments')
+        if not isinstance(adjustments, list) or not adjustments:
             return Response(
-                {"error": "Invalid quantity value"},
+                {"error": "adjustments must be a non-empty list"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        max_adjustments = getattr(settings, 'INVENTORY_BULK_MAX_ADJUSTMENTS', 5000)
+        if len(adjustments) > max_adjustments:
+            return Response(
+                {"error": f"Too many adjustments. Maximum per request: {max_adjustments}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        all_or_nothing = str(request.data.get('all_or_nothing', 'false')).lower() == 'true'
+        result = apply_stock_adjustments(
+            adjustments,
+            user=request.user,
+            reference=request.data.get('reference') or f"Bulk adjustment by {request.user.username}",
+            all_or_nothing=all_or_nothing
+        )
+        
+        response_status = status.HTTP_400_BAD_REQUEST if all_or_nothing and result['rejected'] else status.HTTP_200_OK
+        return Response(result, status=response_status)
     
     @action(detail=True, methods=['get'])
     def variants(self, request, pk=None):
@@ -754,37 +702,96 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductImageSerializer(images, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @method_decorator(cache_page(60*30))  # Cache for 30 minutes
+    @action(detail=True, methods=['get'])
+    def also_bought(self, request, pk=None):
+        """Get products most often bought together with this product"""
+        product = self.get_object()
+        limit = int(request.query_params.get('limit', 10))
+        
+        neighbor_ids = also_bought_ids(product.id, limit)
+        products_dict = Product.objects.select_related('category', 'brand').in_bulk(neighbor_ids)
+        results = [products_dict[pid] for pid in neighbor_ids if pid in products_dict]
+        
+        # Not enough purchase history yet: fill up from the same category
+        if len(results) < limit and product.category_id:
+            results.extend(sample(
+                Product.objects.filter(category_id=product.category_id, is_active=True),
+                limit - len(results),
+                pool_key=f'active:category:{product.category_id}',
+                exclude_ids=[product.id] + [p.id for p in results]
+            ))
+        
+        serializer = ProductListSerializer(results, many=True, context={'request': request})
+        return Response(serializer.data)
+    
+    @method_decorator(cache_page(60*30))  # Cache for 30 minutes
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Get products with similar category, brand, attributes, price and description"""
+        product = self.get_object()
+        limit = int(request.query_params.get('limit', 10))
+        
+        similar_ids = similar_product_ids(product.id, limit)
+        products_dict = Product.objects.select_related('category', 'brand').in_bulk(similar_ids)
+        results = [products_dict[pid] for pid in similar_ids if pid in products_dict]
+        
+        # Not indexed yet: fill up from the same category
+        if len(results) < limit and product.category_id:
+            results.extend(sample(
+                Product.objects.filter(category_id=product.category_id, is_active=True),
+                limit - len(results),
+                pool_key=f'active:category:{product.category_id}',
+                exclude_ids=[product.id] + [p.id for p in results]
+            ))
+        
+        serializer = ProductListSerializer(results, many=True, context={'request': request})
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def recommended(self, request):
-        """Get recommended products based on category popularity"""
+        """
+        Get recommended products: for signed-in customers, products often bought with
+        their past purchases; otherwise (or to fill up) products from popular categories
+        """
         limit = int(request.query_params.get('limit', 10))
         
+        recommended_products = []
+        if request.user.is_authenticated:
+            personalized_ids = personalized_product_ids(request.user, limit)
+            products_dict = Product.objects.in_bulk(personalized_ids)
+            recommended_products = [products_dict[pid] for pid in personalized_ids if pid in products_dict]
+            if len(recommended_products) >= limit:
+                serializer = ProductListSerializer(recommended_products, many=True, context={'request': request})
+                return Response(serializer.data)
+        
         # Get popular categories by product count
-        popular_categories = Category.objects.annotate(
-            product_count=Count('products')
-        ).order_by('-product_count')[:3]
+        popular_categories = Category.objects.order_by('-product_count')[:3]
         
         # Get a few products from each popular category
-        recommended_products = []
-        per_category = max(1, limit // len(popular_categories))
+        remaining = limit - len(recommended_products)
+        per_category = max(1, remaining // len(popular_categories)) if popular_categories else remaining
+        # Random picks are stable for a user for a while, and differ between users
+        seed = sampling_seed(request)
         
         for category in popular_categories:
-            category_products = Product.objects.filter(
-                category=category,
-                is_active=True
-            ).order_by('?')[:per_category]  # Random selection
-            
-            recommended_products.extend(list(category_products))
+            recommended_products.extend(sample(
+                Product.objects.filter(category=category, is_active=True),
+                per_category,
+                pool_key=f'active:category:{category.id}',
+                seed=seed,
+                exclude_ids=[p.id for p in recommended_products]
+            ))
         
         # If we don't have enough products, add more from any category
         if len(recommended_products) < limit:
-            more_products = Product.objects.filter(
-                is_active=True
-            ).exclude(
-                id__in=[p.id for p in recommended_products]
-            ).order_by('?')[:limit-len(recommended_products)]
-            
-            recommended_products.extend(list(more_products))
+            recommended_products.extend(sample(
+                Product.objects.filter(is_active=True),
+                limit - len(recommended_products),
+                pool_key='active',
+                seed=seed,
+                exclude_ids=[p.id for p in recommended_products]
+            ))
         
         serializer = ProductListSerializer(recommended_products, many=True, context={'request': request})
         return Response(serializer.data)
@@ -825,14 +832,15 @@ class ProductViewSet(viewsets.ModelViewSet):
     def top_rated(self, request):
         """Get top-rated products"""
         limit = int(request.query_params.get('limit', 10))
-        min_reviews = int(request.query_params.get('min_reviews', 5))  # Minimum reviews to be considered
+        min_reviews = int(request.query_params.get('min_reviews', 1))  # Minimum reviews to be considered
         
-        # Get products with ratings, sorted by average rating
+        # Ranked by the precomputed Wilson score, which already discounts
+        # products with only a handful of reviews
         top_rated_products = Product.objects.filter(
             is_active=True,
             rating_stats__total_reviews__gte=min_reviews
         ).select_related('rating_stats', 'category', 'brand').order_by(
-            '-rating_stats__average_rating', 
+            '-rating_stats__ranking_score', 
             '-rating_stats__total_reviews'
         )[:limit]
         
@@ -868,54 +876,21 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
         """Update variant stock"""
         variant = self.get_object()
         
-        try:
-            # Get data from request
-            quantity = int(request.data.get('quantity', 0))
-            adjustment_type = request.data.get('adjustment_type', '')
-            reference = request.data.get('reference', '')
-            
-            if adjustment_type not in ['stock_in', 'stock_out', 'adjustment']:
-                return Response(
-                    {"error": "Invalid adjustment type. Must be 'stock_in', 'stock_out', or 'adjustment'"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            with transaction.atomic():
-                # Update variant stock based on adjustment type
-                if adjustment_type == 'stock_in':
-                    variant.stock += quantity
-                elif adjustment_type == 'stock_out':
-                    if variant.stock < quantity:
-                        return Response(
-                            {"error": f"Not enough stock. Current stock: {variant.stock}, Requested: {quantity}"},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    variant.stock -= quantity
-                elif adjustment_type == 'adjustment':
-                    # For direct adjustment, quantity can be negative
-                    variant.stock += quantity
-                
-                variant.save()
-                
-                # Create inventory log
-                InventoryLog.objects.create(
-                    product=variant.product,
-                    variant=variant,
-                    quantity=abs(quantity),
-                    adjustment_type=adjustment_type,
-                    reference=reference,
-                    user=request.user
-                )
-                
-                # Serialize and return updated variant
-                serializer = self.get_serializer(variant)
-                return Response(serializer.data)
-                
-        except ValueError:
-            return Response(
-                {"error": "Invalid quantity value"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        result = apply_stock_adjustments([{
+            'variant_id': variant.id,
+            'quantity': request.data.get('quantity', 0),
+            'adjustment_type': request.data.get('adjustment_type', ''),
+            'reference': request.data.get('reference', ''),
+        }], user=request.user)
+        
+        line = result['results'][0]
+        if not line['success']:
+            return Response({"error": line['error']}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Serialize and return updated variant
+        variant.refresh_from_db()
+        serializer = self.get_serializer(variant)
+        return Response(serializer.data)
 
 class InventoryLogViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = InventoryLogSerializer
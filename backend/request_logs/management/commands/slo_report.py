@@ -0,0 +1,81 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from request_logs.models import RequestLog
+from request_logs.metrics import build_report, clear_snapshots, histograms_from_logs, load_merged
+
+class Command(BaseCommand):
+    help = 'Print per-endpoint latency percentiles, throughput and error rates against SLO targets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view',
+            type=str,
+            help='Only report views whose name contains this text'
+        )
+        parser.add_argument(
+            '--from-logs',
+            action='store_true',
+            help='Build the report from stored request logs instead of live worker metrics'
+        )
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Window size in hours when using --from-logs (default: 24)'
+        )
+        parser.add_argument(
+            '--breaches-only',
+            action='store_true',
+            help='Only show views that miss at least one SLO target'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the live metrics after printing the report (workers drop their counts on their next flush)'
+        )
+
+    def handle(self, *args, **options):
+        if options['from_logs']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            histograms = histograms_from_logs(RequestLog.objects.filter(timestamp__gte=since))
+            window_seconds = options['hours'] * 3600
+            source = f"request logs from the last {options['hours']} hours"
+        else:
+            histograms, started_at = load_merged()
+            window_seconds = time.time() - started_at if started_at else 0
+            source = 'live worker metrics'
+
+        rows = build_report(histograms, window_seconds)
+        if options['view']:
+            rows = [row for row in rows if options['view'] in row['view_name']]
+        if options['breaches_only']:
+            rows = [row for row in rows if not row['meets_slo']]
+
+        self.stdout.write(f'SLO report ({source}, window {window_seconds / 60:.1f} min)\n')
+
+        if not rows:
+            self.stdout.write(self.style.WARNING('No request metrics recorded.'))
+        else:
+            header = f"{'View':<40} {'Count':>8} {'RPS':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'Err %':>7}  SLO"
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+
+            for row in rows:
+                line = (
+                    f"{row['view_name'][:40]:<40} {row['count']:>8} {row['throughput']:>8.2f} "
+                    f"{row['p50']:>7.1f}ms {row['p95']:>7.1f}ms {row['p99']:>7.1f}ms "
+                    f"{row['error_rate']:>6.2f}%  "
+                )
+                if row['meets_slo']:
+                    self.stdout.write(line + self.style.SUCCESS('OK'))
+                else:
+                    self.stdout.write(line + self.style.ERROR('BREACH: ' + ', '.join(row['breaches'])))
+
+            breached = sum(1 for row in rows if not row['meets_slo'])
+            self.stdout.write(f'\n{len(rows) - breached} of {len(rows)} views meet their SLO targets')
+
+        if options['reset'] and not options['from_logs']:
+            clear_snapshots()
+            self.stdout.write(self.style.SUCCESS('Live metrics snapshots cleared.'))
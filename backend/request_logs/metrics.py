@@ -0,0 +1,332 @@
+"""
+In-process request latency metrics.
+
+Each worker process keeps a histogram of response times per resolved view
+name and periodically flushes a snapshot to its own file in
+REQUEST_METRICS_DIR. Reports merge every worker snapshot found there, so
+percentiles, throughput and error rates cover the whole deployment without
+an external metrics service.
+
+Clearing the metrics writes a reset marker holding the reset time. Workers
+check it before each flush and drop histograms started before it, and
+reports ignore snapshots started before it, so a worker can't bring back
+the cleared counts.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+# Upper bounds (in milliseconds) of the histogram buckets. Roughly
+# logarithmic so tail latency keeps useful resolution; the last bucket
+# catches everything slower than 60 seconds.
+BUCKET_BOUNDS = [
+    1, 2, 3, 5, 7, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 250, 300,
+    400, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 20000,
+    30000, 60000, float('inf'),
+]
+
+RESET_MARKER = 'reset'
+
+DEFAULT_SLO_TARGETS = {
+    'p95': 500,          # milliseconds
+    'p99': 1000,         # milliseconds
+    'error_rate': 1.0,   # percent of 5xx responses
+}
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram that can be merged with others"""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, response_time, is_error=False):
+        index = bisect.bisect_left(BUCKET_BOUNDS, response_time)
+        self.buckets[min(index, len(BUCKET_BOUNDS) - 1)] += 1
+        self.count += 1
+        self.total_time += response_time
+        self.max_time = max(self.max_time, response_time)
+        if is_error:
+            self.errors += 1
+
+    def merge(self, other):
+        for i, value in enumerate(other.buckets):
+            self.buckets[i] += value
+        self.count += other.count
+        self.errors += other.errors
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        return self
+
+    def percentile(self, q):
+        """Estimate the q-th percentile (0-100) by interpolating inside the bucket"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q / 100 * self.count
+        seen = 0
+        for i, value in enumerate(self.buckets):
+            if value and seen + value >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                upper = min(BUCKET_BOUNDS[i], self.max_time)
+                if upper <= lower:
+                    return float(upper)
+                return lower + (upper - lower) * (rank - seen) / value
+            seen += value
+        return self.max_time
+
+    @property
+    def average(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    @property
+    def error_rate(self):
+        """Percentage of requests that ended in a server error"""
+        return self.errors / self.count * 100 if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'buckets': self.buckets,
+            'count': self.count,
+            'errors': self.errors,
+            'total_time': self.total_time,
+            'max_time': self.max_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        buckets = data.get('buckets', [])
+        if len(buckets) == len(BUCKET_BOUNDS):
+            histogram.buckets = list(buckets)
+        histogram.count = data.get('count', 0)
+        histogram.errors = data.get('errors', 0)
+        histogram.total_time = data.get('total_time', 0.0)
+        histogram.max_time = data.get('max_time', 0.0)
+        return histogram
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of latency histograms keyed by view name.
+    Snapshots are flushed to a per-process file so reports can merge workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._started_at = time.time()
+        self._last_flush = 0.0
+
+    def record(self, view_name, response_time, is_error=False):
+        with self._lock:
+            histogram = self._histograms.get(view_name)
+            if histogram is None:
+                histogram = self._histograms[view_name] = LatencyHistogram()
+            histogram.record(response_time, is_error)
+
+            flush_interval = getattr(settings, 'REQUEST_METRICS_FLUSH_INTERVAL', 10)
+            should_flush = time.time() - self._last_flush >= flush_interval
+
+        if should_flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self._started_at,
+                'updated_at': time.time(),
+                'views': {name: h.to_dict() for name, h in self._histograms.items()},
+            }
+
+    def flush(self):
+        """Atomically write this process's snapshot to the shared metrics directory"""
+        metrics_dir = get_metrics_dir()
+        reset_at = read_reset_marker(metrics_dir)
+        with self._lock:
+            if reset_at is not None and self._started_at < reset_at:
+                self._histograms = {}
+                self._started_at = time.time()
+        data = self.snapshot()
+        with self._lock:
+            self._last_flush = time.time()
+
+        os.makedirs(metrics_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, os.path.join(metrics_dir, f'worker-{data["pid"]}.json'))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._started_at = time.time()
+
+
+def get_metrics_dir():
+    return getattr(
+        settings, 'REQUEST_METRICS_DIR',
+        os.path.join(tempfile.gettempdir(), 'joulina_request_metrics')
+    )
+
+
+def read_reset_marker(metrics_dir):
+    """Timestamp of the last clear_snapshots, or None"""
+    try:
+        with open(os.path.join(metrics_dir, RESET_MARKER)) as f:
+            return float(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_reset_marker(metrics_dir, reset_at):
+    os.makedirs(metrics_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(repr(reset_at))
+        os.replace(tmp_path, os.path.join(metrics_dir, RESET_MARKER))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_merged():
+    """
+    Merge every live worker snapshot in the metrics directory. Snapshots not
+    updated within REQUEST_METRICS_STALE_AFTER seconds (exited or idle
+    workers; an idle worker's next flush brings its counts back) and
+    snapshots started before the last reset are skipped. Returns
+    (histograms by view name, window start timestamp).
+    """
+    metrics_dir = get_metrics_dir()
+    merged = {}
+    started_at = None
+    cutoff = time.time() - getattr(settings, 'REQUEST_METRICS_STALE_AFTER', 15 * 60)
+
+    if not os.path.isdir(metrics_dir):
+        return merged, started_at
+    reset_at = read_reset_marker(metrics_dir)
+
+    for filename in os.listdir(metrics_dir):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, filename)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        worker_start = data.get('started_at')
+        if data.get('updated_at', 0) < cutoff:
+            continue
+        if reset_at is not None and (worker_start or 0) < reset_at:
+            continue
+
+        if worker_start and (started_at is None or worker_start < started_at):
+            started_at = worker_start
+
+        for view_name, histogram_data in data.get('views', {}).items():
+            histogram = LatencyHistogram.from_dict(histogram_data)
+            if view_name in merged:
+                merged[view_name].merge(histogram)
+            else:
+                merged[view_name] = histogram
+
+    return merged, started_at
+
+
+def clear_snapshots():
+    """
+    Reset the live metrics: record the reset time for every worker, delete
+    the current snapshots and reset this process's registry
+    """
+    metrics_dir = get_metrics_dir()
+    write_reset_marker(metrics_dir, time.time())
+    for filename in os.listdir(metrics_dir):
+        if filename.endswith('.json'):
+            try:
+                os.remove(os.path.join(metrics_dir, filename))
+            except OSError:
+                pass
+    registry.reset()
+
+
+def histograms_from_logs(queryset):
+    """Build histograms from stored RequestLog rows (e.g. to backfill a report)"""
+    histograms = {}
+    rows = queryset.values_list('view_name', 'response_time', 'response_status').iterator()
+    for view_name, response_time, response_status in rows:
+        view_name = view_name or 'unresolved'
+        histogram = histograms.get(view_name)
+        if histogram is None:
+            histogram = histograms[view_name] = LatencyHistogram()
+        histogram.record(response_time, response_status >= 500)
+    return histograms
+
+
+def get_slo_targets(view_name):
+    """SLO targets for a view, falling back to the configured defaults"""
+    configured = getattr(settings, 'REQUEST_SLO_TARGETS', {})
+    targets = dict(DEFAULT_SLO_TARGETS)
+    targets.update(configured.get('default', {}))
+    targets.update(configured.get(view_name, {}))
+    return targets
+
+
+def build_report(histograms, window_seconds):
+    """
+    Summarize histograms into report rows sorted by request volume.
+    Each row flags which SLO targets were breached.
+    """
+    rows = []
+    for view_name, histogram in histograms.items():
+        targets = get_slo_targets(view_name)
+        p50 = histogram.percentile(50)
+        p95 = histogram.percentile(95)
+        p99 = histogram.percentile(99)
+
+        breaches = []
+        if p95 > targets['p95']:
+            breaches.append('p95')
+        if p99 > targets['p99']:
+            breaches.append('p99')
+        if histogram.error_rate > targets['error_rate']:
+            breaches.append('error_rate')
+
+        rows.append({
+            'view_name': view_name,
+            'count': histogram.count,
+            'throughput': histogram.count / window_seconds if window_seconds > 0 else 0.0,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': histogram.max_time,
+            'average': histogram.average,
+            'error_rate': histogram.error_rate,
+            'targets': targets,
+            'breaches': breaches,
+            'meets_slo': not breaches,
+        })
+
+    rows.sort(key=lambda row: row['count'], reverse=True)
+    return rows
+
+
+# Process-wide registry used by the request logging middleware
+registry = MetricsRegistry()
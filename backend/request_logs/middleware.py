@@ -5,10 +5,91 @@ from django.http import HttpResponse
 from django.conf import settings
 from django.urls import resolve
 from .models import RequestLog
+from .metrics import registry as metrics_registry
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class BodyCapture:
+    """
+    File-like wrapper around a request stream that records only the first
+    `limit` bytes read through it while counting the total length.
+    """
+    
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self.limit = limit
+        self.prefix = bytearray()
+        self.length = 0
+        self.exhausted = False
+    
+    def _record(self, chunk):
+        if not chunk:
+            self.exhausted = True
+            return chunk
+        self.length += len(chunk)
+        remaining = self.limit - len(self.prefix)
+        if remaining > 0:
+            self.prefix += chunk[:remaining]
+        return chunk
+    
+    def read(self, size=-1):
+        chunk = self._record(self._stream.read(size))
+        if size is None or size < 0:
+            self.exhausted = True
+        return chunk
+    
+    def readline(self, size=-1):
+        return self._record(self._stream.readline(size))
+    
+    def fill(self):
+        """Top up the prefix from unread data without reading past the limit"""
+        while not self.exhausted and len(self.prefix) < self.limit:
+            if not self.read(self.limit - len(self.prefix)):
+                break
+    
+    def close(self):
+        close = getattr(self._stream, 'close', None)
+        if close:
+            close()
+
+
+class StreamingBodyCapture:
+    """
+    Pass-through iterator for streaming responses. Records the first `limit`
+    bytes and the total length as chunks flow to the client, then invokes
+    `on_complete` once the stream is exhausted or closed.
+    """
+    
+    def __init__(self, streaming_content, limit, on_complete):
+        self._content = streaming_content
+        self.limit = limit
+        self.prefix = bytearray()
+        self.length = 0
+        self._on_complete = on_complete
+        self._completed = False
+    
+    def __iter__(self):
+        try:
+            for chunk in self._content:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                self.length += len(chunk)
+                remaining = self.limit - len(self.prefix)
+                if remaining > 0:
+                    self.prefix += chunk[:remaining]
+                yield chunk
+        finally:
+            self.close()
+    
+    def close(self):
+        # Called by the generator on exhaustion and by the response on close
+        if not self._completed:
+            self._completed = True
+            self._on_complete(self)
+
+
 class RequestLoggingMiddleware(MiddlewareMixin):
     """
     Middleware to log all HTTP requests and responses.
@@ -21,8 +102,17 @@ class RequestLoggingMiddleware(MiddlewareMixin):
     def process_request(self, request):
         """Process the request and record start time"""
         request._request_start_time = time.time()
+        
+        # Tee the request stream so whatever the view reads is captured
+        # without ever buffering more than the configured body size
+        if not self._should_skip_logging(request) and hasattr(request, '_stream'):
+            request._body_capture = BodyCapture(request._stream, self._max_body_size())
+            request._stream = request._body_capture
         return None
     
+    def _max_body_size(self):
+        return getattr(settings, 'REQUEST_LOG_MAX_BODY_SIZE', 10000)
+    
     def process_response(self, request, response):
         """Process the response and log the request/response data"""
         
@@ -38,17 +128,17 @@ class RequestLoggingMiddleware(MiddlewareMixin):
             # Get request data
             request_data = self._get_request_data(request)
             
-            # Get response data
-            response_data = self._get_response_data(response)
-            
             # Get client information
             client_info = self._get_client_info(request)
             
             # Determine request type
             request_type_info = self._get_request_type_info(request)
             
-            # Create the log entry
-            RequestLog.objects.create(
+            # Feed the per-endpoint latency histograms
+            if getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+                self._record_metrics(request_type_info['view_name'], response_time, response)
+            
+            log_data = dict(
                 # Request Information
                 method=request.method,
                 path=request.path,
@@ -61,9 +151,6 @@ class RequestLoggingMiddleware(MiddlewareMixin):
                 
                 # Response Information
                 response_status=response.status_code,
-                response_headers=response_data['headers'],
-                response_body=response_data['body'],
-                response_size=len(response.content) if hasattr(response, 'content') else 0,
                 
                 # User and Session Information
                 user=request.user if request.user.is_authenticated else None,
@@ -83,6 +170,25 @@ class RequestLoggingMiddleware(MiddlewareMixin):
                 is_admin_request=request_type_info['is_admin_request'],
                 is_error=response.status_code >= 400,
             )
+            
+            if response.streaming and getattr(response, 'is_async', False):
+                # Async iterators can't be wrapped here; record metadata only
+                self._create_log(log_data, self._get_response_data(response, b'', 0))
+            elif response.streaming:
+                # Never materialize a streaming response; log once it has been sent
+                def on_complete(capture):
+                    self._create_log(log_data, self._get_response_data(
+                        response, bytes(capture.prefix), capture.length
+                    ))
+                
+                response.streaming_content = StreamingBodyCapture(
+                    response.streaming_content, self._max_body_size(), on_complete
+                )
+            else:
+                content = response.content
+                self._create_log(log_data, self._get_response_data(
+                    response, content[:self._max_body_size()], len(content)
+                ))
         
         except Exception as e:
             # Don't let logging errors break the application
@@ -90,6 +196,29 @@ class RequestLoggingMiddleware(MiddlewareMixin):
         
         return response
     
+    def _create_log(self, log_data, response_data):
+        """Persist a log entry from the request fields and captured response data"""
+        try:
+            RequestLog.objects.create(
+                **log_data,
+                response_headers=response_data['headers'],
+                response_body=response_data['body'],
+                response_size=response_data['size'],
+            )
+        except Exception as e:
+            logger.error(f"Error logging request: {e}")
+    
+    def _record_metrics(self, view_name, response_time, response):
+        """Record latency for the resolved view in the in-process metrics registry"""
+        try:
+            metrics_registry.record(
+                view_name or 'unresolved',
+                response_time,
+                is_error=response.status_code >= 500
+            )
+        except Exception as e:
+            logger.error(f"Error recording request metrics: {e}")
+    
     def _should_skip_logging(self, request):
         """Determine if this request should be skipped from logging"""
         
@@ -138,10 +267,20 @@ class RequestLoggingMiddleware(MiddlewareMixin):
         # Get request body
         body = None
         try:
-            if hasattr(request, 'body') and request.body:
-                # Limit body size to prevent huge logs
-                max_body_size = getattr(settings, 'REQUEST_LOG_MAX_BODY_SIZE', 10000)
-                body_content = request.body.decode('utf-8')[:max_body_size]
+            # Limit body size to prevent huge logs
+            max_body_size = self._max_body_size()
+            capture = getattr(request, '_body_capture', None)
+            
+            if hasattr(request, '_body'):
+                raw = request._body[:max_body_size]
+            elif capture is not None:
+                capture.fill()
+                raw = bytes(capture.prefix)
+            else:
+                raw = b''
+            
+            if raw:
+                body_content = raw.decode('utf-8', errors='ignore')
                 
                 # Try to parse JSON for better formatting
                 if request.content_type == 'application/json':
@@ -159,8 +298,8 @@ class RequestLoggingMiddleware(MiddlewareMixin):
             'body': body
         }
     
-    def _get_response_data(self, response):
-        """Extract response headers and body"""
+    def _get_response_data(self, response, raw, size):
+        """Extract response headers and body from the captured leading bytes"""
         
         # Get response headers
         headers = {}
@@ -170,28 +309,26 @@ class RequestLoggingMiddleware(MiddlewareMixin):
         # Get response body
         body = None
         try:
-            if hasattr(response, 'content'):
-                # Limit response size to prevent huge logs
-                max_body_size = getattr(settings, 'REQUEST_LOG_MAX_BODY_SIZE', 10000)
-                content = response.content.decode('utf-8')[:max_body_size]
-                
-                # Try to parse JSON for better formatting
-                content_type = response.get('content-type', '')
-                if 'application/json' in content_type:
-                    try:
-                        body = json.dumps(json.loads(content), indent=2)
-                    except json.JSONDecodeError:
-                        body = content
-                elif content_type.startswith('text/'):
+            content = raw.decode('utf-8', errors='ignore')
+            
+            # Try to parse JSON for better formatting
+            content_type = response.get('content-type', '')
+            if 'application/json' in content_type:
+                try:
+                    body = json.dumps(json.loads(content), indent=2)
+                except json.JSONDecodeError:
                     body = content
-                else:
-                    body = f"Binary content ({len(response.content)} bytes)"
+            elif content_type.startswith('text/'):
+                body = content
+            else:
+                body = f"Binary content ({size} bytes)"
         except Exception:
             body = "Could not decode response body"
         
         return {
             'headers': headers,
-            'body': body
+            'body': body,
+            'size': size
         }
     
     def _get_client_info(self, request):
@@ -0,0 +1,7 @@
+from django.core.management import call_command
+from jobs.registry import task
+
+
+@task('request_logs.cleanup')
+def cleanup_request_logs(days=30, keep_errors=False):
+    call_command('cleanup_request_logs', days=days, keep_errors=keep_errors)
@@ -1,3 +1,165 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from .metrics import LatencyHistogram, MetricsRegistry, build_report, clear_snapshots, load_merged
+from .middleware import RequestLoggingMiddleware
+from .models import RequestLog
 
-# Create your tests here.
+
+@override_settings(REQUEST_LOG_MAX_BODY_SIZE=64, REQUEST_METRICS_ENABLED=False)
+class RequestLoggingMiddlewareTestCase(TestCase):
+    """Test cases for request/response body capture"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _run(self, request, view):
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        middleware = RequestLoggingMiddleware(view)
+        return middleware(request)
+
+    def test_request_body_captured_after_view_reads_stream(self):
+        """Bodies consumed from the stream by the view are still logged"""
+        payload = json.dumps({'product_id': 1, 'quantity': 2})
+        request = self.factory.post('/api/v1/cart/add_item/', data=payload, content_type='application/json')
+
+        def view(req):
+            data = json.loads(req.read())
+            return HttpResponse(json.dumps(data), content_type='application/json')
+
+        self._run(request, view)
+
+        log = RequestLog.objects.get()
+        self.assertEqual(json.loads(log.request_body), {'product_id': 1, 'quantity': 2})
+
+    def test_response_body_truncated_with_full_size(self):
+        """Only the leading bytes are logged while the size reflects the whole body"""
+        content = 'x' * 1000
+        request = self.factory.get('/api/v1/products/')
+        self._run(request, lambda req: HttpResponse(content, content_type='text/plain'))
+
+        log = RequestLog.objects.get()
+        self.assertEqual(log.response_body, 'x' * 64)
+        self.assertEqual(log.response_size, 1000)
+
+    def test_streaming_response_not_materialized(self):
+        """Streaming responses are logged only once their content has been consumed"""
+        consumed = []
+
+        def chunks():
+            for i in range(10):
+                consumed.append(i)
+                yield b'y' * 20
+
+        request = self.factory.get('/api/v1/products/export/')
+        response = self._run(
+            request, lambda req: StreamingHttpResponse(chunks(), content_type='text/plain')
+        )
+
+        self.assertEqual(consumed, [])
+        self.assertFalse(RequestLog.objects.exists())
+
+        body = b''.join(response.streaming_content)
+
+        self.assertEqual(len(body), 200)
+        log = RequestLog.objects.get()
+        self.assertEqual(log.response_size, 200)
+        self.assertEqual(log.response_body, 'y' * 64)
+
+
+class LatencyHistogramTestCase(TestCase):
+    """Test cases for the mergeable latency histograms"""
+
+    def test_percentiles_expose_tail_latency(self):
+        histogram = LatencyHistogram()
+        for _ in range(98):
+            histogram.record(10)
+        histogram.record(900)
+        histogram.record(2500, is_error=True)
+
+        self.assertLessEqual(histogram.percentile(50), 10)
+        self.assertGreater(histogram.percentile(99), 750)
+        self.assertEqual(histogram.error_rate, 1.0)
+
+    def test_merge_across_workers(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(REQUEST_METRICS_DIR=metrics_dir):
+                worker_a = MetricsRegistry()
+                worker_b = MetricsRegistry()
+                worker_a.record('checkout', 100)
+                worker_b.record('checkout', 300, is_error=True)
+                worker_a.flush()
+                # Simulate a second process writing its own snapshot
+                with mock.patch('request_logs.metrics.os.getpid', return_value=-1):
+                    worker_b.flush()
+
+                histograms, started_at = load_merged()
+
+        self.assertEqual(histograms['checkout'].count, 2)
+        self.assertEqual(histograms['checkout'].errors, 1)
+        self.assertIsNotNone(started_at)
+
+    def test_stale_snapshots_are_skipped(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(REQUEST_METRICS_DIR=metrics_dir, REQUEST_METRICS_STALE_AFTER=60):
+                live = MetricsRegistry()
+                live.record('checkout', 100)
+                live.flush()
+                # A worker that exited an hour ago
+                with mock.patch('request_logs.metrics.os.getpid', return_value=-1), \
+                        mock.patch('request_logs.metrics.time.time', return_value=time.time() - 3600):
+                    dead = MetricsRegistry()
+                    dead.record('checkout', 300)
+                    dead.flush()
+
+                histograms, started_at = load_merged()
+                remaining = os.listdir(metrics_dir)
+
+        self.assertEqual(histograms['checkout'].count, 1)
+        self.assertEqual(started_at, live._started_at)
+        # Left in place, so an idle worker's counts come back with its next flush
+        self.assertEqual(len(remaining), 2)
+
+    def test_reset_is_honoured_by_running_workers(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(REQUEST_METRICS_DIR=metrics_dir):
+                with mock.patch('request_logs.metrics.time.time', return_value=time.time() - 60):
+                    worker = MetricsRegistry()
+                    worker.record('checkout', 100)
+                    worker.flush()
+                    # Another worker whose snapshot lands after the reset
+                    late = MetricsRegistry()
+                    late.record('checkout', 100)
+                clear_snapshots()
+                self.assertEqual(load_merged(), ({}, None))
+
+                with open(os.path.join(metrics_dir, 'worker--1.json'), 'w') as f:
+                    json.dump(late.snapshot(), f)
+                self.assertEqual(load_merged(), ({}, None))
+
+                # The running worker drops its pre-reset counts on its next flush
+                worker.flush()
+                worker.record('checkout', 200)
+                worker.flush()
+                histograms, _ = load_merged()
+
+        self.assertEqual(histograms['checkout'].count, 1)
+        self.assertEqual(histograms['checkout'].max_time, 200)
+
+    @override_settings(REQUEST_SLO_TARGETS={'default': {'p95': 50}})
+    def test_report_flags_breaches(self):
+        histogram = LatencyHistogram()
+        for _ in range(10):
+            histogram.record(200)
+
+        row = build_report({'product-featured': histogram}, 10)[0]
+        self.assertFalse(row['meets_slo'])
+        self.assertIn('p95', row['breaches'])
+        self.assertEqual(row['throughput'], 1.0)
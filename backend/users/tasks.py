@@ -0,0 +1,7 @@
+from jobs.registry import task
+from .signals import expire_points
+
+
+@task('users.expire_points')
+def expire_points_task():
+    expire_points()